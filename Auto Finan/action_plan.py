@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+操作计划编译器
+在启动浏览器之前，把报销信息工作簿 + 标题-ID映射 + DROPDOWN_FIELDS
+编译成每个序号的类型化操作列表。单元格的分类（$、$$、@、*、#前缀，
+按标题的特殊处理，下拉框ID模式和日期判断）只做一次，运行时直接按类型执行。
+编译结果按输入文件内容的哈希缓存在磁盘上。
+"""
+
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+
+from config import *
+from segmentation import TRAVELER, TRAVEL_CARD, clean_cell, segment_rows
+
+logger = logging.getLogger(__name__)
+
+# 缓存格式版本，分类规则变化时递增以使旧缓存失效
+PLAN_FORMAT_VERSION = 3
+
+# 操作类型
+WAIT = "wait"                          # 等待若干秒
+RADIO = "radio"                        # $$radio按钮
+RESERVATION = "reservation"            # 第一行预约按钮
+ADD_CONTENT = "add_content"            # 添加内容按钮
+NAVIGATION = "navigation"              # @系统导览框 / 网上预约报账按钮
+TRANSFER_WORK_ID = "transfer_work_id"  # 转卡信息工号（回车后处理银行卡弹窗）
+PRINT = "print"                        # 打印确认单
+BUTTON = "button"                      # $普通按钮
+SUBJECT = "subject"                    # 科目/等待页面加载后填写
+SUBJECT_AMOUNT = "subject_amount"      # #科目 + 下一列金额
+CARD_SELECT = "card_select"            # *卡号尾号选择
+DROPDOWN = "dropdown"                  # 下拉框
+DATE = "date"                          # 日期输入框
+INPUT = "input"                        # 普通输入框
+LOGIN = "login"                        # 登录（验证码）
+SKIP = "skip"                          # 无需操作
+INVALID = "invalid"                    # 单元格内容或映射有问题，运行时跳过
+
+# 依赖上下文（同一行的其他单元格）的操作类型，不能按(标题, 值)单独查表
+CONTEXT_KINDS = (SUBJECT_AMOUNT, LOGIN)
+
+PRINT_TITLES = ("打印按钮", "打印操作", "打印确认单按钮")
+LOGIN_COLUMNS = ("登录界面工号", "登录界面密码", "登录按钮")
+
+# Excel列名 -> DROPDOWN_FIELDS配置名
+DROPDOWN_TITLE_MAPPING = {
+    "省份": "省份地区",
+    "人员类型": "人员类型",
+    "安排状态": "安排状态",
+    "交通费": "交通费"
+}
+
+# 已知的下拉框ID模式 -> DROPDOWN_FIELDS配置名
+DROPDOWN_ID_PATTERNS = [
+    ("formWF_YB6_3492_yc-chr_sf", "省份地区"),
+    ("formWF_YB6_3492_yc-chr_hsf", "安排状态"),
+    ("formWF_YB6_3492_yc-chr_jtf", "交通费"),
+    ("formWF_YB6_3492_yc-chr_zc", "人员类型"),
+    ("formWF_YB6_3492_yc-chr_azzt", "安排状态"),
+]
+
+
+@dataclass(frozen=True)
+class Action:
+    """一个类型化的操作"""
+    kind: str
+    title: str
+    value: str
+    element_id: str = ""
+    arg: str = ""
+    note: str = ""
+
+
+def is_date_element(element_id: str) -> bool:
+    """根据元素ID判断是否为日期输入框"""
+    if not element_id:
+        return False
+    lowered = element_id.lower()
+    return ("date" in lowered or "start" in element_id or "end" in element_id)
+
+
+def is_card_tail(title: str, value_str: str) -> bool:
+    """是否为银行卡选择使用的卡号尾号单元格（卡号尾号列，或以*开头的值）"""
+    return title.startswith(CARD_TAIL_COLUMNS) or value_str.startswith(CARD_NUMBER_PREFIX)
+
+
+def dropdown_config(title: str, element_id: str) -> Optional[Dict[str, str]]:
+    """
+    确定下拉框字段的DROPDOWN_FIELDS配置：先按配置名，再按已知ID模式
+
+    Returns:
+        该字段的配置，不是已配置的下拉框时返回None
+    """
+    config_title = DROPDOWN_TITLE_MAPPING.get(title, title)
+    if config_title in DROPDOWN_FIELDS:
+        return DROPDOWN_FIELDS[config_title] or None
+    for pattern, pattern_config in DROPDOWN_ID_PATTERNS:
+        if pattern in element_id:
+            return DROPDOWN_FIELDS.get(pattern_config) or None
+    return None
+
+
+def classify_cell(title: str, value_str: str, get_object_id: Callable[[str], str]) -> Action:
+    """
+    对一个单元格进行分类，规则与LoginAutomation.process_cell一致
+
+    Args:
+        title: 列标题
+        value_str: 清理后的单元格值
+        get_object_id: 标题 -> 元素ID的查询函数
+
+    Returns:
+        对应的操作
+    """
+    # 等待操作（标题为"等待"或"等待.1"等），支持 $数字 或 直接数字
+    if title.startswith("等待"):
+        seconds_str = value_str[len(BUTTON_PREFIX):] if value_str.startswith(BUTTON_PREFIX) else value_str
+        try:
+            return Action(WAIT, title, value_str, arg=str(float(seconds_str)))
+        except ValueError:
+            return Action(INVALID, title, value_str, note=f"等待操作格式错误，无法解析秒数: {value_str}")
+
+    # radio按钮（以$$开头）
+    if value_str.startswith(RADIO_BUTTON_PREFIX):
+        radio_title = value_str[len(RADIO_BUTTON_PREFIX):]
+        radio_element_id = get_object_id(radio_title)
+        if not radio_element_id:
+            return Action(INVALID, title, value_str, arg=radio_title,
+                          note=f"未找到标题 '{radio_title}' 对应的radio按钮ID映射")
+        return Action(RADIO, title, value_str, element_id=radio_element_id, arg=radio_title)
+
+    if value_str.startswith(BUTTON_PREFIX):
+        button_value = value_str[len(BUTTON_PREFIX):]
+        if title == "预约按钮" and button_value == "预约":
+            return Action(RESERVATION, title, value_str)
+        if title == "添加内容按钮" and button_value == "点击":
+            return Action(ADD_CONTENT, title, value_str)
+
+    element_id = get_object_id(title)
+    if not element_id and is_card_tail(title, value_str):
+        # 没有映射的卡号尾号由银行卡选择弹窗读取，不是表单字段
+        return Action(SKIP, title, value_str, note=f"卡号尾号由银行卡选择使用: {title} = {value_str}")
+    if not element_id:
+        return Action(INVALID, title, value_str, note=f"未找到标题 '{title}' 对应的ID映射")
+
+    if title == "网上预约报账按钮":
+        if "navToPrj('WF_YB6')" in element_id:
+            return Action(NAVIGATION, title, value_str, arg="WF_YB6")
+        return Action(BUTTON, title, value_str, element_id=element_id)
+
+    if title.startswith("转卡信息工号"):
+        return Action(TRANSFER_WORK_ID, title, value_str, element_id=element_id)
+
+    if value_str.startswith(BUTTON_PREFIX):
+        if title in PRINT_TITLES:
+            return Action(PRINT, title, value_str, element_id=element_id)
+        return Action(BUTTON, title, value_str, element_id=element_id)
+
+    if title == "科目":
+        if value_str.startswith("#"):
+            subject_name = value_str[1:]
+            input_id = get_object_id(subject_name)
+            if not input_id:
+                return Action(INVALID, title, value_str, arg=subject_name,
+                              note=f"未找到科目 '{subject_name}' 对应的ID映射")
+            return Action(SUBJECT, title, value_str, element_id=input_id, arg=subject_name)
+        return Action(SUBJECT, title, value_str, element_id=element_id)
+    if title == "金额":
+        # 金额与科目配对处理
+        return Action(SKIP, title, value_str, element_id=element_id)
+
+    if value_str.startswith(NAVIGATION_PREFIX):
+        return Action(NAVIGATION, title, value_str, element_id=element_id, arg=value_str[1:])
+
+    if value_str.startswith(CARD_NUMBER_PREFIX):
+        return Action(CARD_SELECT, title, value_str, element_id=element_id, arg=value_str[1:])
+
+    # 下拉框：先按配置名，再按已知ID模式
+    field_config = dropdown_config(title, element_id)
+    if field_config:
+        return Action(DROPDOWN, title, value_str, element_id=element_id,
+                      arg=field_config.get(value_str, value_str))
+
+    if is_date_element(element_id):
+        return Action(DATE, title, value_str, element_id=element_id)
+
+    return Action(INPUT, title, value_str, element_id=element_id)
+
+
+def compile_sequence(group_data, get_object_id: Callable[[str], str]) -> List[Action]:
+    """
+    按处理顺序（从上到下、从左到右）编译一个序号组的操作列表
+
+    Args:
+        group_data: 该序号下的所有数据行
+        get_object_id: 标题 -> 元素ID的查询函数
+
+    Returns:
+        操作列表
+    """
+    actions: List[Action] = []
+    columns = list(group_data.columns)
+    rows = group_data.to_dict('records')
+    segmentation = segment_rows(rows, columns)
+
+    for row_idx, row in enumerate(rows):
+        tag = segmentation.tags[row_idx]
+        # 登录信息在第一行，整体作为一个登录操作
+        if row_idx == 0 and clean_cell(row.get("登录界面工号")):
+            actions.append(Action(LOGIN, "登录界面工号", clean_cell(row.get("登录界面工号"))))
+
+        col_idx = 0
+        while col_idx < len(columns):
+            col = columns[col_idx]
+            col_idx += 1
+            if (col in (SEQUENCE_COL, "处理进度") or col in LOGIN_COLUMNS or
+                    col.startswith(SUBSEQUENCE_START_COL) or col.startswith(SUBSEQUENCE_END_COL)):
+                continue
+            value_str = clean_cell(row[col])
+            if not value_str:
+                continue
+
+            # 出差人/差旅转卡子序列中的字段按索引添加后缀
+            if tag.kind == TRAVELER and col in TRAVELER_FIELDS:
+                col = f"{col}-{tag.traveler_index}"
+            elif tag.kind == TRAVEL_CARD and col in TRAVEL_CARD_FIELDS:
+                col = f"{col}-{tag.travel_card_index}"
+
+            # #科目 与下一列金额配对
+            if value_str.startswith("#") and col_idx < len(columns):
+                amount_col = columns[col_idx]
+                amount_str = clean_cell(row[amount_col])
+                subject_name = value_str[1:]
+                input_id = get_object_id(subject_name)
+                if not input_id:
+                    actions.append(Action(INVALID, col, value_str, arg=subject_name,
+                                          note=f"未找到科目 '{subject_name}' 对应的ID映射"))
+                elif not amount_str:
+                    actions.append(Action(INVALID, col, value_str, arg=subject_name,
+                                          note=f"科目 '{subject_name}' 对应的金额列为空"))
+                else:
+                    actions.append(Action(SUBJECT_AMOUNT, amount_col, amount_str,
+                                          element_id=input_id, arg=subject_name))
+                    col_idx += 1
+                continue
+
+            actions.append(classify_cell(col, value_str, get_object_id))
+
+    return actions
+
+
+def estimate_action_seconds(action: Action) -> float:
+    """
+    根据配置的等待时间估算一个操作的耗时（秒）
+
+    Args:
+        action: 操作
+
+    Returns:
+        估算耗时
+    """
+    if action.kind == WAIT:
+        return float(action.arg)
+    if action.kind in (BUTTON, RADIO, NAVIGATION, RESERVATION):
+        return BUTTON_CLICK_WAIT + 0.5
+    if action.kind == ADD_CONTENT:
+        return 0.5
+    if action.kind == SUBJECT:
+        return SUBJECT_AMOUNT_WAIT + ELEMENT_WAIT
+    if action.kind == TRANSFER_WORK_ID:
+        return 0.5 + BANK_CARD_DIALOG_WAIT + BANK_CARD_SELECTION_WAIT + 2 + BUTTON_CLICK_WAIT
+    if action.kind == PRINT:
+        return 4 + PRINT_DIALOG_WAIT_TIME + SAVE_DIALOG_WAIT_TIME
+    if action.kind == DATE:
+        return 2.5
+    if action.kind == LOGIN:
+        return LOGIN_WAIT_TIME
+    if action.kind in (INPUT, DROPDOWN, CARD_SELECT, SUBJECT_AMOUNT):
+        return ELEMENT_WAIT
+    return 0.0
+
+
+class ActionPlan:
+    """整个工作簿的操作计划"""
+
+    def __init__(self, sequences: Dict[str, List[Action]], key: str = ""):
+        self.sequences = sequences
+        self.key = key
+
+    def cell_actions(self) -> Dict[tuple, Action]:
+        """
+        按(标题, 值)索引的单元格操作，供process_cell直接查表
+
+        只包含只由单元格本身决定的操作：#科目与金额配对得到的操作（以金额列为标题）和登录操作
+        依赖所在行的上下文，不放入全局索引；同一(标题, 值)对应不同操作时也不放入，由运行时分类
+        """
+        index: Dict[tuple, Action] = {}
+        conflicts = set()
+        for actions in self.sequences.values():
+            for action in actions:
+                if action.kind in CONTEXT_KINDS:
+                    continue
+                key = (action.title, action.value)
+                if index.setdefault(key, action) != action:
+                    conflicts.add(key)
+        for key in conflicts:
+            del index[key]
+        return index
+
+    def subset(self, sequences: List[str]) -> "ActionPlan":
+        """只保留指定序号的计划"""
+        wanted = set(sequences)
+        return ActionPlan({seq: actions for seq, actions in self.sequences.items() if seq in wanted}, self.key)
+
+    def estimate_sequence_seconds(self, sequence: str) -> float:
+        """估算一个序号的耗时"""
+        return sum(estimate_action_seconds(a) for a in self.sequences[sequence]) + RECORD_PROCESS_WAIT
+
+    def estimate_total_seconds(self) -> float:
+        """估算整个工作簿的耗时（包含首次页面加载）"""
+        return PAGE_LOAD_WAIT + sum(self.estimate_sequence_seconds(seq) for seq in self.sequences)
+
+    def to_json(self) -> Dict:
+        return {"version": PLAN_FORMAT_VERSION, "key": self.key,
+                "sequences": {seq: [asdict(a) for a in actions] for seq, actions in self.sequences.items()}}
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "ActionPlan":
+        sequences = {seq: [Action(**a) for a in actions] for seq, actions in data["sequences"].items()}
+        return cls(sequences, data.get("key", ""))
+
+    def format(self) -> str:
+        """生成可打印的计划文本"""
+        lines = []
+        for seq, actions in self.sequences.items():
+            lines.append(f"序号 {seq}: {len(actions)} 个操作，预计 {self.estimate_sequence_seconds(seq):.1f} 秒")
+            for action in actions:
+                target = f" -> {action.element_id}" if action.element_id else ""
+                extra = f" [{action.arg}]" if action.arg else ""
+                note = f"  ! {action.note}" if action.note else ""
+                lines.append(f"  {action.kind:<16} {action.title} = {action.value}{target}{extra}"
+                             f" (~{estimate_action_seconds(action):.1f}s){note}")
+        total = self.estimate_total_seconds()
+        lines.append(f"合计: {len(self.sequences)} 个序号，预计总耗时 {total:.1f} 秒 ({total / 60:.1f} 分钟)")
+        return "\n".join(lines)
+
+
+def plan_cache_key(excel_file: str, mapping_file: str, sheet_name: str) -> str:
+    """根据输入文件内容、sheet名和下拉框配置计算计划缓存键"""
+    digest = hashlib.sha256()
+    for path in (excel_file, mapping_file):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    digest.update(sheet_name.encode('utf-8'))
+    digest.update(json.dumps(DROPDOWN_FIELDS, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    digest.update(str(PLAN_FORMAT_VERSION).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def compile_plan(data, title_id_mapping: Dict[str, str]) -> ActionPlan:
+    """
+    编译整个工作簿的操作计划
+
+    Args:
+        data: 报销信息DataFrame
+        title_id_mapping: 标题-ID映射
+
+    Returns:
+        操作计划
+    """
+    def get_object_id(title: str) -> str:
+        # 映射表中的空单元格读出来是NaN，统一视为未映射
+        element_id = title_id_mapping.get(title, "")
+        return clean_cell(element_id) if not isinstance(element_id, str) else element_id
+
+    sequences = {}
+    for sequence_num, group_data in data.groupby(SEQUENCE_COL):
+        sequences[clean_cell(sequence_num)] = compile_sequence(group_data, get_object_id)
+    return ActionPlan(sequences)
+
+
+def load_or_compile_plan(excel_file: str, mapping_file: str, sheet_name: str,
+                         data, title_id_mapping: Dict[str, str],
+                         cache_dir: str = PLAN_CACHE_DIR) -> Optional[ActionPlan]:
+    """
+    从磁盘缓存加载操作计划，输入文件有变化时重新编译并写入缓存
+
+    Returns:
+        操作计划；流式读取模式（data为None）下没有缓存时返回None
+    """
+    key = plan_cache_key(excel_file, mapping_file, sheet_name)
+    cache_file = os.path.join(cache_dir, f"{key}.json")
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                plan = ActionPlan.from_json(json.load(f))
+            logger.info(f"使用已缓存的操作计划: {cache_file}")
+            return plan
+        except Exception as e:
+            logger.warning(f"读取操作计划缓存失败，重新编译: {e}")
+
+    if data is None:
+        return None
+    plan = compile_plan(data, title_id_mapping)
+    plan.key = key
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(plan.to_json(), f, ensure_ascii=False)
+        logger.info(f"操作计划已编译并缓存: {cache_file}")
+    except OSError as e:
+        logger.warning(f"写入操作计划缓存失败: {e}")
+    return plan
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+银行卡选择弹窗
+在页面的每个frame中注入MutationObserver，#paybankdiv显示或关闭时通过expose_binding立即通知Python，
+不再在每个frame中依次等待多个选择器；工号回车后弹窗没有出现（员工只有一张卡）时，
+工号查询请求结束即可判断，不必等到超时。
+选择卡号时在弹窗所在的frame中一次evaluate：按卡号尾号找到rdoacnt radio按钮并点击，再点击确定
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import NAVIGATION_GRACE, BANK_CARD_NO_DIALOG_QUIET_MS
+
+logger = logging.getLogger(__name__)
+
+Condition = Callable[[], Awaitable[bool]]
+
+BINDING_NAME = "__autoFinanBankCardDialog"
+
+SELECTED = "selected"    # 已选择卡号
+NOT_FOUND = "not_found"  # 弹窗中没有该尾号的卡
+NO_CARDS = "no_cards"    # 弹窗中还没有卡号radio按钮
+FAILED = "failed"        # 执行脚本失败（frame已卸载等）
+
+# 监听#paybankdiv的显示状态，状态变化时调用binding（参数：是否显示、卡号数量）；返回弹窗当前是否显示
+OBSERVER_SCRIPT = """(() => {
+    const visible = () => {
+        const el = document.getElementById('paybankdiv');
+        return !!el && (el.offsetWidth > 0 || el.offsetHeight > 0 || el.getClientRects().length > 0);
+    };
+    if (window.__autoFinanCardObserver) return visible();
+    let open = false;
+    const check = () => {
+        const shown = visible();
+        if (shown === open) return;
+        open = shown;
+        const count = shown ? document.querySelectorAll("#paybankdiv input[type='radio'][name='rdoacnt']").length : 0;
+        if (typeof window.__autoFinanBankCardDialog === 'function') window.__autoFinanBankCardDialog(shown, count);
+    };
+    window.__autoFinanCardObserver = new MutationObserver(check);
+    window.__autoFinanCardObserver.observe(document, {subtree: true, childList: true, attributes: true,
+                                                      attributeFilter: ['style', 'class']});
+    check();
+    return open;
+})()"""
+
+# 弹窗中卡号radio按钮的数量
+CARD_COUNT_SCRIPT = """() => {
+    const dialog = document.getElementById('paybankdiv') || document;
+    return dialog.querySelectorAll("input[type='radio'][name='rdoacnt']").length;
+}"""
+
+# 按卡号尾号（所在行文本，其次onclick属性）选择radio按钮，没有尾号时选择第一张卡；需要时点击弹窗的确定按钮
+SELECT_CARD_SCRIPT = """([tail, confirm]) => {
+    const dialog = document.getElementById('paybankdiv');
+    const scope = dialog || document;
+    const radios = Array.from(scope.querySelectorAll("input[type='radio'][name='rdoacnt']"));
+    const rowText = (radio) => {
+        const row = radio.closest('tr');
+        return (row ? row.innerText : '').replace(/\\s+/g, ' ').trim();
+    };
+    const cards = radios.map((item) => ({value: item.value, text: rowText(item)}));
+    if (!radios.length) return {status: 'no_cards', cards};
+    let radio = radios[0];
+    if (tail) {
+        radio = radios.find((item) => rowText(item).includes(tail)) ||
+                radios.find((item) => (item.getAttribute('onclick') || '').includes(tail));
+        if (!radio) return {status: 'not_found', cards};
+    }
+    radio.click();
+    let confirmed = false;
+    // 只点击弹窗自己按钮栏中的确定按钮；找不到弹窗外框时由调用方按选择器查找
+    const wrapper = dialog ? dialog.closest('.ui-dialog') : null;
+    if (confirm && wrapper) {
+        const buttons = Array.from(wrapper.querySelectorAll('.ui-dialog-buttonpane button'));
+        const button = buttons.find((item) => item.textContent.trim() === '确定');
+        if (button) {
+            button.click();
+            confirmed = true;
+        }
+    }
+    return {status: 'selected', cards, card: rowText(radio), confirmed};
+}"""
+
+# 弹窗是否显示（无法注入监听时使用）
+VISIBLE_SCRIPT = """() => {
+    const el = document.getElementById('paybankdiv');
+    return !!el && (el.offsetWidth > 0 || el.offsetHeight > 0 || el.getClientRects().length > 0);
+}"""
+
+
+class BankCardDialogWatcher:
+    """单个页面的银行卡选择弹窗监听"""
+
+    def __init__(self, page):
+        """
+        Args:
+            page: Playwright页面
+        """
+        self.page = page
+        self.installed = False
+        self._open: Dict[object, int] = {}  # 显示弹窗的frame -> 卡号数量
+        self.opened_at = 0.0
+        # max_open_lag_ms: 实测的工号查询请求结束到弹窗显示的最长延迟
+        self.stats = {"opened": 0, "max_open_lag_ms": 0.0}
+
+    async def install(self) -> bool:
+        """
+        注入监听：新文档通过init script，已加载的frame直接执行一次
+
+        Returns:
+            是否注入成功
+        """
+        try:
+            await self.page.expose_binding(BINDING_NAME, self._on_change)
+            await self.page.add_init_script(OBSERVER_SCRIPT)
+        except Exception as e:
+            logger.warning(f"注入银行卡选择弹窗监听失败，改为按选择器检查: {e}")
+            return False
+        self.page.on("framedetached", self._on_frame_detached)
+
+        async def inject(frame):
+            try:
+                # 注入时弹窗已经显示的，不等binding通知直接记录
+                if await frame.evaluate(OBSERVER_SCRIPT) and frame not in self._open:
+                    self._on_change({"frame": frame}, True, -1)
+            except Exception as e:
+                logger.debug(f"在frame中注入银行卡选择弹窗监听失败: {e}")
+        await asyncio.gather(*[inject(frame) for frame in self.page.frames])
+        self.installed = True
+        return True
+
+    def _on_change(self, source: Dict[str, Any], visible: bool, count: int):
+        frame = source.get("frame")
+        if visible:
+            if frame in self._open:
+                # 注入时已记录，binding通知随后到达
+                self._open[frame] = max(self._open[frame], count)
+                return
+            self._open[frame] = count
+            self.opened_at = time.monotonic()
+            self.stats["opened"] += 1
+            logger.debug(f"银行卡选择弹窗已显示（{count if count >= 0 else '?'} 张卡）: {getattr(frame, 'url', '')}")
+        elif self._open.pop(frame, None) is not None:
+            logger.debug("银行卡选择弹窗已关闭")
+
+    def _on_frame_detached(self, frame):
+        self._open.pop(frame, None)
+
+    def is_open(self) -> bool:
+        """当前是否有frame显示银行卡选择弹窗"""
+        return bool(self._open)
+
+    def dialog_frame(self):
+        """最近显示银行卡选择弹窗的frame，没有时返回None"""
+        return next(reversed(self._open), None) if self._open else None
+
+
+def dialog_opened(watcher: BankCardDialogWatcher) -> Condition:
+    """弹窗已显示的就绪条件"""
+    async def condition() -> bool:
+        return watcher.is_open()
+    return condition
+
+
+def dialog_resolved(watcher: BankCardDialogWatcher, network, since: float,
+                    grace: float = NAVIGATION_GRACE, quiet_ms: int = BANK_CARD_NO_DIALOG_QUIET_MS) -> Condition:
+    """
+    工号回车后的就绪条件：弹窗已显示，或工号查询请求已经结束而弹窗没有出现（员工只有一张卡）
+
+    Args:
+        watcher: 页面的弹窗监听
+        network: 页面的NetworkTracker
+        since: 回车的时间（time.monotonic）
+        grace: 等待查询请求开始的时间
+        quiet_ms: 请求结束后需要保持安静的毫秒数（下限，实测的弹窗打开延迟更长时按其2倍放宽）
+    """
+    async def condition() -> bool:
+        if watcher.is_open():
+            if watcher.opened_at >= since and network.last_activity <= watcher.opened_at:
+                lag_ms = (watcher.opened_at - network.last_activity) * 1000
+                if lag_ms > watcher.stats["max_open_lag_ms"]:
+                    watcher.stats["max_open_lag_ms"] = lag_ms
+                    logger.debug(f"银行卡选择弹窗在查询请求结束 {lag_ms:.0f} 毫秒后显示")
+            return True
+        if network.last_activity < since and time.monotonic() - since < grace:
+            return False
+        return network.is_settled(max(quiet_ms, 2 * watcher.stats["max_open_lag_ms"]))
+    return condition
+
+
+async def find_dialog_frame(page):
+    """
+    在所有frame中检查银行卡选择弹窗是否显示（无法注入监听时使用）
+
+    Returns:
+        显示弹窗的frame，没有时返回None
+    """
+    async def visible(frame):
+        try:
+            return await frame.evaluate(VISIBLE_SCRIPT)
+        except Exception:
+            return False
+    frames = list(page.frames)
+    results = await asyncio.gather(*[visible(frame) for frame in frames])
+    return next((frame for frame, shown in zip(frames, results) if shown), None)
+
+
+def cards_loaded(frame) -> Condition:
+    """弹窗中已经有卡号radio按钮的就绪条件"""
+    async def condition() -> bool:
+        return await frame.evaluate(CARD_COUNT_SCRIPT) > 0
+    return condition
+
+
+async def select_card(frame, card_tail: Optional[str], confirm: bool = True) -> Dict[str, Any]:
+    """
+    在弹窗所在的frame中一次完成卡号选择（和确定）
+
+    Args:
+        frame: 弹窗所在的frame
+        card_tail: 卡号尾号（不含*），None或空表示选择第一张卡
+        confirm: 选择后是否点击弹窗的确定按钮
+
+    Returns:
+        {"status": selected/not_found/no_cards/failed, "cards": 弹窗中的卡[{"value": radio值, "text": 所在行文本}],
+         "card": 选中的卡, "confirmed": 是否已点击确定}
+    """
+    try:
+        return await frame.evaluate(SELECT_CARD_SCRIPT, [card_tail or "", confirm])
+    except Exception as e:
+        logger.debug(f"在弹窗中选择卡号失败: {e}")
+        return {"status": FAILED, "cards": []}
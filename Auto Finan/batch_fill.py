@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量表单填写
+把同一frame中连续的普通输入框、下拉框（以及radio类型输入框）操作合并为一次页面调用：
+在页面中按原顺序设置值并触发input/change事件，遇到第一个失败的字段即停止，
+该字段回退到逐个填写的流程后，剩余字段再继续批量提交，页面收到的事件顺序与逐个填写一致
+"""
+
+import asyncio
+import logging
+from typing import List, Tuple
+
+import action_plan
+from action_plan import Action
+
+logger = logging.getLogger(__name__)
+
+# 在页面中依次设置字段值，返回每个字段是否成功（第一个失败的字段之后的字段不再设置）
+BATCH_FILL_SCRIPT = """(fields) => {
+    const apply = (field) => {
+        try {
+            const el = field.selector.startsWith('//')
+                ? document.evaluate(field.selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+                : document.querySelector(field.selector);
+            if (!el || el.disabled) return false;
+            const tag = el.tagName.toLowerCase();
+            if (field.kind === 'select') {
+                if (tag !== 'select') return false;
+                if (!Array.from(el.options).some((option) => option.value === field.value)) return false;
+                el.value = field.value;
+            } else if (tag === 'input' && el.type === 'radio') {
+                el.checked = true;
+                el.dispatchEvent(new Event('click', {bubbles: true}));
+            } else if ((tag === 'input' && el.type !== 'checkbox') || tag === 'textarea') {
+                if (el.readOnly) return false;
+                // 使用原生setter，保证框架绑定的监听能感知到值的变化
+                const setter = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(el), 'value').set;
+                setter.call(el, field.value);
+                el.dispatchEvent(new Event('input', {bubbles: true}));
+            } else {
+                return false;
+            }
+            el.dispatchEvent(new Event('change', {bubbles: true}));
+            return true;
+        } catch (e) {
+            return false;
+        }
+    };
+    const results = [];
+    for (const field of fields) {
+        const ok = apply(field);
+        results.push(ok);
+        if (!ok) break;
+    }
+    return results;
+}"""
+
+BATCHABLE_KINDS = (action_plan.INPUT, action_plan.DROPDOWN)
+
+
+def _field(action: Action, selector: str) -> dict:
+    """把操作转换为页面脚本使用的字段描述"""
+    if action.kind == action_plan.DROPDOWN:
+        return {"selector": selector, "kind": "select", "value": action.arg}
+    return {"selector": selector, "kind": "fill", "value": action.value}
+
+
+def _selectors(action: Action) -> List[str]:
+    """与fill_input/select_dropdown一致的候选选择器"""
+    element_id = action.element_id
+    tag = "select" if action.kind == action_plan.DROPDOWN else "input"
+    return [f"#{element_id}", f"{tag}[name='{element_id}']"]
+
+
+async def apply_fill_batch(index, actions: List[Action]) -> Tuple[List[Action], List[Action]]:
+    """
+    批量提交字段，遇到第一个失败的字段即停止
+
+    按原顺序把字段划分为连续的同frame片段，每个片段一次page调用
+
+    Args:
+        index: 当前页面的FrameIndex
+        actions: 排队中的INPUT/DROPDOWN操作
+
+    Returns:
+        (成功的操作, 未提交的操作)，均保持原顺序；未提交的操作不为空时，第一个是需要逐个回退处理的失败字段
+    """
+    # 未命中索引的字段并发探测
+    located = await asyncio.gather(*[index.resolve(action.element_id, _selectors(action)) for action in actions])
+
+    succeeded: List[Action] = []
+    position = 0
+    while position < len(actions):
+        if located[position] is None:
+            break
+
+        # 收集同一frame中连续的字段
+        frame = located[position][0]
+        run = []
+        while position < len(actions) and located[position] is not None and located[position][0] is frame:
+            run.append((actions[position], located[position][1]))
+            position += 1
+
+        try:
+            results = await frame.evaluate(BATCH_FILL_SCRIPT, [_field(action, selector) for action, selector in run])
+        except Exception as e:
+            logger.debug(f"批量填写调用失败: {e}")
+            results = []
+
+        for (action, _), ok in zip(run, results):
+            if not ok:
+                break
+            succeeded.append(action)
+        if len(succeeded) < position:
+            # 第一个失败的字段交给调用方逐个处理
+            index.forget(actions[len(succeeded)].element_id)
+            break
+
+    return succeeded, actions[len(succeeded):]
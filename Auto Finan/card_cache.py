@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+员工银行卡缓存
+同一批报销中相同的转卡信息工号/差旅转卡工号会反复出现，每次都要等待并解析rdoacnt银行卡列表。
+这里按工号记录观察到的结果：是否出现银行卡选择弹窗，以及弹窗中各卡的尾号、radio值和行文本。
+后续遇到同一工号时可以预测弹窗是否出现、直接选择，或完全跳过等待；
+实际页面与缓存不一致时以页面为准并更新缓存。
+开启持久化时保存到文件，供后续运行使用（文件包含卡号尾号，请勿外传）
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from config import BANK_CARD_NO_DIALOG_CONFIRMATIONS
+
+logger = logging.getLogger(__name__)
+
+
+def card_tail_of(text: str) -> str:
+    """从银行卡所在行的文本中取出卡号尾号（最后一组数字）"""
+    match = re.search(r"(\d+)\D*$", str(text))
+    return match.group(1) if match else ""
+
+
+@dataclass
+class CardProfile:
+    """一个工号观察到的银行卡信息"""
+    dialog: bool                                              # 是否出现银行卡选择弹窗
+    cards: List[Dict[str, str]] = field(default_factory=list)  # [{"tail", "value", "text"}]
+    seen: float = 0.0                                         # 最近一次观察的时间
+    observations: int = 1                                     # 连续观察到相同结果的次数
+
+    @property
+    def predicts_no_dialog(self) -> bool:
+        """是否可以预测不出现弹窗（一次观察可能是弹窗出现得晚，需要多次确认）"""
+        return not self.dialog and self.observations >= BANK_CARD_NO_DIALOG_CONFIRMATIONS
+
+    def has_tail(self, tail: str) -> bool:
+        """缓存的卡中是否有该尾号的卡"""
+        return any(tail and (card["tail"].endswith(tail) or tail in card["text"]) for card in self.cards)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"dialog": self.dialog, "cards": self.cards, "seen": self.seen, "observations": self.observations}
+
+
+class BankCardCache:
+    """工号 -> 银行卡信息（本次运行内有效，提供path时持久化）"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: 持久化文件路径，None表示只在本次运行内缓存
+        """
+        self.path = path
+        self._profiles: Dict[str, CardProfile] = {}
+        self._dirty = False
+        self.stats = {"hits": 0, "misses": 0, "mismatches": 0}
+        if path:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for work_id, item in data.items():
+                self._profiles[work_id] = CardProfile(bool(item["dialog"]), list(item.get("cards", [])),
+                                                      float(item.get("seen", 0)), int(item.get("observations", 1)))
+            logger.info(f"加载银行卡缓存: {len(self._profiles)} 个工号")
+        except Exception as e:
+            logger.warning(f"读取银行卡缓存失败，将重新观察: {e}")
+            self._profiles.clear()
+
+    def get(self, work_id: str) -> Optional[CardProfile]:
+        """
+        获取工号的银行卡信息
+
+        Args:
+            work_id: 转卡信息工号或差旅转卡工号
+
+        Returns:
+            缓存的信息，没有时返回None
+        """
+        profile = self._profiles.get(work_id) if work_id else None
+        self.stats["hits" if profile is not None else "misses"] += 1
+        return profile
+
+    def record_dialog(self, work_id: str, cards: List[Dict[str, str]]):
+        """
+        记录工号出现了银行卡选择弹窗及其中的卡
+
+        Args:
+            work_id: 工号
+            cards: 弹窗中的卡 [{"value": radio值, "text": 所在行文本}]
+        """
+        if not work_id:
+            return
+        entries = [{"tail": card_tail_of(card.get("text", "")), "value": str(card.get("value", "")),
+                    "text": card.get("text", "")} for card in cards]
+        self._update(work_id, CardProfile(True, entries, time.time()))
+
+    def record_no_dialog(self, work_id: str):
+        """记录工号没有出现银行卡选择弹窗（只有一张卡），多次观察到后才用于预测"""
+        if work_id:
+            self._update(work_id, CardProfile(False, [], time.time()))
+
+    def _update(self, work_id: str, profile: CardProfile):
+        previous = self._profiles.get(work_id)
+        if previous is not None and (previous.dialog, previous.cards) != (profile.dialog, profile.cards):
+            self.stats["mismatches"] += 1
+            logger.info(f"工号 {work_id} 的银行卡与缓存不一致，以页面为准更新缓存")
+        elif previous is not None:
+            profile.observations = previous.observations + 1
+        self._profiles[work_id] = profile
+        self._dirty = True
+
+    def invalidate(self, work_id: str):
+        """删除工号的缓存（页面与预测不一致时）"""
+        if self._profiles.pop(work_id, None) is not None:
+            self.stats["mismatches"] += 1
+            self._dirty = True
+
+    def save(self):
+        """保存到持久化文件（没有变化或未开启持久化时不写）"""
+        if not self.path or not self._dirty:
+            return
+        try:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({work_id: profile.to_dict() for work_id, profile in self._profiles.items()},
+                          f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            logger.info(f"已保存银行卡缓存: {self.path}（{len(self._profiles)} 个工号）")
+        except Exception as e:
+            logger.warning(f"保存银行卡缓存失败: {e}")
+
+    def log_stats(self):
+        """输出缓存命中统计"""
+        if any(self.stats.values()):
+            logger.debug(f"银行卡缓存: 命中 {self.stats['hits']} 次, 未命中 {self.stats['misses']} 次, "
+                         f"与页面不一致 {self.stats['mismatches']} 次")
@@ -14,6 +14,57 @@ TARGET_URL = "https://cwcx.uestc.edu.cn/WFManager/home.jsp"  # 电子科技大
 HEADLESS = False  # 是否隐藏浏览器窗口
 BROWSER_TYPE = "chromium"  # 浏览器类型: chromium, firefox, webkit
 
+# 资源拦截配置（见resource_filter.py）
+RESOURCE_FILTER_ENABLED = True  # 是否拦截自动化不需要的资源
+# 拦截的资源类型；默认不拦截图片：登录界面的验证码图片需要人工识别后在控制台输入，
+# 手动加入"image"时验证码地址由下面的白名单放行
+BLOCKED_RESOURCE_TYPES = ("font", "media")
+BLOCKED_URL_PATTERNS = (  # 拦截的URL通配符模式（不区分大小写）
+    "*google-analytics.com/*",
+    "*googletagmanager.com/*",
+    "*hm.baidu.com/*",
+    "*cnzz.com/*",
+    "*/banner/*",
+)
+ALLOWED_URL_PATTERNS = (  # 始终放行的URL（表单实际需要的资源），优先于拦截规则
+    "*datepicker*",  # 日期控件图标
+    "*calendar*",
+    "*print*",  # 打印确认单中的图片
+    "*captcha*",  # 登录验证码图片
+    "*kaptcha*",
+    "*verifycode*",
+    "*validatecode*",
+    "*checkcode*",
+    "*yzm*",
+)
+RESOURCE_ESTIMATED_BYTES = {  # 各资源类型单个请求的估算大小（字节），用于统计节省量
+    "image": 20 * 1024,
+    "font": 60 * 1024,
+    "media": 200 * 1024,
+    "script": 30 * 1024,
+    "stylesheet": 15 * 1024,
+    "other": 5 * 1024,
+}
+
+# 并行处理配置
+WORKER_COUNT = 1  # 并行worker数量（每个worker使用独立的浏览器上下文，可通过--workers覆盖）
+SHARD_COUNT = 2  # shard_launcher.py的默认分片（进程）数量
+SHARD_OUTPUT_DIR = "shard_runs"  # 分片运行的报告和日志输出目录
+PLAN_CACHE_DIR = "plan_cache"  # 预编译操作计划的缓存目录（按输入文件内容哈希命名）
+INPUT_CACHE_ENABLED = True  # 是否缓存Excel输入文件的解析结果（按路径、修改时间和大小判断是否有效）
+INPUT_CACHE_DIR = "input_cache"  # 输入文件解析结果的缓存目录
+STREAM_INPUT = False  # 是否流式读取报销信息表（逐个序号组读取，适合行数很多的sheet，可通过--stream开启）
+RUN_JOURNAL_FILE = "run_journal.jsonl"  # 只追加的运行日志，记录每个序号的处理结果（--resume据此跳过已成功的序号）
+RESULT_WRITEBACK_ENABLED = True  # 是否把处理结果写入结果工作簿（不修改报销信息表本身）
+RESULT_CHECKPOINT_EVERY = 10  # 每处理多少个序号保存一次结果工作簿（运行结束时总会保存）
+RESULTS_SHEET_NAME = "处理结果"  # 结果工作簿中的sheet名称
+RESULT_WORKBOOK_SUFFIX = "_处理结果"  # 结果工作簿文件名后缀（如 报销信息_处理结果.xlsx，与报销信息表在同一目录）
+PREFLIGHT_ENABLED = True  # 启动浏览器前是否检查整个工作簿（映射、日期、下拉框值、科目金额），有问题时不启动
+MAPPING_VERIFY_REPORT = "mapping_verify_report.json"  # --verify-mapping的在线映射校验报告（也是下次校验比较frame位置的基准）
+# --verify-mapping在这些按钮前停止（完成预约/发放等最终步骤的按钮，点击会产生真实业务数据）；
+# 打印按钮、预约按钮（$预约）和标题含"提交"的按钮总是视为最终步骤
+MAPPING_VERIFY_STOP_TITLES = ("预约按钮", "确定返回按钮")
+
 # 等待时间配置（秒）
 PAGE_LOAD_WAIT = 10  # 页面加载等待时间
 ELEMENT_WAIT = 0.2  # 元素等待时间
@@ -22,6 +73,31 @@ RECORD_PROCESS_WAIT = 0.5  # 记录处理等待时间
 SUBJECT_AMOUNT_WAIT = 5  # 科目金额填写前的页面加载等待时间
 BANK_CARD_SELECTION_WAIT = 1  # 银行卡选择等待时间（缩减）
 BANK_CARD_DIALOG_WAIT = 2  # 银行卡选择弹窗等待时间（缩减）
+CARD_SELECTED_WAIT = 2  # 选择银行卡后等待选择生效的时间
+WORK_ID_EVENT_WAIT = 2  # 工号填写后等待页面脚本处理的时间
+INPUT_SETTLE_WAIT = 0.5  # 输入完成后按回车前的等待时间
+PRINT_PAGE_READY_WAIT = 2  # 点击打印确认单按钮前等待页面加载的时间
+PRINT_PREVIEW_WAIT = 2  # 点击打印确认单按钮后等待Chrome打印页面加载的时间
+# 以上等待时间均为等待点的上限：就绪条件满足后立即继续（见wait_policy.py）
+WAIT_POLL_INTERVAL = 0.2  # 就绪条件的检查间隔
+NAVIGATION_GRACE = 1.0  # 点击后等待导航开始的时间，超过后按局部刷新处理
+DOM_QUIET_MS = 300  # DOM连续多少毫秒没有变化视为页面脚本处理完成
+PRE_CLICK_WAIT = 0.5  # 点击按钮前等待页面请求结束的上限
+NETWORK_QUIET_MS = 500  # 没有进行中的请求且持续多少毫秒视为网络安静
+# 工号查询请求结束后多少毫秒仍没有银行卡选择弹窗，视为只有一张卡（下限）。弹窗由查询响应的页面脚本打开，
+# 与页面脚本处理完成、网络安静使用同一量级；运行中观察到的弹窗打开延迟更长时按实测延迟的2倍放宽
+BANK_CARD_NO_DIALOG_QUIET_MS = 500
+BANK_CARD_NO_DIALOG_CONFIRMATIONS = 2  # 同一工号至少观察到几次没有弹窗后，才按缓存跳过弹窗等待
+BANK_CARD_CACHE_PERSIST = False  # 是否把工号 -> 银行卡的观察结果保存到文件供后续运行使用（默认只在本次运行内缓存）
+BANK_CARD_CACHE_FILE = "bank_card_cache.json"  # 银行卡缓存文件（包含卡号尾号，请勿外传）
+STRATEGY_STATS_PERSIST = True  # 是否保存各备选策略（填写/点击方法）的成功统计，后续运行按学到的顺序尝试
+STRATEGY_STATS_FILE = "strategy_stats.json"  # 策略统计文件
+NETWORK_STALE_REQUEST = 10  # 超过多少秒仍未结束的请求视为长连接，不影响就绪判断
+NETWORK_IGNORED_RESOURCE_TYPES = ("image", "media", "font", "websocket", "eventsource")  # 不参与网络安静判断的资源类型
+FRAME_INDEX_NEGATIVE_TTL = 0.5  # 确认元素不存在后，多长时间内不再在各frame中重复探测
+BATCH_FILL_ENABLED = True  # 是否把同一frame中连续的普通输入框/下拉框合并为一次页面调用填写
+DROPDOWN_CANDIDATE_COUNT = 3  # 下拉框的值匹配不到选项时，报告的最接近候选项数量
+DROPDOWN_MATCH_CUTOFF = 0.5  # 候选项的最低相似度（difflib，0~1）
 
 # 下拉框字段配置（需要根据实际情况调整）
 DROPDOWN_FIELDS = {
@@ -173,6 +249,8 @@ BUTTON_PREFIX = "$"  # 按钮操作的前缀标识
 RADIO_BUTTON_PREFIX = "$$"  # radio按钮操作的前缀标识
 NAVIGATION_PREFIX = "@"  # 系统导览框操作的前缀标识
 CARD_NUMBER_PREFIX = "*"  # 卡号尾号选择前缀
+# 由银行卡选择弹窗读取的卡号尾号列（没有标题-ID映射，不作为表单字段填写）
+CARD_TAIL_COLUMNS = ("卡号尾号", "差旅卡号尾号")
 
 # 子序列处理配置
 SUBSEQUENCE_START_COL = "子序列开始"  # 子序列开始列名
@@ -208,6 +286,7 @@ LOG_FILE = "reimbursement_automation.log"
 SUBSEQUENCE_START_COL = "子序列开始"
 SUBSEQUENCE_END_COL = "子序列结束"
 SEQUENCE_COL = "序号"
+PROGRESS_COL = "处理进度"  # 结果工作簿中的处理进度列（旧版本回写到报销信息表中的同名列在检查时忽略）
 
 # 错误重试配置
 MAX_RETRIES = 3
@@ -220,6 +299,17 @@ VALIDATION_TIMEOUT = 10  # 验证超时时间
 # 登录相关配置
 LOGIN_WAIT_TIME = 5  # 登录后等待时间
 CAPTCHA_INPUT_PROMPT = "请输入验证码: "  # 验证码输入提示
+CAPTCHA_IMAGE_DIR = "captcha_images"  # 无头模式下保存验证码截图的目录（控制台打印截图路径）
+CAPTCHA_IMAGE_SELECTORS = [  # 验证码图片选择器，都未找到时保存整个登录页面的截图
+    "img[src*='captcha']",
+    "img[id*='captcha']",
+    "img[src*='Captcha']",
+    "img[src*='verifycode']",
+    "img[id*='code']",
+]
+SESSION_REUSE_ENABLED = True  # 是否按工号保存并复用登录会话（跳过验证码登录）
+SESSION_STORE_DIR = "login_sessions"  # 登录会话保存目录（包含会话cookie，请勿外传）
+SESSION_MAX_AGE_HOURS = 8  # 保存的会话最长复用时间（小时）
 
 # 打印对话框坐标配置
 # 这些坐标需要根据实际屏幕分辨率手动获取并填入
@@ -250,4 +340,12 @@ PRINT_DIALOG_COORDINATES = {
 PRINT_OUTPUT_DIR = "pdf_output"  # PDF输出目录
 PRINT_DIALOG_WAIT_TIME = 3       # 等待打印对话框出现的时间
 SAVE_DIALOG_WAIT_TIME = 2        # 等待保存对话框出现的时间
-PRINT_FILE_PATH = r"C:\Users\FH\PycharmProjects\CursorCode8-5\pdf_output"  # 打印文件保存路径 
\ No newline at end of file
+PRINT_FILE_PATH = r"C:\Users\FH\PycharmProjects\CursorCode8-5\pdf_output"  # 打印文件保存路径
+PRINT_MODE = "dialog"  # 打印方式: dialog（Chrome打印对话框+鼠标键盘脚本）, pdf（直接渲染PDF，可无头运行）
+PRINT_PDF_FORMAT = "A4"  # pdf模式的纸张大小
+PRINT_PDF_TIMEOUT = 10  # pdf模式下点击打印按钮后等待文档请求打印的最长时间（秒）
+INPUT_WORKER_ENABLED = True  # dialog模式下使用常驻输入worker处理打印对话框（否则每次打印启动一个子进程）
+INPUT_WORKER_PORT = 47651  # 常驻输入worker监听的本地端口
+INPUT_WORKER_START_TIMEOUT = 15  # 等待常驻输入worker启动的最长时间（秒）
+INPUT_WORKER_JOB_TIMEOUT = 120  # 单个输入任务（含排队）的最长时间（秒）
+INPUT_WORKER_DIALOG_WAIT = 1  # 常驻worker开始操作前等待打印对话框的时间（打印预览已单独等待）
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨进程的控制台输入锁
+shard_launcher.py启动的多个分片进程共用同一个控制台，验证码提示和输入会交错，
+输入的验证码可能被另一个分片读走。这里用操作系统文件锁保证同一时间只有一个进程在等待输入；
+持有锁的进程退出时操作系统会自动释放锁，不会留下失效的锁文件。
+同步代码（如保存统计文件）使用 with 语句，阻塞等待锁
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+
+class ConsoleFileLock:
+    """基于文件锁的上下文管理器，支持 async with 和 with（path为None时不加锁）"""
+
+    def __init__(self, path: Optional[str] = None, poll_interval: float = 0.2,
+                 wait_message: str = "其他分片正在输入验证码，等待控制台空闲..."):
+        """
+        Args:
+            path: 锁文件路径，同一次分片运行的所有进程使用同一个文件
+            poll_interval: 锁被占用时重试的间隔（秒）
+            wait_message: 锁被其他进程占用时记录的日志
+        """
+        self.path = path
+        self.poll_interval = poll_interval
+        self.wait_message = wait_message
+        self._fd = None
+
+    def _try_lock(self) -> bool:
+        try:
+            if msvcrt is not None:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    async def __aenter__(self):
+        if not self.path:
+            return self
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        waited = False
+        while not self._try_lock():
+            if not waited:
+                logger.info(self.wait_message)
+                waited = True
+            await asyncio.sleep(self.poll_interval)
+        return self
+
+    def __enter__(self):
+        if not self.path:
+            return self
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        waited = False
+        while not self._try_lock():
+            if not waited:
+                logger.info(self.wait_message)
+                waited = True
+            time.sleep(self.poll_interval)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._release()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._release()
+
+    def _release(self):
+        if self._fd is None:
+            return
+        try:
+            if msvcrt is not None:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        except OSError as e:
+            logger.debug(f"释放控制台输入锁失败: {e}")
+        finally:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+jQuery UI日历控件的快速设置
+在输入框所在的frame中一次evaluate：通过页面自己的datepicker API（setDate）设置日期，
+触发onSelect和change事件，并在同一次调用中按控件的dateFormat解析输入框的值进行校验；
+页面没有datepicker API（或输入框未绑定日历控件）时返回no_api，由调用方回退到点击日历的方式
+"""
+
+import logging
+import re
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"              # 设置成功且输入框的值已校验
+NO_API = "no_api"      # 没有可用的datepicker API
+MISMATCH = "mismatch"  # 设置后输入框的值与目标日期不一致（如超出minDate/maxDate）
+MISSING = "missing"    # 输入框不存在
+
+DATEPICKER_SCRIPT = """([selector, year, month, day]) => {
+    const el = document.querySelector(selector);
+    if (!el) return {status: 'missing'};
+    const $ = window.jQuery;
+    if (!$ || !$.datepicker || !$.fn.datepicker || !$(el).hasClass('hasDatepicker')) return {status: 'no_api'};
+    const $el = $(el);
+    $el.datepicker('setDate', new Date(year, month - 1, day));
+    // setDate不会触发onSelect，按点击日期的方式通知页面脚本
+    const onSelect = $el.datepicker('option', 'onSelect');
+    if (typeof onSelect === 'function') onSelect.call(el, el.value, $.datepicker._getInst(el));
+    $el.trigger('change');
+    let parsed = null;
+    try {
+        parsed = $.datepicker.parseDate($el.datepicker('option', 'dateFormat'), el.value);
+    } catch (e) {}
+    const ok = !!parsed && parsed.getFullYear() === year && parsed.getMonth() === month - 1 && parsed.getDate() === day;
+    return {status: ok ? 'ok' : 'mismatch', value: el.value};
+}"""
+
+
+def parse_date(value: str) -> Optional[Tuple[int, int, int]]:
+    """解析yyyy-mm-dd格式的日期，格式不对时返回None"""
+    match = re.fullmatch(r"\s*(\d{4})-(\d{1,2})-(\d{1,2})\s*", str(value))
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2)), int(match.group(3))
+
+
+async def set_date(frame, selector: str, value: str) -> Dict[str, Any]:
+    """
+    通过datepicker API设置日期并校验
+
+    Args:
+        frame: 输入框所在的frame
+        selector: 输入框的选择器
+        value: 日期（yyyy-mm-dd）
+
+    Returns:
+        {"status": ok/no_api/mismatch/missing, "value": 设置后输入框的值}
+    """
+    parsed = parse_date(value)
+    if parsed is None:
+        return {"status": MISMATCH, "value": ""}
+    try:
+        return await frame.evaluate(DATEPICKER_SCRIPT, [selector, *parsed])
+    except Exception as e:
+        logger.debug(f"调用datepicker API失败: {e}")
+        return {"status": NO_API, "value": ""}
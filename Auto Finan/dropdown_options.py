@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下拉框选项预读取与本地匹配
+每个<select>的选项列表在同一页面状态下只读取一次并缓存（frame导航后失效），
+工作簿中的值在本地依次按 原值、DROPDOWN_FIELDS映射值、规范化文本（NFKC、去掉全角/半角空格）匹配，
+匹配成功后只做一次确定的选择；匹配不到时不再重试，直接给出最接近的候选项
+"""
+
+import difflib
+import logging
+import re
+import time
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import DROPDOWN_FIELDS, DROPDOWN_CANDIDATE_COUNT, DROPDOWN_MATCH_CUTOFF
+
+logger = logging.getLogger(__name__)
+
+# 读取下拉框的所有选项（value和显示文本），不是<select>时返回null
+OPTIONS_SCRIPT = """(selector) => {
+    const el = document.querySelector(selector);
+    if (!el || el.tagName.toLowerCase() !== 'select') return null;
+    return Array.from(el.options, (option) => [option.value, option.text]);
+}"""
+
+Option = Tuple[str, str]  # (value, 显示文本)
+
+
+def normalize_option(text: str) -> str:
+    """
+    规范化选项文本：NFKC（全角括号、全角空格转为半角），去掉所有空白，忽略大小写
+
+    例如 "广　西（南宁）" 和 "广西(南宁)" 规范化后相同
+    """
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", str(text))).lower()
+
+
+def mapped_values(value: str, field_config: Optional[Dict[str, str]] = None) -> List[str]:
+    """
+    工作簿中的值按DROPDOWN_FIELDS映射后的候选值
+
+    Args:
+        value: 工作簿中的值
+        field_config: 该字段的DROPDOWN_FIELDS配置，None表示在所有配置中查找
+
+    Returns:
+        去重后的候选值（原值在前）
+    """
+    configs = [field_config] if field_config else DROPDOWN_FIELDS.values()
+    candidates = [value]
+    for config in configs:
+        if value in config:
+            candidates.append(config[value])
+    return list(dict.fromkeys(candidates))
+
+
+def resolve_option(value: str, options: Iterable[Option],
+                   field_config: Optional[Dict[str, str]] = None) -> Tuple[Optional[str], List[str]]:
+    """
+    在选项列表中为工作簿的值找到要选择的option value
+
+    Args:
+        value: 工作簿中的值（或已经映射后的值）
+        options: 下拉框的(value, 显示文本)列表
+        field_config: 该字段的DROPDOWN_FIELDS配置
+
+    Returns:
+        (option value, 候选项)：匹配成功时候选项为空；匹配失败时option value为None，
+        候选项为最接近的若干个选项文本
+    """
+    options = list(options)
+    wanted = mapped_values(value, field_config)
+
+    # 按value或显示文本精确匹配
+    for candidate in wanted:
+        for option_value, option_text in options:
+            if candidate == option_value or candidate == option_text:
+                return option_value, []
+
+    # 规范化后匹配
+    normalized = {}
+    for option_value, option_text in options:
+        normalized.setdefault(normalize_option(option_text), option_value)
+        normalized.setdefault(normalize_option(option_value), option_value)
+    for candidate in wanted:
+        key = normalize_option(candidate)
+        if key and key in normalized:
+            return normalized[key], []
+
+    texts = [option_text for _, option_text in options if option_text.strip()]
+    by_normalized = {normalize_option(text): text for text in texts}
+    close = difflib.get_close_matches(normalize_option(value), list(by_normalized),
+                                      n=DROPDOWN_CANDIDATE_COUNT, cutoff=DROPDOWN_MATCH_CUTOFF)
+    return None, [by_normalized[key] for key in close]
+
+
+class DropdownOptionCache:
+    """按(frame, 选择器)缓存下拉框选项，frame导航后失效"""
+
+    def __init__(self):
+        self._options: Dict[Tuple[int, str], Tuple[object, float, List[Option]]] = {}
+        self.stats = {"reads": 0, "hits": 0}
+
+    async def options(self, frame, selector: str, index=None) -> Optional[List[Option]]:
+        """
+        获取下拉框的选项列表
+
+        Args:
+            frame: 下拉框所在的frame
+            selector: 下拉框的选择器
+            index: 当前页面的FrameIndex（用其最近一次导航时间判断缓存是否仍有效）
+
+        Returns:
+            (value, 显示文本)列表，元素不是<select>时返回None
+        """
+        key = (id(frame), selector)
+        cached = self._options.get(key)
+        if cached is not None:
+            cached_frame, fetched_at, options = cached
+            navigated = index is not None and index.last_navigation > fetched_at
+            if cached_frame is frame and not navigated and not frame.is_detached():
+                self.stats["hits"] += 1
+                return options
+
+        self.stats["reads"] += 1
+        options = await frame.evaluate(OPTIONS_SCRIPT, selector)
+        if options is None:
+            return None
+        options = [(str(option_value), str(option_text)) for option_value, option_text in options]
+        self._options[key] = (frame, time.monotonic(), options)
+        return options
+
+    def invalidate(self, frame=None, selector: Optional[str] = None):
+        """
+        使缓存失效（选项被页面脚本改变、选择失败时调用）
+
+        Args:
+            frame: 只清除该frame中的记录；None表示全部清除
+            selector: 只清除该选择器的记录
+        """
+        if frame is None:
+            self._options.clear()
+            return
+        if selector is not None:
+            self._options.pop((id(frame), selector), None)
+            return
+        for key in [key for key in self._options if key[0] == id(frame)]:
+            del self._options[key]
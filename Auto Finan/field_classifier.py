@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字段类型识别
+在真实页面上检查每个映射元素一次（标签名、type、readonly、dateinput属性、dateInput类、
+是否绑定了jQuery UI日历控件），得到字段类型并按element_id缓存；
+之后同一元素的所有单元格直接使用对应的填写方式，不再根据element_id中的date/start/end等子串猜测
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DATE = "date"            # 日期输入框（日历控件）
+SELECT = "select"        # 下拉框
+TEXT = "text"            # 可编辑的输入框/文本域
+READONLY = "readonly"    # 只读输入框（非日期）
+RADIO = "radio"
+CHECKBOX = "checkbox"
+BUTTON = "button"
+OTHER = "other"
+
+INSPECT_SCRIPT = """(selector) => {
+    const el = document.querySelector(selector);
+    if (!el) return null;
+    const $ = window.jQuery;
+    let datepicker = el.classList.contains('hasDatepicker');
+    try {
+        datepicker = datepicker || !!($ && $(el).data('datepicker'));
+    } catch (e) {}
+    return {
+        tag: el.tagName.toLowerCase(),
+        type: (el.getAttribute('type') || '').toLowerCase(),
+        readonly: !!el.readOnly || el.hasAttribute('readonly'),
+        disabled: !!el.disabled,
+        dateinput: el.hasAttribute('dateinput'),
+        dateInputClass: el.classList.contains('dateInput'),
+        datepicker: datepicker,
+    };
+}"""
+
+
+@dataclass(frozen=True)
+class FieldInfo:
+    """一个元素的检查结果"""
+    kind: str
+    tag: str = ""
+    input_type: str = ""
+    readonly: bool = False
+    datepicker: bool = False
+
+
+def classify_element(props: Dict) -> FieldInfo:
+    """
+    根据元素属性确定字段类型
+
+    Args:
+        props: INSPECT_SCRIPT返回的属性
+
+    Returns:
+        字段信息
+    """
+    tag = props.get("tag", "")
+    input_type = props.get("type", "")
+    readonly = bool(props.get("readonly"))
+    datepicker = bool(props.get("datepicker"))
+
+    if tag == "select":
+        kind = SELECT
+    elif tag == "input" and input_type == "radio":
+        kind = RADIO
+    elif tag == "input" and input_type == "checkbox":
+        kind = CHECKBOX
+    elif (tag == "input" and input_type in ("button", "submit", "image", "reset")) or tag in ("button", "a"):
+        kind = BUTTON
+    elif (datepicker or props.get("dateinput") or props.get("dateInputClass") or input_type == "date") \
+            and tag in ("input", "textarea"):
+        kind = DATE
+    elif tag in ("input", "textarea"):
+        kind = READONLY if readonly else TEXT
+    else:
+        kind = OTHER
+    return FieldInfo(kind, tag, input_type, readonly, datepicker)
+
+
+class FieldClassifier:
+    """按element_id缓存的字段类型识别"""
+
+    def __init__(self):
+        self._fields: Dict[str, FieldInfo] = {}
+        self.stats = {"inspected": 0, "hits": 0}
+
+    def cached(self, element_id: str) -> Optional[FieldInfo]:
+        """已经识别过的字段信息"""
+        return self._fields.get(element_id)
+
+    async def classify(self, index, element_id: str) -> Optional[FieldInfo]:
+        """
+        识别元素的字段类型（每个element_id只在页面上检查一次）
+
+        Args:
+            index: 当前页面的FrameIndex
+            element_id: 元素ID
+
+        Returns:
+            字段信息，元素当前不在页面上时返回None（不缓存，下次再检查）
+        """
+        info = self._fields.get(element_id)
+        if info is not None:
+            self.stats["hits"] += 1
+            return info
+
+        located = await index.resolve(element_id, [f"#{element_id}", f"[name='{element_id}']"])
+        if not located:
+            return None
+        frame, selector = located
+        try:
+            props = await frame.evaluate(INSPECT_SCRIPT, selector)
+        except Exception as e:
+            logger.debug(f"检查元素类型失败: {element_id} - {e}")
+            return None
+        if not props:
+            index.forget(element_id)
+            return None
+
+        info = classify_element(props)
+        self._fields[element_id] = info
+        self.stats["inspected"] += 1
+        logger.debug(f"元素 {element_id} 识别为 {info.kind}（{info.tag}"
+                     f"{'[' + info.input_type + ']' if info.input_type else ''}"
+                     f"{'，只读' if info.readonly else ''}{'，日历控件' if info.datepicker else ''}）")
+        return info
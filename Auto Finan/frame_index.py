@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+元素所在frame索引
+记录每个元素（按element_id等键）上一次在哪个frame、用哪个选择器找到，
+命中时直接在该frame中操作，不再逐个frame、逐个选择器地count()探测；
+frame挂载、卸载或导航时自动失效，确认不存在的元素在短时间内不再重复探测
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import FRAME_INDEX_NEGATIVE_TTL
+
+logger = logging.getLogger(__name__)
+
+# 在一个frame中按顺序检查候选选择器，返回第一个存在的选择器下标（//开头的按XPath处理）
+PROBE_SCRIPT = """(selectors) => {
+    for (let i = 0; i < selectors.length; i++) {
+        const selector = selectors[i];
+        try {
+            const found = selector.startsWith('//')
+                ? document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+                : document.querySelector(selector);
+            if (found) return i;
+        } catch (e) {}
+    }
+    return -1;
+}"""
+
+
+class FrameIndex:
+    """单个页面的元素 -> (frame, 选择器)索引"""
+
+    def __init__(self, page, negative_ttl: float = FRAME_INDEX_NEGATIVE_TTL):
+        """
+        初始化索引并订阅页面的frame生命周期事件
+
+        Args:
+            page: Playwright页面
+            negative_ttl: 确认元素不存在后，多长时间内（秒）不再重复探测
+        """
+        self.page = page
+        self.negative_ttl = negative_ttl
+        self._located: Dict[str, Tuple[object, str]] = {}
+        self._absent: Dict[Tuple[str, Tuple[str, ...]], float] = {}
+        self.stats = {"hits": 0, "probes": 0, "absent_hits": 0, "invalidations": 0}
+        self.last_navigation = 0.0  # 最近一次frame导航的时间（time.monotonic）
+
+        page.on("frameattached", self._on_frame_attached)
+        page.on("framedetached", self._on_frame_changed)
+        page.on("framenavigated", self._on_frame_navigated)
+
+    def _on_frame_attached(self, frame):
+        # 新frame可能包含之前确认不存在的元素
+        self._absent.clear()
+
+    def _on_frame_changed(self, frame):
+        self.invalidate(frame)
+
+    def _on_frame_navigated(self, frame):
+        self.last_navigation = time.monotonic()
+        self.invalidate(frame)
+
+    def invalidate(self, frame=None):
+        """
+        使索引失效
+
+        Args:
+            frame: 只清除该frame中的记录；None表示全部清除
+        """
+        self.stats["invalidations"] += 1
+        self._absent.clear()
+        if frame is None:
+            self._located.clear()
+            return
+        for key in [key for key, (located_frame, _) in self._located.items() if located_frame is frame]:
+            del self._located[key]
+
+    def forget(self, key: str):
+        """记录的位置已经失效（操作失败）时调用"""
+        self._located.pop(key, None)
+
+    async def _probe(self, frame, selectors: List[str]) -> int:
+        try:
+            return await frame.evaluate(PROBE_SCRIPT, selectors)
+        except Exception as e:
+            logger.debug(f"在frame中探测元素失败: {e}")
+            return -1
+
+    async def resolve(self, key: str, selectors: Sequence[str]) -> Optional[Tuple[object, str]]:
+        """
+        查找元素所在的frame和可用的选择器
+
+        命中索引时不访问页面；未命中时在所有frame中并发探测一次，
+        按选择器优先级、再按frame顺序（主页面在前）选择结果
+
+        Args:
+            key: 索引键（通常为element_id）
+            selectors: 按优先级排列的候选选择器
+
+        Returns:
+            (frame, 选择器)，找不到时返回None
+        """
+        selectors = list(selectors)
+        located = self._located.get(key)
+        if located is not None and located[1] in selectors and not located[0].is_detached():
+            self.stats["hits"] += 1
+            return located
+
+        absent_key = (key, tuple(selectors))
+        absent_since = self._absent.get(absent_key)
+        if absent_since is not None and time.monotonic() - absent_since < self.negative_ttl:
+            self.stats["absent_hits"] += 1
+            return None
+
+        self.stats["probes"] += 1
+        frames = self.page.frames
+        results = await asyncio.gather(*[self._probe(frame, selectors) for frame in frames])
+        best = None
+        for frame, selector_idx in zip(frames, results):
+            if selector_idx >= 0 and (best is None or selector_idx < best[1]):
+                best = (frame, selector_idx)
+
+        if best is None:
+            self._absent[absent_key] = time.monotonic()
+            return None
+
+        located = (best[0], selectors[best[1]])
+        self._located[key] = located
+        self._absent.pop(absent_key, None)
+        return located
+
+    def frame_label(self, frame) -> str:
+        """用于日志的frame描述"""
+        if frame is self.page.main_frame:
+            return "主页面"
+        try:
+            return f"iframe {self.page.frames.index(frame)}"
+        except ValueError:
+            return "iframe"
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输入文件解析缓存
+把pd.read_excel解析得到的DataFrame（以及由映射表生成的字典）用pickle保存在本地缓存目录中，
+按文件路径、修改时间和大小判断是否有效：输入文件没有变化时直接加载缓存，
+不再每次运行都通过openpyxl重新解析工作簿
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import time
+from typing import Any, Callable
+
+from config import INPUT_CACHE_DIR, INPUT_CACHE_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# 缓存内容格式变化时递增，使旧缓存失效
+INPUT_CACHE_VERSION = 1
+
+
+def _file_stamp(path: str) -> tuple:
+    """文件的修改时间和大小"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _cache_file(path: str, variant: str, cache_dir: str) -> str:
+    """同一个文件的同一种读取方式对应一个缓存文件，输入变化时覆盖"""
+    digest = hashlib.sha1(f"{os.path.abspath(path)}|{variant}".encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.{digest}.pkl")
+
+
+def load_cached(path: str, variant: str, build: Callable[[], Any], cache_dir: str = INPUT_CACHE_DIR) -> Any:
+    """
+    加载缓存的解析结果，缓存不存在或输入文件已变化时调用build重新解析并写入缓存
+
+    Args:
+        path: 输入文件路径
+        variant: 读取方式的描述（sheet名、读取参数等），不同读取方式分别缓存
+        build: 解析输入文件的函数
+        cache_dir: 缓存目录
+
+    Returns:
+        解析结果
+    """
+    if not INPUT_CACHE_ENABLED:
+        return build()
+
+    stamp = (INPUT_CACHE_VERSION, os.path.abspath(path), variant, _file_stamp(path))
+    cache_file = _cache_file(path, variant, cache_dir)
+    if os.path.exists(cache_file):
+        started = time.perf_counter()
+        try:
+            with open(cache_file, 'rb') as f:
+                cached_stamp, value = pickle.load(f)
+            if cached_stamp == stamp:
+                logger.info(f"使用输入缓存: {os.path.basename(path)} ({variant})，"
+                            f"用时 {(time.perf_counter() - started) * 1000:.0f} 毫秒")
+                return value
+            logger.info(f"输入文件 {os.path.basename(path)} 已变化，重新解析")
+        except Exception as e:
+            logger.warning(f"读取输入缓存失败，重新解析: {e}")
+
+    value = build()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # 先写临时文件再替换，避免并行的分片进程读到写了一半的缓存
+        temp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as f:
+            pickle.dump((stamp, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        logger.warning(f"写入输入缓存失败: {e}")
+    return value
+
+
+def cached_read_excel(path: str, sheet_name=0, **kwargs) -> "pd.DataFrame":
+    """
+    带缓存的pd.read_excel
+
+    Args:
+        path: Excel文件路径
+        sheet_name: sheet名称或序号
+        **kwargs: 传给pd.read_excel的其他参数
+
+    Returns:
+        解析得到的DataFrame
+    """
+    import pandas as pd
+
+    variant = f"read_excel|{sheet_name}|{sorted(kwargs.items())!r}"
+    return load_cached(path, variant, lambda: pd.read_excel(path, sheet_name=sheet_name, **kwargs))
+
+
+def cached_title_id_mapping(path: str) -> dict:
+    """
+    带缓存地读取标题-ID映射表（第一列为标题，第二列为元素ID）
+
+    Args:
+        path: 映射Excel文件路径
+
+    Returns:
+        标题 -> 元素ID字典
+    """
+    def read_mapping():
+        import pandas as pd
+        mapping_df = pd.read_excel(path)
+        return dict(zip(mapping_df.iloc[:, 0], mapping_df.iloc[:, 1]))
+    return load_cached(path, "title_id_mapping", read_mapping)
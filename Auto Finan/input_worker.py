@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻输入worker客户端
+每次运行只启动一次 mouse_keyboard_automation.py --serve，之后的打印对话框任务
+通过本地端口提交并返回结构化结果，不再每次打印都启动子进程、导入pyautogui、等待初始化；
+端口上已有worker（例如其他分片进程启动的）时直接复用，任务在worker中串行执行；
+每个客户端在worker中登记，最后一个客户端结束时worker才退出
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+from config import INPUT_WORKER_PORT, INPUT_WORKER_START_TIMEOUT, INPUT_WORKER_JOB_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 打印对话框使用整个屏幕的鼠标键盘，同一台机器上使用同一个worker端口的所有进程共用这个锁文件
+PRINT_LOCK_FILE = os.path.join(tempfile.gettempdir(), f"auto_finan_print_{INPUT_WORKER_PORT}.lock")
+
+
+class InputWorkerClient:
+    """常驻输入worker的异步客户端（同一进程中的多个worker共享一个实例）"""
+
+    def __init__(self, port: int = INPUT_WORKER_PORT):
+        self.port = port
+        self.process: Optional[asyncio.subprocess.Process] = None  # 由本客户端启动的worker进程
+        self.client_id = f"{os.getpid()}-{id(self)}"  # 在worker中登记的客户端标识
+        self.attached = False
+        self._start_lock = asyncio.Lock()
+        self._submit_lock = asyncio.Lock()
+
+    async def _request(self, job: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", self.port), timeout)
+        try:
+            writer.write((json.dumps(job, ensure_ascii=False) + "\n").encode('utf-8'))
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if not line:
+                raise ConnectionError("输入worker关闭了连接")
+            return json.loads(line.decode('utf-8'))
+        finally:
+            writer.close()
+
+    async def ping(self) -> bool:
+        """worker是否在运行"""
+        try:
+            return (await self._request({"operation": "ping"}, 2)).get("ok", False)
+        except Exception:
+            return False
+
+    async def attach(self) -> bool:
+        """在worker中登记本客户端（重复登记无影响），worker不在运行时返回False"""
+        try:
+            self.attached = (await self._request({"operation": "attach", "client": self.client_id}, 2)).get("ok", False)
+        except Exception:
+            return False
+        return self.attached
+
+    async def ensure_started(self):
+        """确保端口上有worker在运行并已登记本客户端，没有时启动一个"""
+        async with self._start_lock:
+            if await self.attach():
+                return
+            logger.info(f"启动常驻输入worker（端口 {self.port}）...")
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.join(SCRIPT_DIR, "mouse_keyboard_automation.py"),
+                "--serve", "--port", str(self.port), cwd=SCRIPT_DIR)
+            deadline = time.monotonic() + INPUT_WORKER_START_TIMEOUT
+            while time.monotonic() < deadline:
+                if await self.attach():
+                    logger.info("常驻输入worker已就绪")
+                    return
+                await asyncio.sleep(0.3)
+            raise TimeoutError(f"常驻输入worker在 {INPUT_WORKER_START_TIMEOUT} 秒内未就绪")
+
+    async def submit(self, operation: str, **params) -> Dict[str, Any]:
+        """
+        提交一个任务并等待结果（同一进程中的任务依次提交，worker中跨进程串行执行）
+
+        Args:
+            operation: 任务类型（print_dialog、click）
+            **params: 任务参数
+
+        Returns:
+            worker返回的结构化结果，失败时 {"ok": False, "error": ...}
+        """
+        job = dict(params, operation=operation)
+        async with self._submit_lock:
+            for attempt in range(2):
+                try:
+                    await self.ensure_started()
+                    return await self._request(job, INPUT_WORKER_JOB_TIMEOUT)
+                except Exception as e:
+                    # worker可能已被其他分片关闭，重新启动后再试一次
+                    logger.warning(f"提交输入任务失败 (尝试 {attempt + 1}/2): {e}")
+                    error = str(e)
+        return {"ok": False, "operation": operation, "error": error}
+
+    async def stop(self):
+        """
+        注销本客户端；没有其他客户端在使用时worker在当前任务完成后退出
+        （worker可能由其他分片进程启动，也可能正在为其他分片执行任务）
+        """
+        if not self.attached:
+            return
+        self.attached = False
+        try:
+            result = await self._request({"operation": "shutdown", "client": self.client_id}, 2)
+        except Exception as e:
+            logger.debug(f"注销输入worker客户端失败: {e}")
+            return
+        if not result.get("stopped"):
+            logger.info(f"其他 {result.get('clients')} 个客户端仍在使用常驻输入worker，不关闭")
+            return
+        if self.process is not None and self.process.returncode is None:
+            try:
+                await asyncio.wait_for(self.process.wait(), INPUT_WORKER_JOB_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.debug("输入worker未按时退出，强制结束")
+                self.process.kill()
+        logger.info("常驻输入worker已关闭")
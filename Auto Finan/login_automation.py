@@ -1,12 +1,46 @@
+from __future__ import annotations
 import asyncio
-import pandas as pd
-from playwright.async_api import async_playwright, TimeoutError
 import logging
 from typing import Optional, Dict, Any, List
+from dataclasses import replace
 import os
 import time
+import argparse
+import json
 from config import *
 import sys
+from worker_pool import run_worker_pool
+from session_store import SessionStore, is_logged_in
+import action_plan
+from action_plan import Action, ActionPlan, classify_cell, load_or_compile_plan
+from segmentation import Segmentation, segment_record, TRAVELER, TRAVEL_CARD
+from frame_index import FrameIndex
+from batch_fill import BATCHABLE_KINDS, apply_fill_batch
+from wait_policy import WaitPolicy, page_settled, selectors_visible, element_ready, dom_settled, all_of, any_of
+from network_tracker import NetworkTracker
+from resource_filter import ResourceFilter
+from print_pdf import (suppress_print_dialog, find_print_target, save_print_target_pdf,
+                       build_pdf_stem, reserve_pdf_path)
+from input_worker import InputWorkerClient, PRINT_LOCK_FILE
+from run_journal import RunJournal, group_digest, skip_reason, log_review_needed, COMPLETED
+from result_writeback import ResultWriteBack
+from workbook_stream import iter_sequence_groups
+from input_cache import cached_read_excel, cached_title_id_mapping
+from mapping_verifier import verify_mapping, is_submit
+from startup import StartupTimer, lazy_module
+from dropdown_options import DropdownOptionCache, resolve_option
+import datepicker
+import bank_card_dialog
+from bank_card_dialog import BankCardDialogWatcher
+from card_cache import BankCardCache
+from strategy_stats import StrategyStats
+from console_lock import ConsoleFileLock
+import field_classifier
+from field_classifier import FieldClassifier
+
+# pandas和Playwright在第一次使用时才导入，不需要浏览器的子命令不会加载Playwright
+pd = lazy_module("pandas")
+playwright_api = lazy_module("playwright.async_api")
 
 # 配置日志
 logging.basicConfig(
@@ -19,6 +53,22 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 打印确认单按钮的选择器（基于之前成功的日志）
+PRINT_BUTTON_SELECTORS = [
+    'input[name="BtnPrint"]',
+    'input[value="打印确认单"]',
+    'input[onclick*="ybprint"]',
+    '#BtnPrint',
+    'input.buttHighlight'
+]
+
+# 银行卡选择弹窗及其中的卡号radio按钮
+BANK_CARD_DIALOG_SELECTORS = ["#paybankdiv", "input[type='radio'][name='rdoacnt']"]
+
+
+class StepFailed(Exception):
+    """必需的步骤（填写、点击、选择银行卡、登录、打印等）最终失败，停止处理当前序号并记为失败"""
+
 class LoginAutomation:
     def __init__(self, excel_file: str = EXCEL_FILE, mapping_file: str = MAPPING_FILE, 
                  sheet_name: str = SHEET_NAME):
@@ -35,22 +85,67 @@ class LoginAutomation:
         self.sheet_name = sheet_name
         self.title_id_mapping = {}
         self.reimbursement_data = None
+        self.current_group = None           # 当前处理的序号组数据
+        self.streaming = STREAM_INPUT       # 是否流式读取报销信息表
         self.browser = None
         self.page = None
         self.current_sequence = None
         self.current_project_number = None  # 保存当前记录的报销项目号
         self.current_amount = None          # 保存当前记录的金额
+        self.traveler_index = 0             # 当前出差人索引
+        self.worker_id = 0                  # 并行模式下的worker编号（0表示单worker模式）
+        self.console_lock = asyncio.Lock()  # 控制台输入锁，保证多个worker的验证码输入不会交错
+        self.shard_index = None             # 分片进程编号（由shard_launcher.py传入）
+        self.console_lock_file = None       # 分片进程共用的控制台输入锁文件
+        self.print_lock = asyncio.Lock()    # 打印对话框锁，从点击打印按钮到对话框处理完成只有一个worker操作鼠标键盘
+        self.run_results = []               # 每个序号的处理结果
+        self.session_store = SessionStore()  # 按工号保存的登录会话
+        self.logged_in_uid = None           # 当前浏览器上下文已登录的工号
+        self.action_plan = None             # 预先编译的操作计划
+        self.cell_actions = {}              # (标题, 值) -> 操作，由操作计划生成
+        self.frame_index = None             # 当前页面的元素 -> frame索引
+        self.fill_batch = []                # 排队等待批量提交的输入框/下拉框操作
+        self.wait_policy = WaitPolicy()     # 命名等待点（条件满足即继续）
+        self.network_tracker = None         # 当前页面的进行中请求统计
+        self.bank_card_watcher = None       # 当前页面的银行卡选择弹窗监听
+        # 工号 -> 观察到的银行卡（是否出现弹窗、各卡尾号），同一工号再次出现时预测弹窗
+        self.bank_cards = BankCardCache(BANK_CARD_CACHE_FILE if BANK_CARD_CACHE_PERSIST else None)
+        self.pending_card_check = None      # 预测不出现弹窗而未等待的工号，下一个操作前核对
+        # 各备选策略的成功次数和耗时，按元素/操作学习尝试顺序
+        self.strategy_stats = StrategyStats(STRATEGY_STATS_FILE if STRATEGY_STATS_PERSIST else None)
+        self.resource_filter = None         # 资源拦截（run_automation中按配置创建）
+        self.print_mode = PRINT_MODE        # 打印方式: dialog 或 pdf
+        self.headless = HEADLESS            # 是否无头运行
+        self.input_worker = InputWorkerClient() if INPUT_WORKER_ENABLED else None  # 常驻鼠标键盘输入worker
+        self.journal = RunJournal(RUN_JOURNAL_FILE, excel_file, sheet_name)  # 只追加的运行日志
+        self.current_step = ""             # 当前记录最后执行的步骤
+        self.submitted_step = ""           # 当前记录中已开始执行的提交、预约或打印步骤
+        self.current_pdf_path = None        # 当前记录生成的确认单文件
+        self.retry_count = 0                # 当前记录的重试次数
+        # 处理结果按检查点批量回写到工作簿
+        self.result_writeback = ResultWriteBack(excel_file, sheet_name) if RESULT_WRITEBACK_ENABLED else None
+        self.preflight = PREFLIGHT_ENABLED   # 启动浏览器前检查工作簿
+        self.dropdown_options = DropdownOptionCache()  # 下拉框选项缓存（页面导航后失效）
+        self.field_classifier = FieldClassifier()  # 按element_id缓存的页面元素类型
         
     async def load_data(self):
         """加载Excel数据和标题-ID映射"""
         try:
-            # 加载标题-ID映射
-            mapping_df = pd.read_excel(self.mapping_file)
-            self.title_id_mapping = dict(zip(mapping_df.iloc[:, 0], mapping_df.iloc[:, 1]))
+            # 标题-ID映射和报销信息在后台线程中同时解析（输入文件未变化时直接使用解析缓存），
+            # 不阻塞同时进行的浏览器启动
+            mapping_task = asyncio.to_thread(cached_title_id_mapping, self.mapping_file)
+            if self.streaming:
+                self.title_id_mapping = await mapping_task
+            else:
+                self.title_id_mapping, self.reimbursement_data = await asyncio.gather(
+                    mapping_task, asyncio.to_thread(cached_read_excel, self.excel_file, sheet_name=self.sheet_name))
             logger.info(f"成功加载标题-ID映射，共{len(self.title_id_mapping)}条记录")
             
-            # 加载报销信息数据
-            self.reimbursement_data = pd.read_excel(self.excel_file, sheet_name=self.sheet_name)
+            # 流式读取模式下报销信息在处理时逐组读取
+            if self.streaming:
+                logger.info(f"流式读取模式：处理时逐个序号组读取 {self.excel_file}")
+                return
+            
             logger.info(f"成功加载报销信息数据，共{len(self.reimbursement_data)}行")
             
             # 验证必要列是否存在
@@ -79,6 +174,49 @@ class LoginAutomation:
             logger.warning(f"未找到标题 '{title}' 对应的ID映射，请检查标题-ID映射文件")
             return ""
     
+    def element_index(self) -> FrameIndex:
+        """
+        获取当前页面的元素 -> frame索引（页面变化时重新创建）
+        
+        Returns:
+            FrameIndex实例
+        """
+        if self.frame_index is None or self.frame_index.page is not self.page:
+            self.frame_index = FrameIndex(self.page)
+        return self.frame_index
+    
+    async def wait_point(self, name: str, condition=None) -> float:
+        """
+        在命名等待点等待：条件满足即继续，配置的等待时间作为上限
+        
+        Args:
+            name: 等待点名称（见wait_policy.WAIT_POINT_CEILINGS）
+            condition: 就绪条件，None表示固定等待
+            
+        Returns:
+            实际等待的秒数
+        """
+        return await self.wait_policy.wait(name, condition)
+    
+    def network(self) -> NetworkTracker:
+        """
+        获取当前页面的网络请求跟踪（页面变化时重新创建）
+        
+        Returns:
+            NetworkTracker实例
+        """
+        if self.network_tracker is None or self.network_tracker.page is not self.page:
+            self.network_tracker = NetworkTracker(self.page)
+        return self.network_tracker
+    
+    def page_settled(self):
+        """点击后的页面就绪条件（从调用时刻开始计算导航和请求）"""
+        return page_settled(self.page, self.element_index(), time.monotonic(), network=self.network())
+    
+    def page_scripts_settled(self):
+        """输入触发的页面脚本和请求处理完成的条件"""
+        return dom_settled(self.page, network=self.network())
+    
     def clean_value_string(self, value) -> str:
         """
         清理数据值，处理数字类型转换时的.0后缀问题
@@ -111,23 +249,18 @@ class LoginAutomation:
             是否成功找到元素
         """
         try:
-            # 优先在iframe中查找
-            frames = self.page.frames
-            for frame in frames:
-                try:
-                    element = frame.locator(f"#{element_id}").first
-                    if await element.count() > 0:
-                        logger.info(f"在iframe中找到元素: {element_id}")
-                        return True
-                except Exception as e:
-                    logger.debug(f"在iframe中查找元素失败: {e}")
-                    continue
+            # 优先通过frame索引查找（包含所有iframe和主页面）
+            index = self.element_index()
+            located = await index.resolve(element_id, [f"#{element_id}"])
+            if located:
+                logger.info(f"在{index.frame_label(located[0])}中找到元素: {element_id}")
+                return True
             
-            # 如果iframe中找不到，尝试在主页面查找
+            # 如果当前还找不到，在主页面等待元素出现
             await self.page.wait_for_selector(f"#{element_id}", timeout=timeout * 1000)
             logger.info(f"在主页面中找到元素: {element_id}")
             return True
-        except TimeoutError:
+        except playwright_api.TimeoutError:
             logger.warning(f"等待元素超时: {element_id}")
             return False
     
@@ -141,59 +274,56 @@ class LoginAutomation:
             retries: 重试次数
             title: 当前处理的列标题（用于判断是否为金额列）
         """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
         # 判断当前输入框对应的报销信息表中的列名是否为"金额"
         if title == "金额":
             self.current_amount = value
             logger.info(f"检测到金额列，保存金额用于文件命名: {value}")
         
-        for attempt in range(retries):
+        async def by_frame_index():
+            # 通过frame索引定位输入框（按ID优先，其次name属性），命中时只需一次页面调用
+            index = self.element_index()
+            located = await index.resolve(element_id, [f"#{element_id}", f"input[name='{element_id}']"])
+            if not located:
+                return False
+            frame, selector = located
             try:
-                # 优先在iframe中查找（根据日志分析，大部分元素都在iframe中）
-                frames = self.page.frames
-                for frame in frames:
-                    try:
-                        # 在iframe中查找输入框
-                        input_element = frame.locator(f"#{element_id}").first
-                        if await input_element.count() > 0:
-                            await input_element.fill(value)
-                            logger.info(f"在iframe中成功填写输入框 {element_id}: {value}")
-                            return
-                    except Exception as e:
-                        logger.debug(f"在iframe中查找输入框失败: {e}")
-                        continue
-                
-                # 如果iframe中找不到，尝试在主页面查找
-                if element_id and await self.wait_for_element(element_id):
-                    await self.page.fill(f"#{element_id}", value)
-                    logger.info(f"在主页面成功填写输入框 {element_id}: {value}")
-                    return
-                
-                # 如果还是找不到，尝试通过name属性查找（优先在iframe中）
-                for frame in frames:
-                    try:
-                        input_element = frame.locator(f"input[name='{element_id}']").first
-                        if await input_element.count() > 0:
-                            await input_element.fill(value)
-                            logger.info(f"在iframe中通过name属性成功填写输入框 {element_id}: {value}")
-                            return
-                    except Exception as e:
-                        logger.debug(f"在iframe中通过name属性查找失败: {e}")
-                        continue
-                
-                # 最后尝试在主页面通过name属性查找
-                try:
-                    await self.page.fill(f"input[name='{element_id}']", value)
-                    logger.info(f"在主页面通过name属性成功填写输入框 {element_id}: {value}")
-                    return
-                except Exception as e:
-                    logger.debug(f"在主页面通过name属性查找失败: {e}")
-                    
-            except Exception as e:
-                logger.warning(f"填写输入框失败 (尝试 {attempt + 1}/{retries}): {element_id} - {e}")
-                if attempt < retries - 1:
-                    await asyncio.sleep(RETRY_DELAY)
+                await frame.locator(selector).first.fill(value)
+            except Exception:
+                # 元素已不在记录的位置，下次重新查找
+                index.forget(element_id)
+                raise
+            logger.info(f"在{index.frame_label(frame)}中成功填写输入框 {element_id}: {value}")
+            return True
         
-        logger.error(f"填写输入框最终失败: {element_id}")
+        async def by_main_wait():
+            # 在主页面等待元素出现
+            if not element_id or not await self.wait_for_element(element_id):
+                return False
+            await self.page.fill(f"#{element_id}", value)
+            logger.info(f"在主页面成功填写输入框 {element_id}: {value}")
+            return True
+        
+        async def by_main_name():
+            # 在主页面通过name属性查找
+            await self.page.fill(f"input[name='{element_id}']", value)
+            logger.info(f"在主页面通过name属性成功填写输入框 {element_id}: {value}")
+            return True
+        
+        # 按该输入框以往成功的方法排序尝试
+        strategies = [("frame_index", by_frame_index), ("main_wait", by_main_wait), ("main_name", by_main_name)]
+        for attempt in range(retries):
+            if attempt:
+                self.retry_count += 1
+            if await self.strategy_stats.attempt("fill_input", element_id, strategies):
+                return
+            logger.warning(f"填写输入框失败 (尝试 {attempt + 1}/{retries}): {element_id}")
+            if attempt < retries - 1:
+                await asyncio.sleep(RETRY_DELAY)
+        
+        raise StepFailed(f"填写输入框最终失败: {element_id}")
     
     async def fill_date_input(self, element_id: str, value: str, retries: int = MAX_RETRIES):
         """
@@ -204,130 +334,98 @@ class LoginAutomation:
             value: 要填写的日期值（格式：yyyy-mm-dd）
             retries: 重试次数
         """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
         logger.info(f"开始填写日期输入框: {element_id} = {value}")
         
-        for attempt in range(retries):
-            try:
-                logger.info(f"尝试填写日期输入框 (尝试 {attempt + 1}/{retries}): {element_id}")
-                
-                # 方法1: 等待元素出现后再填写
-                try:
-                    logger.info(f"等待元素出现: {element_id}")
-                    # 等待元素出现，最多等待5秒
-                    await self.page.wait_for_selector(f"#{element_id}", timeout=5000)
-                    logger.info(f"元素已出现，开始填写: {element_id}")
-                    
-                    # 直接尝试填写
-                    await self.page.fill(f"#{element_id}", "")
-                    await self.page.fill(f"#{element_id}", value)
-                    logger.info(f"✓ 在主页面成功填写日期输入框 {element_id}: {value}")
-                    return
-                except Exception as e:
-                    logger.debug(f"等待元素出现失败: {e}")
-                
-                # 方法2: 通过JavaScript直接设置值（适用于readonly的日期输入框）
-                try:
-                    logger.info(f"尝试通过JavaScript设置值: {element_id}")
-                    js_code = f"""
-                    (function() {{
-                        var element = document.getElementById('{element_id}');
-                        if (element) {{
-                            console.log('找到元素:', element);
-                            element.value = '{value}';
-                            // 触发change事件
-                            var event = new Event('change', {{ bubbles: true }});
-                            element.dispatchEvent(event);
-                            // 触发input事件
-                            var inputEvent = new Event('input', {{ bubbles: true }});
-                            element.dispatchEvent(inputEvent);
-                            return true;
-                        }} else {{
-                            console.log('未找到元素:', '{element_id}');
-                            return false;
-                        }}
-                    }})();
-                    """
-                    result = await self.page.evaluate(js_code)
-                    if result:
-                        logger.info(f"✓ 通过JavaScript成功填写日期输入框 {element_id}: {value}")
-                        return
-                    else:
-                        logger.debug(f"JavaScript未找到元素: {element_id}")
-                except Exception as e:
-                    logger.debug(f"JavaScript填写失败: {e}")
-                
-                # 方法3: 通过属性选择器查找
-                try:
-                    logger.info(f"尝试通过dateinput属性查找: {element_id}")
-                    # 查找具有dateinput属性的输入框
-                    selector = f"input[dateinput='true'][id='{element_id}']"
-                    await self.page.fill(selector, "")
-                    await self.page.fill(selector, value)
-                    logger.info(f"✓ 通过dateinput属性成功填写日期输入框 {element_id}: {value}")
-                    return
-                except Exception as e:
-                    logger.debug(f"通过dateinput属性查找失败: {e}")
-                
-                # 方法4: 通过class查找
-                try:
-                    logger.info(f"尝试通过dateInput类查找: {element_id}")
-                    # 查找具有dateInput类的输入框
-                    selector = f"input.dateInput[id='{element_id}']"
-                    await self.page.fill(selector, "")
-                    await self.page.fill(selector, value)
-                    logger.info(f"✓ 通过dateInput类成功填写日期输入框 {element_id}: {value}")
-                    return
-                except Exception as e:
-                    logger.debug(f"通过dateInput类查找失败: {e}")
-                
-                # 方法5: 通过部分ID匹配查找
+        async def fill_selector(selector: str):
+            await self.page.fill(selector, "")
+            await self.page.fill(selector, value)
+        
+        async def by_main_wait():
+            # 方法1: 等待元素出现后再填写（最多等待5秒）
+            await self.page.wait_for_selector(f"#{element_id}", timeout=5000)
+            await fill_selector(f"#{element_id}")
+            logger.info(f"✓ 在主页面成功填写日期输入框 {element_id}: {value}")
+            return True
+        
+        async def by_javascript():
+            # 方法2: 通过JavaScript直接设置值（适用于readonly的日期输入框）
+            js_code = f"""
+            (function() {{
+                var element = document.getElementById('{element_id}');
+                if (element) {{
+                    element.value = '{value}';
+                    // 触发change事件
+                    var event = new Event('change', {{ bubbles: true }});
+                    element.dispatchEvent(event);
+                    // 触发input事件
+                    var inputEvent = new Event('input', {{ bubbles: true }});
+                    element.dispatchEvent(inputEvent);
+                    return true;
+                }}
+                return false;
+            }})();
+            """
+            if not await self.page.evaluate(js_code):
+                return False
+            logger.info(f"✓ 通过JavaScript成功填写日期输入框 {element_id}: {value}")
+            return True
+        
+        async def by_dateinput_attribute():
+            # 方法3: 查找具有dateinput属性的输入框
+            await fill_selector(f"input[dateinput='true'][id='{element_id}']")
+            logger.info(f"✓ 通过dateinput属性成功填写日期输入框 {element_id}: {value}")
+            return True
+        
+        async def by_dateinput_class():
+            # 方法4: 查找具有dateInput类的输入框
+            await fill_selector(f"input.dateInput[id='{element_id}']")
+            logger.info(f"✓ 通过dateInput类成功填写日期输入框 {element_id}: {value}")
+            return True
+        
+        async def by_partial_id():
+            # 方法5: 查找ID包含element_id的输入框
+            await fill_selector(f"input[id*='{element_id}']")
+            logger.info(f"✓ 通过部分ID匹配成功填写日期输入框 {element_id}: {value}")
+            return True
+        
+        async def by_iframes():
+            # 方法6: 在各iframe中查找
+            for i, frame in enumerate(self.page.frames):
                 try:
-                    logger.info(f"尝试通过部分ID匹配查找: {element_id}")
-                    # 尝试查找包含element_id的元素
-                    selector = f"input[id*='{element_id}']"
-                    await self.page.fill(selector, "")
-                    await self.page.fill(selector, value)
-                    logger.info(f"✓ 通过部分ID匹配成功填写日期输入框 {element_id}: {value}")
-                    return
+                    input_element = frame.locator(f"#{element_id}").first
+                    if await input_element.count() > 0:
+                        # 对于日期输入框，先清除现有值，然后填写新值
+                        await input_element.fill("")
+                        await input_element.fill(value)
+                        logger.info(f"✓ 在iframe {i} 中成功填写日期输入框 {element_id}: {value}")
+                        return True
                 except Exception as e:
-                    logger.debug(f"通过部分ID匹配查找失败: {e}")
-                
-                # 方法6: 如果主页面找不到，再尝试在iframe中查找
-                frames = self.page.frames
-                logger.info(f"主页面查找失败，检查 {len(frames)} 个iframe")
-                
-                for i, frame in enumerate(frames):
-                    try:
-                        logger.debug(f"在iframe {i} 中查找: {frame.url or 'unnamed frame'}")
-                        
-                        # 在iframe中查找日期输入框
-                        input_element = frame.locator(f"#{element_id}").first
-                        if await input_element.count() > 0:
-                            # 对于日期输入框，先清除现有值，然后填写新值
-                            await input_element.fill("")
-                            await input_element.fill(value)
-                            logger.info(f"✓ 在iframe {i} 中成功填写日期输入框 {element_id}: {value}")
-                            return
-                        else:
-                            logger.debug(f"在iframe {i} 中未找到元素 {element_id}")
-                            
-                    except Exception as e:
-                        logger.debug(f"在iframe {i} 中查找失败: {e}")
-                        continue
+                    logger.debug(f"在iframe {i} 中查找失败: {e}")
+            return False
+        
+        # 按该日期框以往成功的方法排序尝试
+        strategies = [("main_wait", by_main_wait), ("javascript", by_javascript),
+                      ("dateinput_attribute", by_dateinput_attribute), ("dateinput_class", by_dateinput_class),
+                      ("partial_id", by_partial_id), ("iframes", by_iframes)]
+        for attempt in range(retries):
+            if attempt:
+                self.retry_count += 1
+            logger.info(f"尝试填写日期输入框 (尝试 {attempt + 1}/{retries}): {element_id}")
+            if await self.strategy_stats.attempt("fill_date_input", element_id, strategies,
+                                                 loose=["partial_id"]):
+                return
+            
+            # 如果所有方法都失败，等待一下再重试
+            if attempt < retries - 1:
+                logger.warning(f"填写日期输入框失败 (尝试 {attempt + 1}/{retries}): {element_id}")
+                logger.info(f"等待 {RETRY_DELAY} 秒后重试...")
+                await asyncio.sleep(RETRY_DELAY)
                 
-                # 如果所有方法都失败，等待一下再重试
-                if attempt < retries - 1:
-                    logger.warning(f"填写日期输入框失败 (尝试 {attempt + 1}/{retries}): {element_id}")
-                    logger.info(f"等待 {RETRY_DELAY} 秒后重试...")
-                    await asyncio.sleep(RETRY_DELAY)
-                    
-                    # 额外等待页面加载
-                    await asyncio.sleep(2)
-                    
-            except Exception as e:
-                logger.warning(f"填写日期输入框异常 (尝试 {attempt + 1}/{retries}): {element_id} - {e}")
-                if attempt < retries - 1:
-                    await asyncio.sleep(RETRY_DELAY)
+                # 额外等待页面加载
+                await asyncio.sleep(2)
         
         logger.error(f"填写日期输入框最终失败: {element_id}")
         logger.info("建议检查：")
@@ -336,6 +434,7 @@ class LoginAutomation:
         logger.info("3. 元素是否在iframe中")
         logger.info("4. 是否需要先点击其他元素来显示日期输入框")
         logger.info("5. 页面是否已经跳转到新页面")
+        raise StepFailed(f"填写日期输入框最终失败: {element_id}")
     
     async def fill_readonly_date_input(self, element_id: str, value: str, retries: int = MAX_RETRIES):
         """
@@ -346,6 +445,13 @@ class LoginAutomation:
             value: 要填写的日期值（格式：yyyy-mm-dd）
             retries: 重试次数
         """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
+        # 优先通过页面的datepicker API一次完成设置和校验，只有API不可用时才点击日历
+        if await self.set_date_fast(element_id, value):
+            return
+        
         logger.info(f"开始填写只读日期输入框: {element_id} = {value}")
         
         # 解析日期
@@ -356,10 +462,11 @@ class LoginAutomation:
             day = int(day)
             logger.info(f"解析日期: 年={year}, 月={month}, 日={day}")
         except Exception as e:
-            logger.error(f"日期格式错误: {value}, 期望格式: yyyy-mm-dd")
-            return
+            raise StepFailed(f"日期格式错误: {value}, 期望格式: yyyy-mm-dd")
         
         for attempt in range(retries):
+            if attempt:
+                self.retry_count += 1
             try:
                 logger.info(f"尝试填写只读日期输入框 (尝试 {attempt + 1}/{retries}): {element_id}")
                 
@@ -509,7 +616,37 @@ class LoginAutomation:
         logger.info("2. 日历控件是否正确加载")
         logger.info("3. 日期格式是否正确 (yyyy-mm-dd)")
         logger.info("4. 是否需要先点击其他元素来显示日期输入框")
+        raise StepFailed(f"填写只读日期输入框最终失败: {element_id}")
 
+    async def set_date_fast(self, element_id: str, value: str) -> bool:
+        """
+        在输入框所在的frame中通过jQuery UI datepicker API设置日期，并在同一次调用中校验输入框的值
+        
+        Args:
+            element_id: 日期输入框的ID
+            value: 要填写的日期值（格式：yyyy-mm-dd）
+            
+        Returns:
+            是否设置成功（False时由调用方使用点击日历的方式）
+        """
+        index = self.element_index()
+        located = await index.resolve(element_id, [f"#{element_id}"])
+        if not located:
+            return False
+        frame, selector = located
+        result = await datepicker.set_date(frame, selector, value)
+        status = result.get("status")
+        if status == datepicker.OK:
+            logger.info(f"通过datepicker API设置日期: {element_id} = {result.get('value')}")
+            return True
+        if status == datepicker.MISMATCH:
+            logger.warning(f"通过datepicker API设置日期后的值与 {value} 不一致（{result.get('value')}），改为点击日历选择")
+        elif status == datepicker.MISSING:
+            index.forget(element_id)
+        else:
+            logger.debug(f"日期输入框 {element_id} 没有可用的datepicker API，点击日历选择")
+        return False
+    
     async def select_date_from_calendar(self, element_id: str, value: str, retries: int = MAX_RETRIES):
         """
         基于jQuery UI日历控件的精确日期选择方法
@@ -519,6 +656,13 @@ class LoginAutomation:
             value: 要填写的日期值（格式：yyyy-mm-dd）
             retries: 重试次数
         """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
+        # 优先通过页面的datepicker API一次完成设置和校验，只有API不可用时才点击日历
+        if await self.set_date_fast(element_id, value):
+            return
+        
         logger.info(f"开始使用jQuery UI日历控件选择日期: {element_id} = {value}")
         
         # 解析日期
@@ -529,10 +673,11 @@ class LoginAutomation:
             day = int(day)
             logger.info(f"解析日期: 年={year}, 月={month}, 日={day}")
         except Exception as e:
-            logger.error(f"日期格式错误: {value}, 期望格式: yyyy-mm-dd")
-            return
+            raise StepFailed(f"日期格式错误: {value}, 期望格式: yyyy-mm-dd")
         
         for attempt in range(retries):
+            if attempt:
+                self.retry_count += 1
             try:
                 logger.info(f"尝试选择日期 (尝试 {attempt + 1}/{retries}): {element_id}")
                 
@@ -814,6 +959,7 @@ class LoginAutomation:
         logger.info("2. 日历控件是否正确加载")
         logger.info("3. 日期格式是否正确 (yyyy-mm-dd)")
         logger.info("4. 是否需要先点击其他元素来显示日期输入框")
+        raise StepFailed(f"选择日期最终失败: {element_id}")
     
     async def click_radio_button(self, element_id: str, retries: int = MAX_RETRIES):
         """
@@ -823,9 +969,14 @@ class LoginAutomation:
             element_id: radio按钮的ID或value值
             retries: 重试次数
         """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
         logger.info(f"尝试点击radio按钮: {element_id}")
         
         for attempt in range(retries):
+            if attempt:
+                self.retry_count += 1
             try:
                 # 获取所有iframe信息
                 frames = self.page.frames
@@ -841,7 +992,7 @@ class LoginAutomation:
                         if await radio_element.count() > 0:
                             await radio_element.click()
                             logger.info(f"✓ 在iframe {i} 中成功点击radio按钮 (策略1): {element_id}")
-                            await asyncio.sleep(BUTTON_CLICK_WAIT)
+                            await self.wait_point("button_click", self.page_settled())
                             return
                         
                         # 策略2: 通过name和value查找（新业务类型radio）
@@ -850,7 +1001,7 @@ class LoginAutomation:
                         if await radio_element.count() > 0:
                             await radio_element.click()
                             logger.info(f"✓ 在iframe {i} 中成功点击radio按钮 (策略2): {element_id}")
-                            await asyncio.sleep(BUTTON_CLICK_WAIT)
+                            await self.wait_point("button_click", self.page_settled())
                             return
                         
                         # 策略3: 通过文本内容查找（点击span文本）
@@ -859,7 +1010,7 @@ class LoginAutomation:
                         if await text_element.count() > 0:
                             await text_element.click()
                             logger.info(f"✓ 在iframe {i} 中成功点击radio按钮 (策略3): {element_id}")
-                            await asyncio.sleep(BUTTON_CLICK_WAIT)
+                            await self.wait_point("button_click", self.page_settled())
                             return
                         
                         # 策略4: 通过li元素查找（点击包含文本的li）
@@ -868,7 +1019,7 @@ class LoginAutomation:
                         if await li_element.count() > 0:
                             await li_element.click()
                             logger.info(f"✓ 在iframe {i} 中成功点击radio按钮 (策略4): {element_id}")
-                            await asyncio.sleep(BUTTON_CLICK_WAIT)
+                            await self.wait_point("button_click", self.page_settled())
                             return
                             
                     except Exception as e:
@@ -885,7 +1036,7 @@ class LoginAutomation:
                     if await radio_element.count() > 0:
                         await radio_element.click()
                         logger.info(f"✓ 在主页面成功点击radio按钮 (策略1): {element_id}")
-                        await asyncio.sleep(BUTTON_CLICK_WAIT)
+                        await self.wait_point("button_click", self.page_settled())
                         return
                     
                     # 策略2: 通过name和value查找（新业务类型radio）
@@ -894,7 +1045,7 @@ class LoginAutomation:
                     if await radio_element.count() > 0:
                         await radio_element.click()
                         logger.info(f"✓ 在主页面成功点击radio按钮 (策略2): {element_id}")
-                        await asyncio.sleep(BUTTON_CLICK_WAIT)
+                        await self.wait_point("button_click", self.page_settled())
                         return
                     
                     # 策略3: 通过文本内容查找（点击span文本）
@@ -903,7 +1054,7 @@ class LoginAutomation:
                     if await text_element.count() > 0:
                         await text_element.click()
                         logger.info(f"✓ 在主页面成功点击radio按钮 (策略3): {element_id}")
-                        await asyncio.sleep(BUTTON_CLICK_WAIT)
+                        await self.wait_point("button_click", self.page_settled())
                         return
                     
                     # 策略4: 通过li元素查找（点击包含文本的li）
@@ -912,7 +1063,7 @@ class LoginAutomation:
                     if await li_element.count() > 0:
                         await li_element.click()
                         logger.info(f"✓ 在主页面成功点击radio按钮 (策略4): {element_id}")
-                        await asyncio.sleep(BUTTON_CLICK_WAIT)
+                        await self.wait_point("button_click", self.page_settled())
                         return
                         
                 except Exception as e:
@@ -924,14 +1075,14 @@ class LoginAutomation:
                 logger.info("2. 元素是否在iframe中")
                 logger.info("3. 元素是否已经加载")
                 logger.info("4. 是否使用了正确的显示文本而不是value值")
-                return
+                break
                 
             except Exception as e:
                 logger.warning(f"点击radio按钮失败 (尝试 {attempt + 1}/{retries}): {element_id} - {e}")
                 if attempt < retries - 1:
                     await asyncio.sleep(RETRY_DELAY)
-                else:
-                    logger.error(f"点击radio按钮最终失败: {element_id}")
+        
+        raise StepFailed(f"点击radio按钮最终失败: {element_id}")
     
     async def click_button_by_btnname(self, btnname: str, retries: int = MAX_RETRIES):
         """
@@ -941,93 +1092,53 @@ class LoginAutomation:
             btnname: 按钮的btnName属性值
             retries: 重试次数
         """
-        logger.info(f"尝试通过btnName点击按钮: {btnname}")
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
         
-        # 等待页面完全加载
-        await asyncio.sleep(0.5)
-        
-        # 获取所有iframe
-        frames = self.page.frames
-        button_found = False
+        logger.info(f"尝试通过btnName点击按钮: {btnname}")
         
-        # 方法1: 优先在iframe中动态查找按钮
-        for frame in frames:
-            try:
-                logger.info(f"在iframe中查找按钮: {frame.url or 'unnamed frame'}")
-                
-                # 使用btnname选择器在iframe中查找
-                selector = f"button[btnname='{btnname}']"
-                button = frame.locator(selector).first
-                
-                if await button.count() > 0:
-                    await button.click()
-                    logger.info(f"✓ 在iframe中成功点击按钮 (btnname: {btnname})")
-                    button_found = True
-                    break
-                else:
-                    logger.debug(f"在iframe {frame.url} 中未找到按钮 {btnname}")
-                    
-            except Exception as e:
-                logger.debug(f"在iframe中查找按钮时出错: {e}")
-                continue
+        # 等待此前操作触发的请求结束
+        await self.wait_point("pre_click", self.network().settled())
         
-        # 方法2: 如果iframe中没找到，尝试在主页面查找
-        if not button_found:
-            logger.info("在iframe中未找到按钮，尝试在主页面查找...")
-            try:
-                selector = f"button[btnname='{btnname}']"
-                button = self.page.locator(selector).first
-                if await button.count() > 0:
-                    await button.click()
-                    logger.info(f"✓ 在主页面成功点击按钮 (btnname: {btnname})")
-                    button_found = True
-            except Exception as e:
-                logger.debug(f"主页面选择器失败: {e}")
-        
-        # 方法3: 如果还是没找到，尝试其他选择器
-        if not button_found:
-            logger.info("尝试使用其他选择器查找按钮...")
-            alternative_selectors = [
-                f"button[guid*='{btnname}']",
-                f"button:has-text('{btnname}')",
-                f"input[btnname='{btnname}']",
-                f"[btnname='{btnname}']"
-            ]
-            
-            for selector in alternative_selectors:
+        async def click_in_frames(selector: str) -> bool:
+            # 依次在各iframe中查找（page.frames包含主页面）
+            for frame in self.page.frames:
                 try:
-                    # 在iframe中查找
-                    for frame in frames:
-                        try:
-                            button = frame.locator(selector).first
-                            if await button.count() > 0:
-                                await button.click()
-                                logger.info(f"✓ 在iframe中使用备用选择器成功点击按钮: {selector}")
-                                button_found = True
-                                break
-                        except Exception as e:
-                            continue
-                    
-                    if button_found:
-                        break
-                    
-                    # 在主页面查找
-                    try:
-                        button = self.page.locator(selector).first
-                        if await button.count() > 0:
-                            await button.click()
-                            logger.info(f"✓ 在主页面使用备用选择器成功点击按钮: {selector}")
-                            button_found = True
-                            break
-                    except Exception as e:
-                        continue
-                        
+                    button = frame.locator(selector).first
+                    if await button.count() > 0:
+                        await button.click()
+                        logger.info(f"✓ 在iframe中成功点击按钮: {selector}")
+                        return True
                 except Exception as e:
-                    logger.debug(f"备用选择器 {selector} 失败: {e}")
-                    continue
+                    logger.debug(f"在iframe中查找按钮 {selector} 时出错: {e}")
+            return False
+        
+        async def click_in_main(selector: str) -> bool:
+            button = self.page.locator(selector).first
+            if await button.count() > 0:
+                await button.click()
+                logger.info(f"✓ 在主页面成功点击按钮: {selector}")
+                return True
+            return False
+        
+        async def click_anywhere(selector: str) -> bool:
+            return await click_in_frames(selector) or await click_in_main(selector)
+        
+        # 方法1: btnname（先iframe后主页面），方法2: guid，方法3: 按钮文本，其后是更宽松的btnname选择器；
+        # 按该按钮以往成功的方法排序尝试
+        strategies = [
+            ("btnname_frames", lambda: click_in_frames(f"button[btnname='{btnname}']")),
+            ("btnname_main", lambda: click_in_main(f"button[btnname='{btnname}']")),
+            ("guid", lambda: click_anywhere(f"button[guid*='{btnname}']")),
+            ("text", lambda: click_anywhere(f"button:has-text('{btnname}')")),
+            ("input_btnname", lambda: click_anywhere(f"input[btnname='{btnname}']")),
+            ("any_btnname", lambda: click_anywhere(f"[btnname='{btnname}']")),
+        ]
+        button_found = await self.strategy_stats.attempt("click_button_by_btnname", btnname, strategies,
+                                                           loose=["text"]) is not None
         
         if button_found:
-            await asyncio.sleep(BUTTON_CLICK_WAIT)
+            await self.wait_point("button_click", self.page_settled())
             return True
         else:
             logger.error(f"点击按钮最终失败: {btnname}")
@@ -1040,9 +1151,14 @@ class LoginAutomation:
         Args:
             retries: 重试次数
         """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
         logger.info("尝试点击表格中第一行的预约按钮")
         
         for attempt in range(retries):
+            if attempt:
+                self.retry_count += 1
             try:
                 # 获取所有iframe
                 frames = self.page.frames
@@ -1061,7 +1177,7 @@ class LoginAutomation:
                     if await button.count() > 0:
                         await button.click()
                         logger.info("✓ 在主页面成功点击第一行的预约按钮")
-                        await asyncio.sleep(BUTTON_CLICK_WAIT)
+                        await self.wait_point("button_click", self.page_settled())
                         return True
                     else:
                         logger.debug("主页面未找到预约按钮")
@@ -1086,7 +1202,7 @@ class LoginAutomation:
                         if await button.count() > 0:
                             await button.click()
                             logger.info(f"✓ 在iframe {i} 中成功点击第一行的预约按钮")
-                            await asyncio.sleep(BUTTON_CLICK_WAIT)
+                            await self.wait_point("button_click", self.page_settled())
                             return True
                         else:
                             logger.debug(f"iframe {i} 中未找到预约按钮")
@@ -1104,7 +1220,7 @@ class LoginAutomation:
                         if await button.count() > 0:
                             await button.click()
                             logger.info(f"✓ 在iframe {i} 中找到并点击预约按钮")
-                            await asyncio.sleep(BUTTON_CLICK_WAIT)
+                            await self.wait_point("button_click", self.page_settled())
                             return True
                     except Exception as e:
                         logger.debug(f"在iframe {i} 中宽松查找失败: {e}")
@@ -1116,7 +1232,7 @@ class LoginAutomation:
                     if await button.count() > 0:
                         await button.click()
                         logger.info("✓ 在主页面找到并点击预约按钮")
-                        await asyncio.sleep(BUTTON_CLICK_WAIT)
+                        await self.wait_point("button_click", self.page_settled())
                         return True
                 except Exception as e:
                     logger.debug(f"主页面宽松查找失败: {e}")
@@ -1142,7 +1258,15 @@ class LoginAutomation:
             element_id: 按钮的ID或btnName
             retries: 重试次数
         """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
+        # 等待此前操作触发的请求结束
+        await self.wait_point("pre_click", self.network().settled())
+        
         for attempt in range(retries):
+            if attempt:
+                self.retry_count += 1
             try:
                 # 优先在iframe中查找（根据日志分析，大部分元素都在iframe中）
                 frames = self.page.frames
@@ -1153,7 +1277,7 @@ class LoginAutomation:
                         if await button_element.count() > 0:
                             await button_element.click()
                             logger.info(f"在iframe中成功点击按钮: {element_id}")
-                            await asyncio.sleep(BUTTON_CLICK_WAIT)
+                            await self.wait_point("button_click", self.page_settled())
                             return
                     except Exception as e:
                         logger.debug(f"在iframe中查找按钮失败: {e}")
@@ -1163,18 +1287,19 @@ class LoginAutomation:
                 if element_id and await self.wait_for_element(element_id):
                     await self.page.click(f"#{element_id}")
                     logger.info(f"在主页面成功点击按钮: {element_id}")
-                    await asyncio.sleep(BUTTON_CLICK_WAIT)
+                    await self.wait_point("button_click", self.page_settled())
                     return
                 else:
-                    # 如果ID不存在，尝试通过btnName点击
-                    await self.click_button_by_btnname(element_id)
-                    return
+                    # 如果ID不存在，尝试通过btnName点击（已依次尝试所有方法，失败时不再重试）
+                    if await self.click_button_by_btnname(element_id):
+                        return
+                    break
             except Exception as e:
                 logger.warning(f"点击按钮失败 (尝试 {attempt + 1}/{retries}): {element_id} - {e}")
                 if attempt < retries - 1:
                     await asyncio.sleep(RETRY_DELAY)
-                else:
-                    logger.error(f"点击按钮最终失败: {element_id}")
+        
+        raise StepFailed(f"点击按钮最终失败: {element_id}")
     
     async def click_add_content_button(self, retries: int = MAX_RETRIES):
         """
@@ -1186,7 +1311,12 @@ class LoginAutomation:
         Returns:
             bool: 是否成功点击
         """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
         for attempt in range(retries):
+            if attempt:
+                self.retry_count += 1
             try:
                 logger.info(f"尝试点击添加内容按钮 (尝试 {attempt + 1}/{retries})")
                 
@@ -1264,75 +1394,51 @@ class LoginAutomation:
             value: 导航面板的值（如WF_YB6）
             retries: 重试次数
         """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
         logger.info(f"开始点击导览框: element_id={element_id}, value={value}")
         
+        async def click_selector(selector: str) -> bool:
+            if await self.page.locator(selector).count() == 0:
+                return False
+            await self.page.click(selector)
+            return True
+        
+        async def click_first_syslink() -> bool:
+            first_syslink = self.page.locator("div.syslink").first
+            if await first_syslink.count() == 0:
+                return False
+            await first_syslink.click()
+            return True
+        
+        async def call_nav_function() -> bool:
+            await self.page.evaluate(f"navToPrj('{value}')")
+            return True
+        
+        # 方法1: onclick属性，方法2: 直接调用navToPrj，方法3: 文本内容，方法4: title属性，
+        # 方法5: class和onclick组合，方法6: 第一个syslink元素（不够精确，固定放在最后）；
+        # 其余方法按该导览框以往成功的方法排序尝试
+        strategies = [
+            ("onclick", lambda: click_selector(f"div[onclick*='{value}']")),
+            ("javascript", call_nav_function),
+            ("text", lambda: click_selector(f"div:has-text('{value}')")),
+            ("title", lambda: click_selector(f"div[title*='{value}']")),
+            ("syslink_onclick", lambda: click_selector(f"div.syslink[onclick*='{value}']")),
+            ("first_syslink", click_first_syslink),
+        ]
+        
         for attempt in range(retries):
-            try:
-                # 方法1: 通过onclick属性查找
-                logger.info(f"尝试通过onclick属性查找: div[onclick*='{value}']")
-                onclick_selector = f"div[onclick*='{value}']"
-                
-                if await self.page.locator(onclick_selector).count() > 0:
-                    await self.page.click(onclick_selector)
-                    logger.info(f"成功点击导览框 (通过onclick): {value}")
-                    await asyncio.sleep(BUTTON_CLICK_WAIT)
-                    return True
-                
-                # 方法2: 通过JavaScript直接调用
-                logger.info(f"尝试通过JavaScript调用: navToPrj('{value}')")
-                try:
-                    await self.page.evaluate(f"navToPrj('{value}')")
-                    logger.info(f"成功点击导览框 (通过JavaScript): {value}")
-                    await asyncio.sleep(BUTTON_CLICK_WAIT)
-                    return True
-                except Exception as js_error:
-                    logger.debug(f"JavaScript调用失败: {js_error}")
-                
-                # 方法3: 通过文本内容查找
-                logger.info(f"尝试通过文本内容查找: div:has-text('{value}')")
-                text_selector = f"div:has-text('{value}')"
-                
-                if await self.page.locator(text_selector).count() > 0:
-                    await self.page.click(text_selector)
-                    logger.info(f"成功点击导览框 (通过文本): {value}")
-                    await asyncio.sleep(BUTTON_CLICK_WAIT)
-                    return True
-                
-                # 方法4: 通过title属性查找
-                logger.info(f"尝试通过title属性查找: div[title*='{value}']")
-                title_selector = f"div[title*='{value}']"
-                
-                if await self.page.locator(title_selector).count() > 0:
-                    await self.page.click(title_selector)
-                    logger.info(f"成功点击导览框 (通过title): {value}")
-                    await asyncio.sleep(BUTTON_CLICK_WAIT)
-                    return True
-                
-                # 方法5: 通过class和onclick组合查找
-                logger.info(f"尝试通过class和onclick组合查找: div.syslink[onclick*='{value}']")
-                class_selector = f"div.syslink[onclick*='{value}']"
-                
-                if await self.page.locator(class_selector).count() > 0:
-                    await self.page.click(class_selector)
-                    logger.info(f"成功点击导览框 (通过class+onclick): {value}")
-                    await asyncio.sleep(BUTTON_CLICK_WAIT)
-                    return True
-                
-                # 方法6: 通过第一个syslink元素查找
-                logger.info("尝试通过第一个syslink元素查找")
-                first_syslink = self.page.locator("div.syslink").first
-                
-                if await first_syslink.count() > 0:
-                    await first_syslink.click()
-                    logger.info(f"成功点击导览框 (通过第一个syslink): {value}")
-                    await asyncio.sleep(BUTTON_CLICK_WAIT)
-                    return True
-                
-                logger.warning(f"所有方法都失败，尝试 {attempt + 1}/{retries}")
-                
-            except Exception as e:
-                logger.warning(f"点击导览框失败 (尝试 {attempt + 1}/{retries}): {e}")
+            if attempt:
+                self.retry_count += 1
+            strategy = await self.strategy_stats.attempt("click_navigation_panel", value, strategies,
+                                                         pinned=["first_syslink"], loose=["text"])
+            if strategy:
+                logger.info(f"成功点击导览框 (通过{strategy}): {value}")
+                await self.wait_point("button_click", self.page_settled())
+                return True
             
+            logger.warning(f"所有方法都失败，尝试 {attempt + 1}/{retries}")
             if attempt < retries - 1:
                 await asyncio.sleep(RETRY_DELAY)
         
@@ -1343,6 +1449,9 @@ class LoginAutomation:
         """
         处理单个单元格的内容
         
+        单元格的分类结果优先从预先编译的操作计划中查表获得，
+        计划中没有的单元格（例如带后缀的出差人字段）才在运行时分类
+        
         Args:
             title: 列标题
             value: 单元格值
@@ -1360,270 +1469,162 @@ class LoginAutomation:
             self.current_amount = value_str
             logger.info(f"保存金额用于文件命名: {value_str}")
         
-        # 处理等待操作（标题为"等待"或"等待.1"等）
-        if title.startswith("等待"):
-            try:
-                # 支持两种格式：$数字 或 直接数字
-                if value_str.startswith(BUTTON_PREFIX):
-                    # 格式：$数字
-                    wait_seconds_str = value_str[len(BUTTON_PREFIX):]  # 去掉$前缀
-                else:
-                    # 格式：直接数字
-                    wait_seconds_str = value_str
-                
-                wait_seconds = float(wait_seconds_str)
-                logger.info(f"检测到等待操作，等待 {wait_seconds} 秒")
-                await asyncio.sleep(wait_seconds)
-                logger.info(f"等待 {wait_seconds} 秒完成")
-                return
-            except ValueError:
-                logger.warning(f"等待操作格式错误，无法解析秒数: {value_str}")
-                return
+        action = self.cell_actions.get((title, value_str))
+        if action is None:
+            action = classify_cell(title, value_str, self.get_object_id)
+        await self.execute_action(action)
+    
+    async def refine_field_action(self, action: Action) -> Action:
+        """
+        根据页面上元素的实际类型（每个element_id只检查一次）修正操作类型
         
-        # 处理radio按钮点击操作（以$$开头）- 优先处理
-        if value_str.startswith(RADIO_BUTTON_PREFIX):
-            # 提取$$之后的内容作为标题
-            radio_title = value_str[len(RADIO_BUTTON_PREFIX):]  # 去掉$$前缀
-            logger.info(f"检测到radio按钮操作，使用$$后的内容作为标题: {radio_title}")
-            
-            # 根据标题查找对应的radio按钮ID
-            radio_element_id = self.get_object_id(radio_title)
-            if radio_element_id:
-                logger.info(f"找到radio按钮ID: {radio_element_id}")
-                await self.click_radio_button(radio_element_id)
-            else:
-                logger.warning(f"未找到标题 '{radio_title}' 对应的radio按钮ID映射，请检查标题-ID映射表中是否包含此标题")
-            return
+        Args:
+            action: 按标题和element_id静态分类得到的操作
+            
+        Returns:
+            修正后的操作（元素不在页面上或类型无法对应时保持不变）
+        """
+        info = await self.field_classifier.classify(self.element_index(), action.element_id)
+        if info is None:
+            return action
+        kind = {field_classifier.DATE: action_plan.DATE,
+                field_classifier.SELECT: action_plan.DROPDOWN,
+                field_classifier.TEXT: action_plan.INPUT}.get(info.kind)
+        if kind is None or kind == action.kind:
+            return action
+        logger.info(f"{action.title}: 页面元素类型为{info.kind}，按{kind}处理（静态分类为{action.kind}）")
+        arg = (action.arg or action.value) if kind == action_plan.DROPDOWN else action.arg
+        return replace(action, kind=kind, arg=arg)
+    
+    async def execute_action(self, action: Action):
+        """
+        执行一个类型化的操作
         
-        # 处理第一行预约按钮操作（以$开头且标题为"预约按钮"）- 优先处理
-        if value_str.startswith(BUTTON_PREFIX) and title == "预约按钮":
-            button_value = value_str[len(BUTTON_PREFIX):]  # 去掉$前缀
-            if button_value == "预约":
-                logger.info("检测到第一行预约按钮操作")
-                await self.click_first_row_reservation_button()
-                return
+        Args:
+            action: classify_cell或操作计划给出的操作
+        """
+        # 按银行卡缓存跳过了弹窗等待时，先核对弹窗是否实际出现
+        if self.pending_card_check is not None:
+            await self.check_predicted_card_dialog()
         
-        # 处理添加内容按钮操作（以$开头且标题为"添加内容按钮"）- 优先处理
-        if value_str.startswith(BUTTON_PREFIX) and title == "添加内容按钮":
-            button_value = value_str[len(BUTTON_PREFIX):]  # 去掉$前缀
-            if button_value == "点击":
-                logger.info("检测到添加内容按钮操作")
-                await self.click_add_content_button()
-                return
+        # 输入框、下拉框和日期字段按页面上元素的实际类型选择填写方式
+        if action.kind in (action_plan.INPUT, action_plan.DROPDOWN, action_plan.DATE) and action.element_id:
+            action = await self.refine_field_action(action)
         
-        # 对于其他情况，先获取element_id
-        element_id = self.get_object_id(title)
-        if not element_id:
+        title = action.title
+        value_str = action.value
+        element_id = action.element_id
+        
+        # 普通输入框和下拉框先排队，遇到其他操作前一次性提交
+        if BATCH_FILL_ENABLED and action.kind in BATCHABLE_KINDS:
+            self.current_step = f"{action.kind}: {title}"
+            self.fill_batch.append(action)
             return
+        await self.flush_fill_batch()
+        self.current_step = f"{action.kind}: {title}"
+        if is_submit(action):
+            # 从这里开始表单可能已经提交，失败或中断后不能直接重新运行该序号
+            self.submitted_step = self.current_step
         
-        # 特殊处理：网上预约报账按钮（优先处理）
-        if title == "网上预约报账按钮":
-            logger.info(f"特殊处理网上预约报账按钮: {element_id}")
-            # 从element_id中提取WF_YB6参数
-            if "navToPrj('WF_YB6')" in element_id:
-                await self.click_navigation_panel("", "WF_YB6")
-                return
-            else:
-                # 如果element_id不是JavaScript函数，尝试直接点击
-                await self.click_button(element_id)
-                return
+        if action.kind == action_plan.INVALID:
+            logger.warning(action.note)
+            return
         
-        # 特殊处理：转卡信息工号（填写后检查银行卡选择弹窗）
-        if title == "转卡信息工号" or title.startswith("转卡信息工号"):
-            logger.info(f"特殊处理转卡信息工号: {value_str}")
-            await self.fill_input(element_id, value_str, title=title)
-            
-            # 填写工号后输入回车键来触发银行卡选择界面
-            logger.info("填写转卡信息工号完成，输入回车键触发银行卡选择界面...")
-            await asyncio.sleep(0.5)  # 短暂等待确保输入完成
-            
-            # 在输入框中输入回车键
-            try:
-                # 首先尝试在主页面查找输入框并输入回车
-                if element_id and await self.wait_for_element(element_id, timeout=2):
-                    await self.page.press(f"#{element_id}", "Enter", timeout=5000)  # 增加超时时间
-                    logger.info(f"在主页面输入框中输入回车键: {element_id}")
-                else:
-                    # 如果主页面找不到，尝试在iframe中查找
-                    frames = self.page.frames
-                    for frame in frames:
-                        try:
-                            input_element = frame.locator(f"#{element_id}").first
-                            if await input_element.count() > 0:
-                                await input_element.press("Enter", timeout=5000)  # 增加超时时间
-                                logger.info(f"在iframe中输入框中输入回车键: {element_id}")
-                                break
-                        except Exception as e:
-                            logger.debug(f"在iframe中查找输入框失败: {e}")
-                            continue
-                    else:
-                        # 如果还是找不到，尝试通过name属性查找
-                        try:
-                            await self.page.press(f"input[name='{element_id}']", "Enter", timeout=5000)  # 增加超时时间
-                            logger.info(f"通过name属性输入框中输入回车键: {element_id}")
-                        except Exception as e:
-                            logger.debug(f"通过name属性查找失败: {e}")
-            except Exception as e:
-                logger.warning(f"输入回车键失败: {e}")
-                # 尝试使用JavaScript模拟回车键
-                try:
-                    await self.page.evaluate('''(elementId) => {
-                        const element = document.getElementById(elementId);
-                        if (element) {
-                            const event = new KeyboardEvent('keydown', {
-                                key: 'Enter',
-                                code: 'Enter',
-                                keyCode: 13,
-                                which: 13,
-                                bubbles: true
-                            });
-                            element.dispatchEvent(event);
-                        }
-                    }''', element_id)
-                    logger.info("✓ 使用JavaScript成功输入回车键")
-                except Exception as js_e:
-                    logger.warning(f"JavaScript输入回车键也失败: {js_e}")
-            
-            # 等待银行卡选择弹窗出现（缩减等待时间）
-            logger.info("等待银行卡选择弹窗出现...")
-            await asyncio.sleep(BANK_CARD_DIALOG_WAIT)
-            
-            # 检查是否需要选择银行卡
-            # 创建当前记录的DataFrame
-            current_record = pd.DataFrame([{title: value_str}])
-            await self.handle_bank_card_selection_for_transfer(value_str, current_record)
+        # 等待操作（标题为"等待"或"等待.1"等）
+        if action.kind == action_plan.WAIT:
+            wait_seconds = float(action.arg)
+            logger.info(f"检测到等待操作，等待 {wait_seconds} 秒")
+            await asyncio.sleep(wait_seconds)
+            logger.info(f"等待 {wait_seconds} 秒完成")
             return
         
-
+        # radio按钮点击操作（以$$开头）
+        if action.kind == action_plan.RADIO:
+            logger.info(f"检测到radio按钮操作，使用$$后的内容作为标题: {action.arg}")
+            logger.info(f"找到radio按钮ID: {element_id}")
+            await self.click_radio_button(element_id)
+            return
         
-        # 处理按钮点击操作（以$开头）
-        if value_str.startswith(BUTTON_PREFIX):
-            button_value = value_str[len(BUTTON_PREFIX):]  # 去掉前缀符号
-            
-            # 特殊处理：如果是打印按钮，查找并点击打印确认单按钮
-            if title == "打印按钮" or title == "打印操作" or title == "打印确认单按钮":
-                logger.info("检测到打印按钮操作，查找并点击打印确认单按钮")
-                await self.click_print_button()
-                return
-            
-            # 普通按钮点击
+        # 第一行预约按钮操作
+        if action.kind == action_plan.RESERVATION:
+            logger.info("检测到第一行预约按钮操作")
+            if not await self.click_first_row_reservation_button():
+                raise StepFailed("点击第一行预约按钮最终失败")
+            return
+        
+        # 添加内容按钮操作
+        if action.kind == action_plan.ADD_CONTENT:
+            logger.info("检测到添加内容按钮操作")
+            if not await self.click_add_content_button():
+                raise StepFailed("点击添加内容按钮最终失败")
+            return
+        
+        # 系统导览框点击操作（@前缀或网上预约报账按钮）
+        if action.kind == action_plan.NAVIGATION:
+            if title == "网上预约报账按钮":
+                logger.info(f"特殊处理网上预约报账按钮: {self.get_object_id(title)}")
+            if not await self.click_navigation_panel(element_id, action.arg):
+                raise StepFailed(f"点击导览框最终失败: {action.arg}")
+            return
+        
+        # 转卡信息工号（填写后检查银行卡选择弹窗）
+        if action.kind == action_plan.TRANSFER_WORK_ID:
+            await self.handle_transfer_work_id(element_id, value_str, title)
+            return
+        
+        # 打印按钮：查找并点击打印确认单按钮
+        if action.kind == action_plan.PRINT:
+            logger.info("检测到打印按钮操作，查找并点击打印确认单按钮")
+            self.current_pdf_path = None
+            await self.click_print_button()
+            if not self.current_pdf_path:
+                raise StepFailed("打印确认单失败：未能确认确认单已保存，请人工核对")
+            return
+        
+        # 普通按钮点击
+        if action.kind == action_plan.BUTTON:
             await self.click_button(element_id)
             return
         
-        # 特殊处理：科目和金额填写（需要等待页面加载）
-        if title == "科目" or title == "金额":
-            # 特殊处理：科目列（以#开头）
-            if title == "科目" and value_str.startswith("#"):
+        # 科目填写（需要等待页面加载）
+        if action.kind == action_plan.SUBJECT:
+            if value_str.startswith("#"):
                 logger.info(f"处理科目列: {title} = {value_str}")
-                
-                # 提取科目名称（去掉#前缀）
-                subject_name = value_str[1:]
-                
-                # 在标题-ID表中查找对应的输入框ID
-                input_id = self.get_object_id(subject_name)
-                if not input_id:
-                    logger.warning(f"未找到科目 '{subject_name}' 对应的ID映射")
-                    return
-                
-                # 等待页面加载
-                logger.info(f"特殊处理科目填写，等待页面加载完成...")
-                await asyncio.sleep(SUBJECT_AMOUNT_WAIT)
-                logger.info(f"页面加载等待完成，开始填写科目: {subject_name}")
-                await self.fill_input(input_id, value_str, title=title)
-                return
-            elif title == "金额":
-                # 金额列需要特殊处理，因为它需要与科目配对
-                logger.info(f"处理金额列: {title} = {value_str}")
-                # 这里暂时不处理，因为金额应该与科目配对处理
-                return
-            else:
-                logger.info(f"特殊处理{title}填写，等待页面加载完成...")
-                await asyncio.sleep(SUBJECT_AMOUNT_WAIT)
-                logger.info(f"页面加载等待完成，开始填写{title}: {value_str}")
-                await self.fill_input(element_id, value_str, title=title)
-                return
-        
-        # 处理系统导览框点击操作（以@开头）
-        if value_str.startswith(NAVIGATION_PREFIX):
-            nav_value = value_str[1:]  # 去掉@符号
-            await self.click_navigation_panel(element_id, nav_value)
+            logger.info(f"特殊处理{title}填写，等待页面加载完成...")
+            await self.wait_point("subject_amount", all_of(self.network().settled(),
+                                                          element_ready(self.element_index(), element_id)))
+            logger.info(f"页面加载等待完成，开始填写{title}: {value_str}")
+            await self.fill_input(element_id, value_str, title=title)
             return
         
-        # 处理卡号尾号选择（以*开头）
-        if value_str.startswith(CARD_NUMBER_PREFIX):
-            card_tail = value_str[1:]  # 去掉*符号
-            await self.select_card_by_number(card_tail)
+        # 金额列应该与科目配对处理，这里不单独处理
+        if action.kind == action_plan.SKIP:
+            logger.info(action.note or f"处理金额列: {title} = {value_str}")
             return
         
-        # 处理下拉框选择（支持列名映射和ID模式识别）
-        # 创建列名到配置名的映射
-        dropdown_title_mapping = {
-            "省份": "省份地区",  # Excel列名 -> 配置名
-            "人员类型": "人员类型",  # 保持原样
-            "安排状态": "安排状态",  # 保持原样
-            "交通费": "交通费"  # 保持原样
-        }
+        # #科目 + 金额配对填写
+        if action.kind == action_plan.SUBJECT_AMOUNT:
+            logger.info(f"填写科目金额: {action.arg} = {value_str}")
+            await self.fill_input(element_id, value_str, title=action.arg)
+            return
         
-        # 获取实际的配置名
-        config_title = dropdown_title_mapping.get(title, title)
-        
-        # 检查是否为下拉框字段（通过配置名或ID模式）
-        is_dropdown = False
-        dropdown_config = None
-        
-        # 方法1: 通过配置名检查
-        if config_title in DROPDOWN_FIELDS:
-            is_dropdown = True
-            dropdown_config = DROPDOWN_FIELDS[config_title]
-        
-        # 方法2: 通过ID模式检查（如果element_id存在）
-        elif element_id:
-            # 检查是否为已知的下拉框ID模式
-            dropdown_id_patterns = [
-                "formWF_YB6_3492_yc-chr_sf",  # 省份下拉框模式
-                "formWF_YB6_3492_yc-chr_hsf",  # hsf下拉框模式
-                "formWF_YB6_3492_yc-chr_jtf",  # jtf下拉框模式
-                "formWF_YB6_3492_yc-chr_zc",   # 人员类型下拉框模式
-                "formWF_YB6_3492_yc-chr_azzt", # 安排状态下拉框模式
-            ]
-            
-            for pattern in dropdown_id_patterns:
-                if pattern in element_id:
-                    is_dropdown = True
-                    # 根据ID模式确定下拉框类型（使用精确匹配）
-                    if "formWF_YB6_3492_yc-chr_sf" in element_id:
-                        dropdown_config = DROPDOWN_FIELDS.get("省份地区", {})
-                    elif "formWF_YB6_3492_yc-chr_hsf" in element_id:
-                        # 这里需要根据实际情况确定hsf对应的下拉框类型
-                        dropdown_config = DROPDOWN_FIELDS.get("安排状态", {})
-                    elif "formWF_YB6_3492_yc-chr_jtf" in element_id:
-                        dropdown_config = DROPDOWN_FIELDS.get("交通费", {})
-                    elif "formWF_YB6_3492_yc-chr_zc" in element_id:
-                        dropdown_config = DROPDOWN_FIELDS.get("人员类型", {})
-                    elif "formWF_YB6_3492_yc-chr_azzt" in element_id:
-                        dropdown_config = DROPDOWN_FIELDS.get("安排状态", {})
-                    break
+        # 卡号尾号选择（以*开头）
+        if action.kind == action_plan.CARD_SELECT:
+            await self.select_card_by_number(action.arg)
+            return
         
-        if is_dropdown and dropdown_config:
-            # 获取下拉框的映射关系
-            dropdown_mapping = dropdown_config
-            # 查找对应的值
-            if value_str in dropdown_mapping:
-                mapped_value = dropdown_mapping[value_str]
-                await self.select_dropdown(element_id, mapped_value)
-                logger.info(f"下拉框映射: {title} = {value_str} -> {mapped_value}")
+        # 下拉框选择
+        if action.kind == action_plan.DROPDOWN:
+            await self.select_dropdown(element_id, value_str,
+                                       field_config=action_plan.dropdown_config(title, element_id))
+            if action.arg != value_str:
+                logger.info(f"下拉框映射: {title} = {value_str} -> {action.arg}")
             else:
-                # 如果没有映射，直接使用原值
-                await self.select_dropdown(element_id, value_str)
                 logger.info(f"下拉框直接选择: {title} = {value_str}")
             return
         
-        # 处理日期输入框（检查element_id是否包含日期相关的标识）
-        if (element_id and ("date" in element_id.lower() or "startdate" in element_id.lower() or "enddate" in element_id.lower() or 
-                           element_id.endswith("_startdate") or element_id.endswith("_enddate") or
-                           "temp-startdate" in element_id or "temp-enddate" in element_id or
-                           element_id == "formWF_YB6_3492_yc-chr_start1_0" or element_id == "formWF_YB6_3492_yc-chr_end1_0" or
-                           "start" in element_id or "end" in element_id)):
+        # 日期输入框
+        if action.kind == action_plan.DATE:
             logger.info(f"检测到日期输入框: {element_id} = {value_str}")
             
             # 优先尝试新的jQuery UI日历控件方法
@@ -1642,76 +1643,293 @@ class LoginAutomation:
                     await self.fill_date_input(element_id, value_str)
                     return
         
-        # 处理普通输入框
+        # 普通输入框
+        if action.kind == action_plan.INPUT:
+            await self.fill_input(element_id, value_str, title=title)
+            return
+        
+        logger.debug(f"操作 {action.kind} 不在单元格处理范围内: {title} = {value_str}")
+    
+    async def flush_fill_batch(self):
+        """
+        提交排队中的输入框和下拉框操作：同一frame中的连续字段在一次页面调用中完成，
+        遇到失败的字段即停止，使用fill_input/select_dropdown逐个处理该字段后再继续提交剩余字段
+        """
+        if not self.fill_batch:
+            return
+        pending, self.fill_batch = self.fill_batch, []
+        
+        while pending:
+            succeeded, pending = await apply_fill_batch(self.element_index(), pending)
+            for action in succeeded:
+                logger.info(f"批量填写 {action.title}: {action.element_id} = {action.arg or action.value}")
+            if any(action.kind == action_plan.DROPDOWN for action in succeeded):
+                await asyncio.sleep(ELEMENT_WAIT)
+            if not pending:
+                break
+            
+            action, pending = pending[0], pending[1:]
+            self.current_step = f"{action.kind}: {action.title}"
+            logger.info(f"批量填写未成功，逐个处理: {action.title} = {action.value}")
+            if action.kind == action_plan.DROPDOWN:
+                await self.select_dropdown(action.element_id, action.value,
+                                           field_config=action_plan.dropdown_config(action.title, action.element_id))
+            else:
+                await self.fill_input(action.element_id, action.value, title=action.title)
+    
+    async def handle_transfer_work_id(self, element_id: str, value_str: str, title: str):
+        """
+        填写转卡信息工号，输入回车触发银行卡选择界面并完成选择
+        
+        Args:
+            element_id: 工号输入框ID
+            value_str: 工号
+            title: 列标题
+        """
+        logger.info(f"特殊处理转卡信息工号: {value_str}")
         await self.fill_input(element_id, value_str, title=title)
+        
+        # 填写工号后输入回车键来触发银行卡选择界面
+        logger.info("填写转卡信息工号完成，输入回车键触发银行卡选择界面...")
+        await self.wait_point("input_settle", self.page_scripts_settled())  # 等待输入触发的页面脚本完成
+        
+        # 回车前注入弹窗监听，弹窗出现时立即得到通知
+        await self.bank_card_dialog()
+        triggered = time.monotonic()
+        
+        # 在输入框中输入回车键
+        try:
+            # 首先尝试在主页面查找输入框并输入回车
+            if element_id and await self.wait_for_element(element_id, timeout=2):
+                await self.page.press(f"#{element_id}", "Enter", timeout=5000)  # 增加超时时间
+                logger.info(f"在主页面输入框中输入回车键: {element_id}")
+            else:
+                # 如果主页面找不到，尝试在iframe中查找
+                frames = self.page.frames
+                for frame in frames:
+                    try:
+                        input_element = frame.locator(f"#{element_id}").first
+                        if await input_element.count() > 0:
+                            await input_element.press("Enter", timeout=5000)  # 增加超时时间
+                            logger.info(f"在iframe中输入框中输入回车键: {element_id}")
+                            break
+                    except Exception as e:
+                        logger.debug(f"在iframe中查找输入框失败: {e}")
+                        continue
+                else:
+                    # 如果还是找不到，尝试通过name属性查找
+                    try:
+                        await self.page.press(f"input[name='{element_id}']", "Enter", timeout=5000)  # 增加超时时间
+                        logger.info(f"通过name属性输入框中输入回车键: {element_id}")
+                    except Exception as e:
+                        logger.debug(f"通过name属性查找失败: {e}")
+        except Exception as e:
+            logger.warning(f"输入回车键失败: {e}")
+            # 尝试使用JavaScript模拟回车键
+            try:
+                await self.page.evaluate('''(elementId) => {
+                    const element = document.getElementById(elementId);
+                    if (element) {
+                        const event = new KeyboardEvent('keydown', {
+                            key: 'Enter',
+                            code: 'Enter',
+                            keyCode: 13,
+                            which: 13,
+                            bubbles: true
+                        });
+                        element.dispatchEvent(event);
+                    }
+                }''', element_id)
+                logger.info("✓ 使用JavaScript成功输入回车键")
+            except Exception as js_e:
+                logger.warning(f"JavaScript输入回车键也失败: {js_e}")
+        
+        # 等待银行卡选择弹窗出现并选择银行卡（没有弹窗时工号查询结束即继续）
+        current_record = pd.DataFrame([{title: value_str}])
+        await self.handle_bank_card_selection_for_transfer(value_str, current_record, since=triggered)
     
-    async def select_dropdown(self, element_id: str, value: str, retries: int = MAX_RETRIES):
+    async def select_dropdown(self, element_id: str, value: str, retries: int = MAX_RETRIES,
+                              field_config: Optional[Dict[str, str]] = None):
         """
         选择下拉框中的选项
         
         Args:
             element_id: 下拉框的ID
-            value: 要选择的选项值
+            value: 工作簿中的值
             retries: 重试次数
+            field_config: 该字段的DROPDOWN_FIELDS配置（只按该字段的映射匹配），None表示在所有配置中查找
         """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
         for attempt in range(retries):
+            if attempt:
+                self.retry_count += 1
             try:
-                # 优先在iframe中查找（根据日志分析，大部分元素都在iframe中）
-                frames = self.page.frames
-                for frame in frames:
+                # 通过frame索引定位下拉框（按ID优先，其次name属性）
+                index = self.element_index()
+                located = await index.resolve(element_id, [f"#{element_id}", f"select[name='{element_id}']"])
+                if located:
+                    frame, selector = located
+                    # 选项列表在同一页面状态下只读取一次，在本地匹配后只做一次确定的选择
+                    option_value = field_config.get(value, value) if field_config else value
+                    options = await self.dropdown_options.options(frame, selector, index)
+                    if options is not None:
+                        option_value, candidates = resolve_option(value, options, field_config)
+                        if option_value is None:
+                            # 缓存的选项可能已被页面脚本改变（例如联动下拉框），失效后重新读取一次
+                            self.dropdown_options.invalidate(frame, selector)
+                            options = await self.dropdown_options.options(frame, selector, index) or []
+                            option_value, candidates = resolve_option(value, options, field_config)
+                        if option_value is None and not candidates and len(options) <= 1:
+                            # 选项可能还在由页面脚本加载，下次尝试时重新读取
+                            self.dropdown_options.invalidate(frame, selector)
+                            raise ValueError(f"下拉框选项尚未加载（{len(options)}个选项）")
+                        if option_value is None:
+                            raise StepFailed(f"下拉框 {element_id} 中没有与 '{value}' 匹配的选项，"
+                                             f"最接近的候选项: {'、'.join(candidates) if candidates else '无'}")
+                        if option_value != value:
+                            logger.info(f"下拉框 {element_id}: '{value}' 匹配到选项值 '{option_value}'")
                     try:
-                        # 在iframe中查找下拉框
-                        select_element = frame.locator(f"#{element_id}").first
-                        if await select_element.count() > 0:
-                            await select_element.select_option(value=value)
-                            logger.info(f"在iframe中成功选择下拉框 {element_id}: {value}")
-                            await asyncio.sleep(ELEMENT_WAIT)
-                            return
-                    except Exception as e:
-                        logger.debug(f"在iframe中查找下拉框失败: {e}")
-                        continue
-                
-                # 如果iframe中找不到，尝试在主页面查找
-                try:
-                    await self.page.wait_for_selector(f"#{element_id}", timeout=3000)
-                    await self.page.select_option(f"#{element_id}", value)
-                    logger.info(f"在主页面成功选择下拉框 {element_id}: {value}")
+                        await frame.locator(selector).first.select_option(value=option_value)
+                    except Exception:
+                        index.forget(element_id)
+                        self.dropdown_options.invalidate(frame, selector)
+                        raise
+                    logger.info(f"在{index.frame_label(frame)}中成功选择下拉框 {element_id}: {option_value}")
                     await asyncio.sleep(ELEMENT_WAIT)
                     return
-                except Exception as e:
-                    logger.debug(f"在主页面查找下拉框失败: {e}")
                 
-                # 如果还是找不到，尝试通过name属性查找（优先在iframe中）
-                for frame in frames:
-                    try:
-                        select_element = frame.locator(f"select[name='{element_id}']").first
-                        if await select_element.count() > 0:
-                            await select_element.select_option(value=value)
-                            logger.info(f"在iframe中通过name属性成功选择下拉框 {element_id}: {value}")
-                            await asyncio.sleep(ELEMENT_WAIT)
-                            return
-                    except Exception as e:
-                        logger.debug(f"在iframe中通过name属性查找失败: {e}")
-                        continue
-                
-                # 最后尝试在主页面通过name属性查找
+                # 如果当前还找不到，在主页面等待下拉框出现
                 try:
-                    await self.page.select_option(f"select[name='{element_id}']", value=value)
-                    logger.info(f"在主页面通过name属性成功选择下拉框 {element_id}: {value}")
+                    await self.page.wait_for_selector(f"#{element_id}", timeout=3000)
+                    main_value = field_config.get(value, value) if field_config else value
+                    await self.page.select_option(f"#{element_id}", main_value)
+                    logger.info(f"在主页面成功选择下拉框 {element_id}: {main_value}")
                     await asyncio.sleep(ELEMENT_WAIT)
                     return
                 except Exception as e:
-                    logger.debug(f"在主页面通过name属性查找失败: {e}")
+                    logger.debug(f"在主页面查找下拉框失败: {e}")
                 
-                logger.warning(f"下拉框元素不存在: {element_id}")
-                return
+                raise StepFailed(f"下拉框元素不存在: {element_id}")
                     
+            except StepFailed:
+                raise
             except Exception as e:
                 logger.warning(f"选择下拉框失败 (尝试 {attempt + 1}/{retries}): {element_id} - {e}")
                 if attempt < retries - 1:
                     await asyncio.sleep(RETRY_DELAY)
-                else:
-                    logger.error(f"选择下拉框最终失败: {element_id}")
+        
+        raise StepFailed(f"选择下拉框最终失败: {element_id}")
+    
+    async def bank_card_dialog(self) -> BankCardDialogWatcher:
+        """
+        获取当前页面的银行卡选择弹窗监听（页面变化时重新注入）
+        
+        Returns:
+            BankCardDialogWatcher实例
+        """
+        if self.bank_card_watcher is None or self.bank_card_watcher.page is not self.page:
+            self.bank_card_watcher = BankCardDialogWatcher(self.page)
+            await self.bank_card_watcher.install()
+        return self.bank_card_watcher
+    
+    async def wait_for_bank_card_dialog(self, since: float = None):
+        """
+        等待银行卡选择弹窗出现；工号查询结束后弹窗仍未出现（员工只有一张卡）时立即返回
+        
+        Args:
+            since: 触发弹窗的时间（time.monotonic），默认为调用时刻
+            
+        Returns:
+            弹窗所在的frame，没有弹窗时返回None
+        """
+        watcher = await self.bank_card_dialog()
+        if not watcher.installed:
+            await self.wait_point("bank_card_dialog", selectors_visible(self.page, BANK_CARD_DIALOG_SELECTORS))
+            return await bank_card_dialog.find_dialog_frame(self.page)
+        
+        since = time.monotonic() if since is None else since
+        await self.wait_point("bank_card_dialog", bank_card_dialog.dialog_resolved(watcher, self.network(), since))
+        return watcher.dialog_frame()
+    
+    async def choose_bank_card(self, frame, card_tail: Optional[str], confirm: bool = True) -> Dict[str, Any]:
+        """
+        在弹窗所在的frame中按卡号尾号选择银行卡并确定
+        
+        Args:
+            frame: 弹窗所在的frame
+            card_tail: 卡号尾号（不含*），None表示选择第一张卡
+            confirm: 是否点击确定按钮
+            
+        Returns:
+            bank_card_dialog.select_card的结果（status为selected表示选择成功，cards为弹窗中的卡）
+        """
+        await self.wait_point("bank_card_selection", bank_card_dialog.cards_loaded(frame))
+        result = await bank_card_dialog.select_card(frame, card_tail, confirm)
+        
+        if result["status"] != bank_card_dialog.SELECTED:
+            if result["status"] == bank_card_dialog.NOT_FOUND:
+                logger.warning(f"未找到卡号尾号 {card_tail} 对应的银行卡，弹窗中的卡: "
+                               f"{[card['text'] for card in result['cards']]}")
+            else:
+                logger.warning(f"银行卡选择弹窗中没有可选择的银行卡（{result['status']}）")
+            return result
+        
+        if card_tail:
+            logger.info(f"✓ 成功选择卡号尾号 {card_tail} 对应的银行卡: {result.get('card', '')}")
+        else:
+            logger.info(f"✓ 自动选择第一张银行卡: {result.get('card', '')}")
+        
+        if confirm:
+            if result.get("confirmed"):
+                logger.info("✓ 成功点击确定按钮")
+                await self.wait_point("button_click", self.page_settled())
+            else:
+                await self.click_confirm_button_in_dialog()
+        return result
+    
+    def find_card_tail(self, record_data: pd.DataFrame) -> Optional[str]:
+        """
+        从记录中查找以*开头的卡号尾号
+        
+        Args:
+            record_data: 记录的DataFrame
+            
+        Returns:
+            卡号尾号（去掉*前缀），没有时返回None
+        """
+        for col in record_data.columns:
+            if col.startswith("卡号尾号"):
+                value_str = self.clean_value_string(record_data[col].iloc[0])
+                if value_str.startswith("*"):
+                    return value_str[1:]  # 去掉*前缀
+        return None
+    
+    async def check_predicted_card_dialog(self):
+        """
+        核对按银行卡缓存预测为不出现弹窗的工号：弹窗实际出现时更新缓存并完成选择，
+        超过弹窗等待上限仍未出现则确认预测
+        """
+        work_id, current_record, since = self.pending_card_check
+        watcher = self.bank_card_watcher
+        if watcher is not None and watcher.page is self.page and watcher.is_open():
+            self.pending_card_check = None
+            logger.warning(f"工号 {work_id} 出现了银行卡选择弹窗，与银行卡缓存的预测不一致，补充选择银行卡")
+            self.bank_cards.invalidate(work_id)
+            await self.handle_bank_card_selection_for_transfer(work_id, current_record, since)
+        elif time.monotonic() - since > self.wait_policy.ceilings["bank_card_dialog"]:
+            self.pending_card_check = None
+            self.bank_cards.record_no_dialog(work_id)
+    
+    async def resolve_pending_card_check(self):
+        """
+        等待未核对的工号在弹窗等待上限内核对完成：弹窗出现时补充选择银行卡，超过上限仍未出现则确认预测
+        """
+        while self.pending_card_check is not None:
+            await self.check_predicted_card_dialog()
+            if self.pending_card_check is not None:
+                await asyncio.sleep(WAIT_POLL_INTERVAL)
     
     async def handle_bank_card_selection(self, record_data: pd.DataFrame):
         """
@@ -1722,301 +1940,65 @@ class LoginAutomation:
         """
         try:
             logger.info("开始检测银行卡选择弹窗...")
-            
-            # 等待银行卡选择弹窗出现（缩减等待时间）
-            await asyncio.sleep(BANK_CARD_DIALOG_WAIT)
-            
-            # 等待银行卡选择弹窗出现 - 尝试多种选择器
-            bank_dialog_found = False
-            selectors_to_try = [
-                "#paybankdiv",                           # 主要的银行卡选择弹窗ID
-                "div[id='paybankdiv']",                  # 完整的div选择器
-                "div.ui-dialog-content",                 # UI对话框内容
-                "table[style*='background-color:#F2FAFD']",  # 银行卡表格
-                "input[name='rdoacnt']",                 # 银行卡选择radio按钮
-                "div.ui-dialog[aria-describedby='paybankdiv']",  # 完整的对话框
-                "div.ui-dialog-title:has-text('请选择卡号')",  # 对话框标题
-                "tbody tr td input[type='radio'][name='rdoacnt']"  # 表格中的radio按钮
-            ]
-            
-            # 方法1: 等待弹窗出现
-            for selector in selectors_to_try:
-                try:
-                    await self.page.wait_for_selector(selector, timeout=5000)
-                    logger.info(f"检测到银行卡选择弹窗，使用选择器: {selector}")
-                    bank_dialog_found = True
-                    break
-                except Exception as e:
-                    logger.debug(f"选择器 {selector} 未找到: {e}")
-                    continue
-            
-            # 方法2: 如果方法1失败，尝试检测弹窗是否已经存在
-            if not bank_dialog_found:
-                logger.info("尝试检测已存在的银行卡选择弹窗...")
-                for selector in selectors_to_try:
-                    try:
-                        elements = await self.page.locator(selector).all()
-                        if len(elements) > 0:
-                            logger.info(f"检测到已存在的银行卡选择弹窗，使用选择器: {selector}")
-                            bank_dialog_found = True
-                            break
-                    except Exception as e:
-                        logger.debug(f"检测选择器 {selector} 失败: {e}")
-                        continue
-            
-            # 方法3: 检查是否有"请选择卡号"的标题
-            if not bank_dialog_found:
-                try:
-                    title_elements = await self.page.locator("text=请选择卡号").all()
-                    if len(title_elements) > 0:
-                        logger.info("检测到'请选择卡号'标题，说明银行卡选择弹窗已出现")
-                        bank_dialog_found = True
-                except Exception as e:
-                    logger.debug(f"检测'请选择卡号'标题失败: {e}")
-            
-            if not bank_dialog_found:
+            frame = await self.wait_for_bank_card_dialog()
+            if frame is None:
                 logger.info("未检测到银行卡选择弹窗，可能只有一张卡或弹窗未出现")
                 return
             
-            # 查找卡号尾号列
-            card_tail_value = None
-            for col in record_data.columns:
-                if col.startswith("卡号尾号") or col == "卡号尾号":
-                    value = record_data[col].iloc[0]
-                    value_str = self.clean_value_string(value)
-                    if value_str.startswith("*"):
-                        card_tail_value = value_str[1:]  # 去掉*前缀
-                        break
-            
+            card_tail_value = self.find_card_tail(record_data)
             if not card_tail_value:
                 logger.warning("未找到卡号尾号信息")
                 return
             
             logger.info(f"开始选择卡号尾号: {card_tail_value}")
-            
-            # 等待弹窗完全加载（缩减等待时间）
-            await asyncio.sleep(BANK_CARD_SELECTION_WAIT)
-            
-            # 尝试多种方式查找和点击radio按钮
-            radio_clicked = False
-            
-            # 方法1: 通过XPath查找包含卡号尾号的tr，然后点击其中的radio
-            try:
-                radio_selector = f"//tr[td[contains(text(), '{card_tail_value}')]]/td/input[@type='radio'][@name='rdoacnt']"
-                radio_element = self.page.locator(radio_selector).first
-                if await radio_element.count() > 0:
-                    await radio_element.click()
-                    logger.info(f"成功选择卡号尾号 {card_tail_value} 对应的银行卡")
-                    radio_clicked = True
-            except Exception as e:
-                logger.debug(f"方法1失败: {e}")
-            
-            # 方法2: 如果方法1失败，尝试在iframe中查找
-            if not radio_clicked:
-                frames = self.page.frames
-                for frame in frames:
-                    try:
-                        radio_selector = f"//tr[td[contains(text(), '{card_tail_value}')]]/td/input[@type='radio'][@name='rdoacnt']"
-                        radio_element = frame.locator(radio_selector).first
-                        if await radio_element.count() > 0:
-                            await radio_element.click()
-                            logger.info(f"在iframe中成功选择卡号尾号 {card_tail_value} 对应的银行卡")
-                            radio_clicked = True
-                            break
-                    except Exception as e:
-                        logger.debug(f"在iframe中查找失败: {e}")
-                        continue
-            
-            # 方法3: 通过onclick属性查找
-            if not radio_clicked:
-                try:
-                    radio_selector = f"input[type='radio'][name='rdoacnt'][onclick*='{card_tail_value}']"
-                    radio_element = self.page.locator(radio_selector).first
-                    if await radio_element.count() > 0:
-                        await radio_element.click()
-                        logger.info(f"通过onclick属性成功选择卡号尾号 {card_tail_value} 对应的银行卡")
-                        radio_clicked = True
-                except Exception as e:
-                    logger.debug(f"方法3失败: {e}")
-            
-            # 方法4: 通过卡号文本查找
-            if not radio_clicked:
-                try:
-                    # 查找包含卡号尾号的td元素，然后找到同行的radio按钮
-                    card_selector = f"td:has-text('{card_tail_value}')"
-                    card_elements = await self.page.locator(card_selector).all()
-                    
-                    for card_element in card_elements:
-                        try:
-                            # 找到包含这个td的tr，然后找到其中的radio按钮
-                            parent_tr = card_element.locator("xpath=..")
-                            radio_in_tr = parent_tr.locator("input[type='radio'][name='rdoacnt']").first
-                            if await radio_in_tr.count() > 0:
-                                await radio_in_tr.click()
-                                logger.info(f"通过卡号文本成功选择卡号尾号 {card_tail_value} 对应的银行卡")
-                                radio_clicked = True
-                                break
-                        except Exception as e:
-                            logger.debug(f"在tr中查找radio失败: {e}")
-                            continue
-                except Exception as e:
-                    logger.debug(f"方法4失败: {e}")
-            
-            if radio_clicked:
-                logger.info("银行卡选择成功，等待选择生效...")
-                await asyncio.sleep(2)  # 等待选择生效
-                
-                # 尝试点击确定按钮
-                try:
-                    confirm_button = self.page.locator("button:has-text('确定')").first
-                    if await confirm_button.count() > 0:
-                        await confirm_button.click()
-                        logger.info("成功点击确定按钮")
-                        await asyncio.sleep(1)
-                except Exception as e:
-                    logger.debug(f"点击确定按钮失败: {e}")
-            else:
-                logger.warning(f"未找到卡号尾号 {card_tail_value} 对应的银行卡")
+            await self.choose_bank_card(frame, card_tail_value)
                 
         except Exception as e:
             logger.error(f"处理银行卡选择失败: {e}")
 
-    async def handle_bank_card_selection_for_transfer(self, work_id: str, current_record: pd.DataFrame = None):
+    async def handle_bank_card_selection_for_transfer(self, work_id: str, current_record: pd.DataFrame = None,
+                                                      since: float = None):
         """
         处理转卡信息工号填写后的银行卡选择弹窗
         
         Args:
             work_id: 转卡信息工号
             current_record: 当前处理的记录（可选）
+            since: 工号回车的时间（time.monotonic），默认为调用时刻
         """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
         try:
             logger.info(f"开始检测转卡信息工号 {work_id} 的银行卡选择弹窗...")
+            profile = self.bank_cards.get(work_id)
+            if profile is not None and profile.predicts_no_dialog:
+                # 该工号之前多次没有出现弹窗：不等待，下一个操作前再核对页面
+                watcher = await self.bank_card_dialog()
+                if not watcher.is_open():
+                    logger.info(f"工号 {work_id} 只有一张卡（银行卡缓存），不等待银行卡选择弹窗")
+                    self.pending_card_check = (work_id, current_record, time.monotonic() if since is None else since)
+                    return
+                logger.info(f"工号 {work_id} 出现了银行卡选择弹窗，与缓存不一致")
+                self.bank_cards.invalidate(work_id)
             
-            # 等待银行卡选择弹窗出现 - 只在iframe中查找
-            bank_dialog_found = False
-            selectors_to_try = [
-                "#paybankdiv",                           # 主要的银行卡选择弹窗ID
-                "div.ui-dialog[aria-describedby='paybankdiv']",  # 完整的对话框
-                "div.ui-dialog-title:has-text('请选择卡号')",  # 对话框标题
-                "input[name='rdoacnt']",                 # 银行卡选择radio按钮
-                "table[style*='background-color:#F2FAFD']",  # 银行卡表格
-                "div.ui-dialog-content"                  # UI对话框内容
-            ]
-            
-            # 在所有iframe中查找弹窗
-            logger.info("在所有iframe中查找银行卡选择弹窗...")
-            frames = self.page.frames
-            logger.info(f"找到 {len(frames)} 个iframe")
-            
-            target_frame = None
-            for i, frame in enumerate(frames):
-                logger.info(f"检查iframe {i}: {frame.url}")
-                try:
-                    for selector in selectors_to_try:
-                        try:
-                            await frame.wait_for_selector(selector, timeout=2000)
-                            logger.info(f"✓ 在iframe {i} 中检测到银行卡选择弹窗，使用选择器: {selector}")
-                            bank_dialog_found = True
-                            target_frame = frame
-                            break
-                        except Exception as e:
-                            logger.debug(f"iframe {i} 选择器 {selector} 未找到: {e}")
-                            continue
-                    if bank_dialog_found:
-                        break
-                except Exception as e:
-                    logger.debug(f"检查iframe {i} 失败: {e}")
-                    continue
-            
-            # 如果没找到，尝试检测已存在的弹窗
-            if not bank_dialog_found:
-                logger.info("尝试检测已存在的银行卡选择弹窗...")
-                for i, frame in enumerate(frames):
-                    try:
-                        for selector in selectors_to_try:
-                            try:
-                                elements = await frame.locator(selector).all()
-                                if len(elements) > 0:
-                                    logger.info(f"✓ 在iframe {i} 中检测到已存在的银行卡选择弹窗，使用选择器: {selector}")
-                                    bank_dialog_found = True
-                                    target_frame = frame
-                                    break
-                            except Exception as e:
-                                logger.debug(f"iframe {i} 检测选择器 {selector} 失败: {e}")
-                                continue
-                        if bank_dialog_found:
-                            break
-                    except Exception as e:
-                        logger.debug(f"检查iframe {i} 失败: {e}")
-                        continue
-            
-            # 检查是否有"请选择卡号"的标题
-            if not bank_dialog_found:
-                logger.info("检查是否有'请选择卡号'标题...")
-                for i, frame in enumerate(frames):
-                    try:
-                        title_elements = await frame.locator("text=请选择卡号").all()
-                        if len(title_elements) > 0:
-                            logger.info(f"✓ 在iframe {i} 中检测到'请选择卡号'标题")
-                            bank_dialog_found = True
-                            target_frame = frame
-                            break
-                    except Exception as e:
-                        logger.debug(f"iframe {i} 检测'请选择卡号'标题失败: {e}")
-                        continue
-            
-            # 检查是否有radio按钮
-            if not bank_dialog_found:
-                logger.info("检查是否有银行卡选择radio按钮...")
-                for i, frame in enumerate(frames):
-                    try:
-                        radio_elements = await frame.locator("input[type='radio'][name='rdoacnt']").all()
-                        if len(radio_elements) > 0:
-                            logger.info(f"✓ 在iframe {i} 中检测到 {len(radio_elements)} 个银行卡选择radio按钮")
-                            bank_dialog_found = True
-                            target_frame = frame
-                            break
-                    except Exception as e:
-                        logger.debug(f"iframe {i} 检测radio按钮失败: {e}")
-                        continue
-            
-            # 检查是否有ui-dialog类的元素
-            if not bank_dialog_found:
-                logger.info("检查是否有ui-dialog类的元素...")
-                for i, frame in enumerate(frames):
-                    try:
-                        dialog_elements = await frame.locator("div.ui-dialog").all()
-                        if len(dialog_elements) > 0:
-                            logger.info(f"✓ 在iframe {i} 中检测到 {len(dialog_elements)} 个ui-dialog元素")
-                            bank_dialog_found = True
-                            target_frame = frame
-                            break
-                    except Exception as e:
-                        logger.debug(f"iframe {i} 检测ui-dialog元素失败: {e}")
-                        continue
-            
-            if not bank_dialog_found:
-                logger.warning("未检测到银行卡选择弹窗，可能只有一张卡或弹窗未出现")
+            target_frame = await self.wait_for_bank_card_dialog(since)
+            if target_frame is None:
+                logger.info("未出现银行卡选择弹窗，该员工只有一张卡")
+                self.bank_cards.record_no_dialog(work_id)
                 return
             
-            logger.info("银行卡选择弹窗已检测到，开始处理...")
-            
-            # 查找卡号尾号信息
-            card_tail_value = None
+            logger.info(f"银行卡选择弹窗已在{self.element_index().frame_label(target_frame)}中出现，开始处理...")
             
             # 从当前记录中查找卡号尾号
+            card_tail_value = None
             if current_record is not None:
-                for col in current_record.columns:
-                    if col.startswith("卡号尾号") or col == "卡号尾号":
-                        value = current_record[col].iloc[0]
-                        value_str = self.clean_value_string(value)
-                        if value_str.startswith("*"):
-                            card_tail_value = value_str[1:]  # 去掉*前缀
-                            logger.info(f"从当前记录中找到卡号尾号: {card_tail_value}")
-                            break
+                card_tail_value = self.find_card_tail(current_record)
+                if card_tail_value:
+                    logger.info(f"从当前记录中找到卡号尾号: {card_tail_value}")
             
             # 如果没找到，尝试从全局数据中查找
-            if not card_tail_value and hasattr(self, 'reimbursement_data'):
+            if not card_tail_value and self.reimbursement_data is not None:
                 for col in self.reimbursement_data.columns:
                     if col.startswith("卡号尾号") or col == "卡号尾号":
                         # 查找当前工号对应的卡号尾号
@@ -2034,110 +2016,18 @@ class LoginAutomation:
             
             if not card_tail_value:
                 logger.warning("未找到卡号尾号信息，将自动选择第一张银行卡")
-                # 自动选择第一张银行卡
-                try:
-                    radio_buttons = await target_frame.locator("input[type='radio'][name='rdoacnt']").all()
-                    if len(radio_buttons) > 0:
-                        await radio_buttons[0].click()
-                        logger.info("✓ 自动选择第一张银行卡")
-                        await asyncio.sleep(1)
-                        
-                        # 点击确定按钮
-                        await self.click_confirm_button_in_dialog()
-                    else:
-                        logger.warning("未找到可选择的银行卡")
-                except Exception as e:
-                    logger.error(f"选择银行卡失败: {e}")
-                return
-            
-            logger.info(f"开始选择卡号尾号: {card_tail_value}")
-            
-            # 等待弹窗完全加载（缩减等待时间）
-            await asyncio.sleep(BANK_CARD_SELECTION_WAIT)
-            
-            # 尝试多种方式查找和点击radio按钮
-            radio_clicked = False
-            
-            # 方法1: 通过XPath查找包含卡号尾号的tr，然后点击其中的radio
-            logger.info("方法1: 通过XPath查找包含卡号尾号的tr...")
-            try:
-                # 查找包含卡号尾号的td元素，然后找到同行的radio按钮
-                radio_selector = f"//tr[td[contains(text(), '{card_tail_value}')]]/td/input[@type='radio'][@name='rdoacnt']"
-                radio_element = target_frame.locator(radio_selector).first
-                if await radio_element.count() > 0:
-                    await radio_element.click()
-                    logger.info(f"✓ 成功选择卡号尾号 {card_tail_value} 对应的银行卡")
-                    radio_clicked = True
-                else:
-                    logger.debug(f"未找到卡号尾号 {card_tail_value} 对应的radio按钮")
-            except Exception as e:
-                logger.debug(f"方法1失败: {e}")
-            
-            # 方法2: 通过onclick属性查找
-            if not radio_clicked:
-                logger.info("方法2: 通过onclick属性查找...")
-                try:
-                    radio_selector = f"input[type='radio'][name='rdoacnt'][onclick*='{card_tail_value}']"
-                    radio_element = target_frame.locator(radio_selector).first
-                    if await radio_element.count() > 0:
-                        await radio_element.click()
-                        logger.info(f"✓ 通过onclick属性成功选择卡号尾号 {card_tail_value} 对应的银行卡")
-                        radio_clicked = True
-                except Exception as e:
-                    logger.debug(f"方法2失败: {e}")
-            
-            # 方法3: 通过卡号文本查找
-            if not radio_clicked:
-                logger.info("方法3: 通过卡号文本查找...")
-                try:
-                    # 查找包含卡号尾号的td元素
-                    card_selector = f"td:has-text('{card_tail_value}')"
-                    card_elements = await target_frame.locator(card_selector).all()
-                    
-                    for card_element in card_elements:
-                        try:
-                            # 找到包含这个td的tr，然后找到其中的radio按钮
-                            parent_tr = card_element.locator("xpath=..")
-                            radio_in_tr = parent_tr.locator("input[type='radio'][name='rdoacnt']").first
-                            if await radio_in_tr.count() > 0:
-                                await radio_in_tr.click()
-                                logger.info(f"✓ 通过卡号文本成功选择卡号尾号 {card_tail_value} 对应的银行卡")
-                                radio_clicked = True
-                                break
-                        except Exception as e:
-                            logger.debug(f"在tr中查找radio失败: {e}")
-                            continue
-                except Exception as e:
-                    logger.debug(f"方法3失败: {e}")
-            
-            # 方法4: 遍历所有radio按钮，检查其onclick属性
-            if not radio_clicked:
-                logger.info("方法4: 遍历所有radio按钮检查onclick属性...")
-                try:
-                    radio_buttons = await target_frame.locator("input[type='radio'][name='rdoacnt']").all()
-                    for radio_button in radio_buttons:
-                        try:
-                            onclick_attr = await radio_button.get_attribute("onclick")
-                            if onclick_attr and card_tail_value in onclick_attr:
-                                await radio_button.click()
-                                logger.info(f"✓ 通过遍历onclick属性成功选择卡号尾号 {card_tail_value} 对应的银行卡")
-                                radio_clicked = True
-                                break
-                        except Exception as e:
-                            logger.debug(f"检查radio按钮onclick属性失败: {e}")
-                            continue
-                except Exception as e:
-                    logger.debug(f"方法4失败: {e}")
-            
-            if radio_clicked:
-                logger.info("银行卡选择成功，等待选择生效...")
-                await asyncio.sleep(2)  # 等待选择生效
-                
-                # 点击确定按钮
-                await self.click_confirm_button_in_dialog()
             else:
-                logger.warning(f"未找到卡号尾号 {card_tail_value} 对应的银行卡")
-                
+                logger.info(f"开始选择卡号尾号: {card_tail_value}")
+                if profile is not None and profile.dialog and not profile.has_tail(card_tail_value):
+                    logger.warning(f"银行卡缓存中工号 {work_id} 没有尾号为 {card_tail_value} 的卡，以页面为准")
+            result = await self.choose_bank_card(target_frame, card_tail_value)
+            if result["cards"]:
+                self.bank_cards.record_dialog(work_id, result["cards"])
+            if result["status"] != bank_card_dialog.SELECTED:
+                raise StepFailed(f"工号 {work_id} 的银行卡选择失败（{result['status']}）")
+                
+        except StepFailed:
+            raise
         except Exception as e:
             logger.error(f"处理转卡信息工号银行卡选择失败: {e}")
     
@@ -2165,7 +2055,7 @@ class LoginAutomation:
                     if await confirm_button.count() > 0:
                         await confirm_button.click()
                         logger.info(f"✓ 在主页面成功点击确定按钮 (使用选择器: {selector})")
-                        await asyncio.sleep(BUTTON_CLICK_WAIT)
+                        await self.wait_point("button_click", self.page_settled())
                         confirm_clicked = True
                         break
                 except Exception as e:
@@ -2182,7 +2072,7 @@ class LoginAutomation:
                             if await confirm_button.count() > 0:
                                 await confirm_button.click()
                                 logger.info(f"✓ 在iframe {i} 中成功点击确定按钮 (使用选择器: {selector})")
-                                await asyncio.sleep(BUTTON_CLICK_WAIT)
+                                await self.wait_point("button_click", self.page_settled())
                                 confirm_clicked = True
                                 break
                         except Exception as e:
@@ -2197,95 +2087,98 @@ class LoginAutomation:
         except Exception as e:
             logger.debug(f"点击确定按钮失败: {e}")
     
-    async def select_card_by_number(self, card_tail: str, retries: int = MAX_RETRIES):
+    async def select_card_by_number(self, card_tail: str, retries: int = MAX_RETRIES, work_id: str = None):
         """
         根据卡号尾号选择对应的radio按钮
         
         Args:
             card_tail: 卡号尾号（不包含*前缀）
             retries: 重试次数
+            work_id: 触发弹窗的工号（提供时把观察结果记录到银行卡缓存）
         """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
         logger.info(f"开始选择卡号尾号: {card_tail}")
         
+        # 查找包含指定卡号尾号的td元素所在行的radio按钮，其次是onclick属性中包含卡号尾号的radio按钮
+        radio_selectors = [
+            f"//tr[td[contains(text(), '{card_tail}')]]/td/input[@type='radio'][@name='rdoacnt']",
+            f"input[type='radio'][name='rdoacnt'][onclick*='{card_tail}']",
+        ]
+        key = f"card:{card_tail}"
+        
+        # 监听到弹窗时直接在弹窗所在的frame中一次完成选择
+        watcher = await self.bank_card_dialog()
+        frame = watcher.dialog_frame()
+        if frame is not None:
+            result = await bank_card_dialog.select_card(frame, card_tail, confirm=False)
+            if result["cards"]:
+                self.bank_cards.record_dialog(work_id, result["cards"])
+            if result["status"] == bank_card_dialog.SELECTED:
+                logger.info(f"在{self.element_index().frame_label(frame)}中成功选择卡号尾号 {card_tail} 对应的radio按钮")
+                await asyncio.sleep(ELEMENT_WAIT)
+                return
+            logger.debug(f"在弹窗中未能选择卡号尾号 {card_tail}（{result['status']}），按选择器查找")
+        
         for attempt in range(retries):
+            if attempt:
+                self.retry_count += 1
             try:
-                frames = self.page.frames
-                
-                # 首先在主页面查找
-                try:
-                    # 查找包含指定卡号尾号的td元素，然后找到同行的radio按钮
-                    radio_selector = f"//tr[td[contains(text(), '{card_tail}')]]/td/input[@type='radio'][@name='rdoacnt']"
-                    radio_element = self.page.locator(radio_selector).first
-                    if await radio_element.count() > 0:
-                        await radio_element.click()
-                        logger.info(f"成功选择卡号尾号 {card_tail} 对应的radio按钮")
-                        await asyncio.sleep(ELEMENT_WAIT)
-                        return
-                except Exception as e:
-                    logger.debug(f"在主页面查找radio按钮失败: {e}")
-                
-                # 在iframe中查找
-                for frame in frames:
+                index = self.element_index()
+                located = await index.resolve(key, radio_selectors)
+                if located:
+                    frame, selector = located
                     try:
-                        radio_selector = f"//tr[td[contains(text(), '{card_tail}')]]/td/input[@type='radio'][@name='rdoacnt']"
-                        radio_element = frame.locator(radio_selector).first
-                        if await radio_element.count() > 0:
-                            await radio_element.click()
-                            logger.info(f"在iframe中成功选择卡号尾号 {card_tail} 对应的radio按钮")
-                            await asyncio.sleep(ELEMENT_WAIT)
-                            return
-                    except Exception as e:
-                        logger.debug(f"在iframe中查找radio按钮失败: {e}")
-                        continue
-                
-                # 尝试更通用的选择器
-                try:
-                    # 使用onclick属性中包含卡号尾号的方式
-                    radio_selector = f"input[type='radio'][name='rdoacnt'][onclick*='{card_tail}']"
-                    
-                    # 先在主页面尝试
-                    radio_element = self.page.locator(radio_selector).first
-                    if await radio_element.count() > 0:
-                        await radio_element.click()
-                        logger.info(f"通过onclick属性成功选择卡号尾号 {card_tail} 对应的radio按钮")
-                        await asyncio.sleep(ELEMENT_WAIT)
-                        return
-                    
-                    # 在iframe中尝试
-                    for frame in frames:
-                        try:
-                            radio_element = frame.locator(radio_selector).first
-                            if await radio_element.count() > 0:
-                                await radio_element.click()
-                                logger.info(f"在iframe中通过onclick属性成功选择卡号尾号 {card_tail} 对应的radio按钮")
-                                await asyncio.sleep(ELEMENT_WAIT)
-                                return
-                        except Exception as e:
-                            logger.debug(f"在iframe中通过onclick属性查找失败: {e}")
-                            continue
-                
-                except Exception as e:
-                    logger.debug(f"通过onclick属性查找失败: {e}")
+                        await frame.locator(selector).first.click()
+                    except Exception:
+                        index.forget(key)
+                        raise
+                    logger.info(f"在{index.frame_label(frame)}中成功选择卡号尾号 {card_tail} 对应的radio按钮")
+                    await asyncio.sleep(ELEMENT_WAIT)
+                    return
                 
-                logger.warning(f"未找到卡号尾号 {card_tail} 对应的radio按钮")
-                return
+                if not watcher.is_open():
+                    # 页面上没有银行卡选择弹窗也没有卡号radio按钮：该工号只有一张卡
+                    logger.info(f"未找到卡号尾号 {card_tail} 对应的radio按钮，也没有银行卡选择弹窗")
+                    self.bank_cards.record_no_dialog(work_id)
+                    return
+                raise StepFailed(f"银行卡选择弹窗中没有卡号尾号 {card_tail} 对应的radio按钮")
                 
+            except StepFailed:
+                raise
             except Exception as e:
                 logger.warning(f"选择卡号radio按钮失败 (尝试 {attempt + 1}/{retries}): {card_tail} - {e}")
                 if attempt < retries - 1:
                     await asyncio.sleep(RETRY_DELAY)
-                else:
-                    logger.error(f"选择卡号radio按钮最终失败: {card_tail}")
+        
+        raise StepFailed(f"选择卡号radio按钮最终失败: {card_tail}")
     
     async def click_print_button(self):
         """
-        先点击网页上的打印确认单按钮，然后等待2秒，最后自动执行Python脚本处理打印对话框
+        先点击网页上的打印确认单按钮，然后等待2秒，最后自动执行Python脚本处理打印对话框；
+        pdf打印方式下直接把确认单渲染为PDF
+        """
+        # 先提交排队中的批量填写，保证操作顺序
+        await self.flush_fill_batch()
+        
+        if self.print_mode == "pdf":
+            await self.print_confirmation_pdf()
+            return
+        
+        # 打印对话框出现在屏幕最前面，从点击按钮到保存完成期间其他worker和分片进程不能点击打印按钮
+        async with self.print_lock, ConsoleFileLock(PRINT_LOCK_FILE, wait_message="其他worker正在处理打印对话框，等待..."):
+            await self._click_print_button_dialog()
+    
+    async def _click_print_button_dialog(self):
+        """
+        dialog打印方式：点击打印确认单按钮并处理Chrome打印对话框（调用方持有打印锁）
         """
         try:
             logger.info("查找网页上的打印确认单按钮...")
             
-            # 等待页面加载完成
-            await asyncio.sleep(2)
+            # 等待打印确认单按钮出现
+            await self.wait_point("print_page_ready", selectors_visible(self.page, PRINT_BUTTON_SELECTORS))
             
             # 查找并点击网页上的打印确认单按钮
             print_button_found = await self._find_and_click_print_button()
@@ -2294,8 +2187,8 @@ class LoginAutomation:
                 logger.info("✓ 网页打印确认单按钮点击成功")
                 
                 # 等待2秒钟，确保Chrome打印页面完全加载
-                logger.info("等待2秒钟，确保Chrome打印页面加载完成...")
-                await asyncio.sleep(2)
+                logger.info("等待Chrome打印页面加载完成...")
+                await self.wait_point("print_preview")
                 
                 # 自动执行Python脚本处理打印对话框
                 logger.info("开始自动执行Python脚本处理打印对话框...")
@@ -2310,119 +2203,116 @@ class LoginAutomation:
             logger.info("主要方法失败，尝试备用方案...")
             await self._click_print_button_fallback()
     
+    async def print_confirmation_pdf(self) -> Optional[str]:
+        """
+        点击打印确认单按钮，并把请求打印的文档（弹出窗口或iframe）直接保存为PDF，
+        不经过Chrome打印对话框，可以在无头模式下运行
+        
+        Returns:
+            保存的PDF路径，失败时返回None
+        """
+        try:
+            logger.info("查找网页上的打印确认单按钮（PDF模式）...")
+            await self.wait_point("print_page_ready", selectors_visible(self.page, PRINT_BUTTON_SELECTORS))
+            
+            # 屏蔽window.print，点击后通过标记找到请求打印的文档
+            await suppress_print_dialog(self.page)
+            context = self.page.context
+            pages_before = set(context.pages)
+            
+            if not await self._find_and_click_print_button():
+                logger.error("❌ 网页打印确认单按钮点击失败")
+                return None
+            
+            target = await find_print_target(context)
+            new_pages = [page for page in context.pages if page not in pages_before]
+            if target is None:
+                if not new_pages:
+                    logger.error("❌ 点击打印按钮后未找到需要打印的文档")
+                    return None
+                # 弹出窗口没有调用window.print时，直接打印弹出窗口
+                logger.warning("未检测到打印请求，保存新打开的页面")
+                await new_pages[-1].wait_for_load_state("load")
+                target = (new_pages[-1], new_pages[-1].main_frame)
+            
+            stem = build_pdf_stem(self.get_current_project_number(), self.get_current_total_amount(),
+                                  self.current_sequence, self.worker_id)
+            path = reserve_pdf_path(PRINT_FILE_PATH, stem)
+            try:
+                await save_print_target_pdf(target[0], target[1], path)
+            except Exception:
+                # 删除预留的空文件
+                os.remove(path)
+                raise
+            logger.info(f"✓ 确认单已保存为PDF: {path}")
+            self.current_pdf_path = path
+            
+            # 关闭打印弹出窗口
+            for page in new_pages:
+                try:
+                    await page.close()
+                except Exception as e:
+                    logger.debug(f"关闭打印窗口失败: {e}")
+            return path
+        except Exception as e:
+            logger.error(f"生成确认单PDF失败: {e}")
+            return None
+    
     async def _find_and_click_print_button(self):
         """
         查找并点击网页上的打印确认单按钮
         """
         try:
-            # 查找打印按钮的选择器（基于之前成功的日志）
-            print_button_selectors = [
-                'input[name="BtnPrint"]',
-                'input[value="打印确认单"]',
-                'input[onclick*="ybprint"]',
-                '#BtnPrint',
-                'input.buttHighlight'
-            ]
-            
-            # 优先在iframe中查找（根据日志，按钮通常在iframe 7中）
-            frames = self.page.frames
-            logger.info(f"在 {len(frames)} 个iframe中查找打印按钮...")
+            print_button_selectors = PRINT_BUTTON_SELECTORS
+            
+            # 通过frame索引在所有iframe和主页面中查找（根据日志，按钮通常在iframe 7中）
+            index = self.element_index()
+            logger.info(f"在 {len(self.page.frames)} 个frame中查找打印按钮...")
+            located = await index.resolve("print_button", print_button_selectors)
+            if not located:
+                logger.warning("未找到打印按钮")
+                return False
             
-            for i, frame in enumerate(frames):
-                logger.info(f"在iframe {i} 中查找打印按钮: {frame.url or 'unnamed frame'}")
-                
-                for selector in print_button_selectors:
-                    try:
-                        button = frame.locator(selector).first
-                        if await button.count() > 0:
-                            logger.info(f"在iframe {i} 中找到打印按钮: {selector}")
-                            logger.info(f"准备点击打印按钮...")
-                            try:
-                                # 方法1：使用click()方法
-                                logger.info(f"尝试方法1：使用click()方法")
-                                await button.click(timeout=3000)
-                                logger.info(f"✓ 在iframe {i} 中成功点击打印按钮")
-                                return True
-                            except Exception as click_error:
-                                logger.warning(f"方法1失败: {click_error}")
-                                try:
-                                    # 方法2：使用JavaScript点击
-                                    logger.info(f"尝试方法2：使用JavaScript点击")
-                                    await frame.evaluate("arguments[0].click();", button)
-                                    logger.info(f"✓ 在iframe {i} 中使用JavaScript成功点击打印按钮")
-                                    return True
-                                except Exception as js_error:
-                                     logger.warning(f"方法2失败: {js_error}")
-                                     try:
-                                         # 方法3：使用坐标点击
-                                         logger.info(f"尝试方法3：使用坐标点击")
-                                         bbox = await button.bounding_box()
-                                         if bbox:
-                                             x = bbox['x'] + bbox['width'] / 2
-                                             y = bbox['y'] + bbox['height'] / 2
-                                             await frame.mouse.click(x, y, timeout=3000)
-                                             logger.info(f"✓ 在iframe {i} 中使用坐标成功点击打印按钮")
-                                             return True
-                                         else:
-                                             logger.warning("无法获取按钮边界框")
-                                     except Exception as coord_error:
-                                         logger.warning(f"方法3失败: {coord_error}")
-                                
-                                # 即使所有方法都失败，也认为找到了按钮，继续执行
-                                logger.info(f"所有点击方法都失败，但继续执行，假设打印按钮已点击")
-                                return True
-                    except Exception as e:
-                        logger.debug(f"iframe {i} 选择器 {selector} 失败: {e}")
-                        continue
+            frame, selector = located
+            label = index.frame_label(frame)
+            button = frame.locator(selector).first
+            logger.info(f"在{label}中找到打印按钮: {selector}")
+            logger.info(f"准备点击打印按钮...")
             
-            # 如果在iframe中没找到，在主页面查找
-            logger.info("在iframe中未找到，尝试在主页面查找...")
-            for selector in print_button_selectors:
+            async def by_click():
+                # 方法1：使用click()方法
                 try:
-                    button = self.page.locator(selector).first
-                    if await button.count() > 0:
-                        logger.info(f"在主页面找到打印按钮: {selector}")
-                        logger.info(f"准备点击打印按钮...")
-                        try:
-                            # 方法1：使用click()方法
-                            logger.info(f"尝试方法1：使用click()方法")
-                            await button.click(timeout=3000)
-                            logger.info("✓ 在主页面成功点击打印按钮")
-                            return True
-                        except Exception as click_error:
-                            logger.warning(f"方法1失败: {click_error}")
-                            try:
-                                # 方法2：使用JavaScript点击
-                                logger.info(f"尝试方法2：使用JavaScript点击")
-                                await self.page.evaluate("arguments[0].click();", button)
-                                logger.info("✓ 在主页面使用JavaScript成功点击打印按钮")
-                                return True
-                            except Exception as js_error:
-                                logger.warning(f"方法2失败: {js_error}")
-                                try:
-                                    # 方法3：使用坐标点击
-                                    logger.info(f"尝试方法3：使用坐标点击")
-                                    bbox = await button.bounding_box()
-                                    if bbox:
-                                        x = bbox['x'] + bbox['width'] / 2
-                                        y = bbox['y'] + bbox['height'] / 2
-                                        await self.page.mouse.click(x, y, timeout=3000)
-                                        logger.info("✓ 在主页面使用坐标成功点击打印按钮")
-                                        return True
-                                    else:
-                                        logger.warning("无法获取按钮边界框")
-                                except Exception as coord_error:
-                                    logger.warning(f"方法3失败: {coord_error}")
-                            
-                            # 即使所有方法都失败，也认为找到了按钮，继续执行
-                            logger.info(f"所有点击方法都失败，但继续执行，假设打印按钮已点击")
-                            return True
-                except Exception as e:
-                    logger.debug(f"主页面选择器 {selector} 失败: {e}")
-                    continue
+                    await button.click(timeout=3000)
+                except Exception:
+                    index.forget("print_button")
+                    raise
+                return True
             
-            logger.warning("未找到打印按钮")
-            return False
+            async def by_javascript():
+                # 方法2：使用JavaScript点击
+                await button.evaluate("(el) => el.click()")
+                return True
+            
+            async def by_coordinates():
+                # 方法3：使用坐标点击
+                bbox = await button.bounding_box()
+                if not bbox:
+                    logger.warning("无法获取按钮边界框")
+                    return False
+                await self.page.mouse.click(bbox['x'] + bbox['width'] / 2, bbox['y'] + bbox['height'] / 2)
+                return True
+            
+            # 按以往成功的点击方法排序尝试
+            strategy = await self.strategy_stats.attempt(
+                "click_print_button", "print_button",
+                [("click", by_click), ("javascript", by_javascript), ("coordinates", by_coordinates)])
+            if strategy:
+                logger.info(f"✓ 在{label}中成功点击打印按钮 (通过{strategy})")
+                return True
+            
+            # 即使所有方法都失败，也认为找到了按钮，继续执行
+            logger.info(f"所有点击方法都失败，但继续执行，假设打印按钮已点击")
+            return True
             
         except Exception as e:
             logger.error(f"查找打印按钮失败: {e}")
@@ -2434,13 +2324,7 @@ class LoginAutomation:
         """
         try:
             # 查找打印按钮
-            print_button_selectors = [
-                'input[name="BtnPrint"]',
-                'input[value="打印确认单"]',
-                'input[onclick*="ybprint"]',
-                '#BtnPrint',
-                'input.buttHighlight'
-            ]
+            print_button_selectors = PRINT_BUTTON_SELECTORS
             
             print_button_found = False
             
@@ -2556,9 +2440,13 @@ class LoginAutomation:
             from config import PRINT_FILE_PATH
             file_path = PRINT_FILE_PATH
             
-            # 生成带时间戳的文件名
-            import time
-            file_name = f"报销单_{time.strftime('%Y%m%d_%H%M%S')}.pdf"
+            # 文件名包含项目号、金额、序号、时间戳、worker和进程号，同一秒内的多个打印不会重名
+            stem = build_pdf_stem(project_number, total_amount, self.current_sequence, self.worker_id)
+            file_name = f"{stem}.pdf"
+            suffix = 0
+            while os.path.exists(os.path.join(file_path, file_name)):
+                suffix += 1
+                file_name = f"{stem}_{suffix}.pdf"
             
             logger.info(f"准备保存文件: {file_name}")
             logger.info(f"保存路径: {file_path}")
@@ -2569,6 +2457,7 @@ class LoginAutomation:
             if success:
                 logger.info("✓ Python脚本处理打印对话框成功")
                 logger.info(f"文件已保存到: {file_path}/{file_name}")
+                self.current_pdf_path = os.path.join(file_path, file_name)
             else:
                 logger.warning("⚠ Python脚本处理失败，尝试备用方案")
                 await self._handle_print_dialog_fallback()
@@ -2580,8 +2469,18 @@ class LoginAutomation:
     
     async def _execute_python_print_script(self, file_path, file_name):
         """
-        执行Python脚本处理打印对话框
+        执行Python脚本处理打印对话框（启用常驻输入worker时提交给worker执行）
         """
+        if self.input_worker is not None:
+            result = await self.input_worker.submit("print_dialog", filepath=file_path, filename=file_name,
+                                                    dialog_wait=INPUT_WORKER_DIALOG_WAIT)
+            if result.get("ok"):
+                logger.info(f"输入worker处理打印对话框成功（排队 {result.get('queued_seconds')} 秒，"
+                            f"执行 {result.get('duration')} 秒）")
+                return True
+            logger.error(f"输入worker处理打印对话框失败: {result.get('error')}")
+            return False
+        
         try:
             import subprocess
             import sys
@@ -2778,10 +2677,9 @@ class LoginAutomation:
                 logger.info(f"使用保存的报销项目号: {self.current_project_number}")
                 return self.current_project_number
             
-            # 如果保存的值不存在，从Excel数据中查找
-            if hasattr(self, 'reimbursement_data') and self.current_sequence is not None:
-                # 查找当前序号对应的记录
-                current_record = self.reimbursement_data[self.reimbursement_data[SEQUENCE_COL] == self.current_sequence]
+            # 如果保存的值不存在，从当前序号组的数据中查找
+            if self.current_group is not None:
+                current_record = self.current_group
                 if not current_record.empty:
                     # 查找项目编号列（按优先级）
                     project_columns = ["报销项目号", "项目编号", "项目号"]
@@ -2809,10 +2707,9 @@ class LoginAutomation:
                 logger.info(f"使用保存的金额: {self.current_amount}")
                 return self.current_amount
             
-            # 如果保存的值不存在，从Excel数据中查找
-            if hasattr(self, 'reimbursement_data') and self.current_sequence is not None:
-                # 查找当前序号对应的记录
-                current_record = self.reimbursement_data[self.reimbursement_data[SEQUENCE_COL] == self.current_sequence]
+            # 如果保存的值不存在，从当前序号组的数据中查找
+            if self.current_group is not None:
+                current_record = self.current_group
                 if not current_record.empty:
                     # 查找金额列（按优先级）
                     amount_columns = ["金额", "总金额", "个人金额"]
@@ -2840,6 +2737,9 @@ class LoginAutomation:
         """
         logger.info(f"开始处理序号 {sequence_num} 的报销记录，共 {len(group_data)} 行")
         
+        # 一次遍历完成子序列分段，后续处理共用
+        segmentation = segment_record(group_data)
+        
         # 检查是否包含登录信息（通常在第一行）
         first_row = group_data.iloc[0]
         if "登录界面工号" in group_data.columns and pd.notna(first_row["登录界面工号"]):
@@ -2852,33 +2752,20 @@ class LoginAutomation:
                 logger.info(f"登录完成，继续处理序号 {sequence_num} 的剩余 {len(group_data) - 1} 行数据")
                 # 处理剩余的行（跳过第一行，因为已经处理了登录）
                 remaining_data = group_data.iloc[1:]
+                remaining_segmentation = segmentation.tail(1)
                 # 检查是否包含第二种子序列或第三种子序列，如果包含则跳过重复处理
-                has_traveler_subsequence = False
-                has_travel_card_subsequence = False
-                for _, row in remaining_data.iterrows():
-                    for col in remaining_data.columns:
-                        if col.startswith(SUBSEQUENCE_START_COL):
-                            if pd.notna(row[col]) and self.clean_value_string(row[col]) == TRAVELER_SUBSEQUENCE_MARKER:
-                                has_traveler_subsequence = True
-                                break
-                            elif pd.notna(row[col]) and self.clean_value_string(row[col]) == TRAVEL_CARD_SUBSEQUENCE_MARKER:
-                                has_travel_card_subsequence = True
-                                break
-                    if has_traveler_subsequence or has_travel_card_subsequence:
-                        break
-                
-                if has_traveler_subsequence or has_travel_card_subsequence:
+                if remaining_segmentation.starts_kind(TRAVELER, TRAVEL_CARD):
                     logger.info("检测到第二种子序列或第三种子序列已在登录流程中处理，跳过重复处理，但继续处理后续操作字段")
                     # 即使跳过了重复处理，也要处理后续的操作字段（如"下一步按钮5"）
-                    await self.process_remaining_operations(remaining_data)
+                    await self.process_remaining_operations(remaining_data, remaining_segmentation)
                 else:
-                    await self.process_subsequences(remaining_data)
+                    await self.process_subsequences(remaining_data, remaining_segmentation)
         else:
             # 处理子序列逻辑
             logger.info("未检测到登录信息，直接处理子序列逻辑")
-            await self.process_subsequences(group_data)
+            await self.process_subsequences(group_data, segmentation)
     
-    async def process_subsequences(self, group_data: pd.DataFrame):
+    async def process_subsequences(self, group_data: pd.DataFrame, segmentation: Optional[Segmentation] = None):
         """
         处理子序列逻辑：
         1. 当检测到"子序列开始"时，开始子序列处理
@@ -2888,44 +2775,33 @@ class LoginAutomation:
         
         Args:
             group_data: 同一序号下的所有数据行
+            segmentation: group_data的子序列分段结果（None时现场计算）
         """
+        if segmentation is None:
+            segmentation = segment_record(group_data)
+        
         # 将DataFrame转换为list以便遍历
         rows = group_data.to_dict('records')
         columns = list(group_data.columns)
         
+        # 子序列开始和结束列的位置（支持自动重命名，使用第一个找到的列）
+        subsequence_start_idx = segmentation.start_col_idx
+        subsequence_end_idx = segmentation.end_col_idx
+        if subsequence_start_idx is not None:
+            logger.info(f"找到子序列开始列: {columns[subsequence_start_idx]} (索引: {subsequence_start_idx})")
+        else:
+            logger.debug("未找到子序列开始列，按普通方式处理")
+        if subsequence_end_idx is not None:
+            logger.info(f"找到子序列结束列: {columns[subsequence_end_idx]} (索引: {subsequence_end_idx})")
+        else:
+            logger.debug("未找到子序列结束列")
+        
         i = 0
         while i < len(rows):
             row = rows[i]
+            tag = segmentation.tags[i]
             current_sequence = row.get(SEQUENCE_COL, None)
-            logger.info(f"处理第 {i+1} 行数据，序号: {current_sequence}")
-            
-            # 查找子序列开始和结束列的位置（支持自动重命名）
-            subsequence_start_idx = None
-            subsequence_end_idx = None
-            
-            # 查找子序列开始列（支持自动重命名如"子序列开始.1"）
-            subsequence_start_cols = [col for col in columns if col.startswith(SUBSEQUENCE_START_COL)]
-            if subsequence_start_cols:
-                # 使用第一个找到的子序列开始列
-                subsequence_start_idx = columns.index(subsequence_start_cols[0])
-                logger.info(f"找到子序列开始列: {subsequence_start_cols[0]} (索引: {subsequence_start_idx})")
-                if len(subsequence_start_cols) > 1:
-                    logger.info(f"注意：还找到其他子序列开始列: {subsequence_start_cols[1:]}")
-            else:
-                logger.debug("未找到子序列开始列，按普通方式处理")
-                subsequence_start_idx = None
-            
-            # 查找子序列结束列（支持自动重命名如"子序列结束.1"）
-            subsequence_end_cols = [col for col in columns if col.startswith(SUBSEQUENCE_END_COL)]
-            if subsequence_end_cols:
-                # 使用第一个找到的子序列结束列
-                subsequence_end_idx = columns.index(subsequence_end_cols[0])
-                logger.info(f"找到子序列结束列: {subsequence_end_cols[0]} (索引: {subsequence_end_idx})")
-                if len(subsequence_end_cols) > 1:
-                    logger.info(f"注意：还找到其他子序列结束列: {subsequence_end_cols[1:]}")
-            else:
-                logger.debug("未找到子序列结束列")
-                subsequence_end_idx = None
+            logger.info(f"处理第 {i+1} 行数据，序号: {current_sequence}")
             
             # 处理当前行的列
             col_idx = 0
@@ -2944,9 +2820,9 @@ class LoginAutomation:
                         subsequence_value_str = self.clean_value_string(subsequence_value)
                         
                         # 检查是否为第二种子序列（数字"1"标记）
-                        if subsequence_value_str == TRAVELER_SUBSEQUENCE_MARKER:
+                        if tag.kind == TRAVELER:
                             logger.info(f"检测到第二种子序列（出差人信息），开始处理出差人信息填写")
-                            await self.process_traveler_subsequence(group_data, i)
+                            await self.process_traveler_subsequence(group_data, i, segmentation)
                             # 第二种子序列处理完成后，继续处理子序列结束后的其他列
                             if subsequence_end_idx is not None:
                                 col_idx = subsequence_end_idx + 1
@@ -2954,11 +2830,10 @@ class LoginAutomation:
                                 col_idx = len(columns)
                             continue
                         # 检查是否为第三种子序列（数字"1"标记）
-                        elif subsequence_value_str == TRAVEL_CARD_SUBSEQUENCE_MARKER:
+                        elif tag.kind == TRAVEL_CARD:
                             logger.info(f"检测到第三种子序列（差旅转卡信息），开始处理差旅转卡信息填写")
-                            logger.info(f"TRAVEL_CARD_SUBSEQUENCE_MARKER = {TRAVEL_CARD_SUBSEQUENCE_MARKER}")
                             logger.info(f"subsequence_value_str = {subsequence_value_str}")
-                            await self.process_travel_card_subsequence(group_data, i)
+                            await self.process_travel_card_subsequence(group_data, i, segmentation)
                             # 第三种子序列处理完成后，继续处理子序列结束后的其他列
                             if subsequence_end_idx is not None:
                                 col_idx = subsequence_end_idx + 1
@@ -3140,14 +3015,32 @@ class LoginAutomation:
             record_data: 包含登录信息的DataFrame行
         """
         logger.info("开始处理登录流程...")
+        await self.perform_login(record_data)
         
-        # 填写工号
+        # 登录完成后，继续处理当前记录中的其他操作
+        logger.info("登录完成，继续处理当前记录中的其他操作...")
+        await self.process_record_after_login(record_data)
+    
+    async def perform_login(self, record_data: pd.DataFrame):
+        """
+        登录（优先复用已保存的会话，否则填写工号密码并等待输入验证码）
+        
+        Args:
+            record_data: 包含登录信息的DataFrame行
+        """
+        uid_str = ""
         if "登录界面工号" in record_data.columns:
-            uid = record_data["登录界面工号"].iloc[0]
-            uid_str = self.clean_value_string(uid)
-            if uid_str:
-                logger.info(f"填写工号: {uid_str}")
-                await self.fill_input("uid", uid_str)
+            uid_str = self.clean_value_string(record_data["登录界面工号"].iloc[0])
+        
+        # 优先复用已保存的登录会话，跳过验证码登录
+        if uid_str and await self.try_reuse_session(uid_str):
+            logger.info(f"工号 {uid_str} 已处于登录状态，跳过登录步骤")
+            return
+        
+        # 填写工号
+        if uid_str:
+            logger.info(f"填写工号: {uid_str}")
+            await self.fill_input("uid", uid_str)
         
         # 填写密码
         if "登录界面密码" in record_data.columns:
@@ -3157,17 +3050,28 @@ class LoginAutomation:
                 logger.info("填写密码完成")
                 await self.fill_input("pwd", pwd_str)
         
-        # 等待用户输入验证码
-        logger.info("=" * 50)
-        logger.info("密码填写完成，请在下方输入验证码:")
-        logger.info("=" * 50)
-        
-        # 强制刷新输出缓冲区
-        import sys
-        sys.stdout.flush()
-        
+        # 在线程中等待输入，避免阻塞其他worker；同一时间只允许一个worker（分片运行时一个进程）占用控制台
+        label = ""
+        if self.shard_index is not None:
+            label += f"[shard {self.shard_index}] "
+        if self.worker_id:
+            label += f"[worker {self.worker_id}] "
         try:
-            captcha = input("请输入验证码: ")
+            async with self.console_lock, ConsoleFileLock(self.console_lock_file):
+                # 等待用户输入验证码
+                logger.info("=" * 50)
+                logger.info(f"{label}密码填写完成，请在下方输入验证码:")
+                if self.headless:
+                    # 无头模式下看不到浏览器窗口，把验证码截图保存到文件供人工查看
+                    image_path = await self.save_captcha_image(uid_str)
+                    if image_path:
+                        logger.info(f"{label}验证码截图已保存，请打开查看: {os.path.abspath(image_path)}")
+                logger.info("=" * 50)
+                
+                # 强制刷新输出缓冲区
+                import sys
+                sys.stdout.flush()
+                captcha = await asyncio.to_thread(input, f"{label}{CAPTCHA_INPUT_PROMPT}")
             logger.info(f"用户输入验证码: {captcha}")
         except Exception as e:
             logger.error(f"验证码输入失败: {e}")
@@ -3210,11 +3114,106 @@ class LoginAutomation:
         
         # 等待登录完成
         logger.info("登录请求已发送，等待页面跳转...")
-        await asyncio.sleep(LOGIN_WAIT_TIME)
+        await self.wait_point("login", lambda: is_logged_in(self.page))
+        if not await is_logged_in(self.page):
+            raise StepFailed("登录失败：验证码错误或登录未完成")
         
-        # 登录完成后，继续处理当前记录中的其他操作
-        logger.info("登录完成，继续处理当前记录中的其他操作...")
-        await self.process_record_after_login(record_data)
+        # 登录成功后保存会话，供后续序号和后续运行复用
+        if uid_str and SESSION_REUSE_ENABLED:
+            await self.save_login_session(uid_str)
+    
+    async def save_captcha_image(self, uid: str) -> Optional[str]:
+        """
+        保存登录页面验证码图片的截图（无头模式使用），找不到验证码图片时保存整个页面
+        
+        Args:
+            uid: 登录界面工号，用于文件名
+            
+        Returns:
+            截图文件路径，失败时返回None
+        """
+        os.makedirs(CAPTCHA_IMAGE_DIR, exist_ok=True)
+        name = f"captcha_{uid or 'login'}_p{os.getpid()}"
+        if self.worker_id:
+            name += f"_w{self.worker_id}"
+        path = os.path.join(CAPTCHA_IMAGE_DIR, f"{name}.png")
+        try:
+            for selector in CAPTCHA_IMAGE_SELECTORS:
+                image = self.page.locator(selector).first
+                if await image.count() > 0 and await image.is_visible():
+                    await image.screenshot(path=path)
+                    return path
+            logger.warning("未找到验证码图片，保存整个登录页面的截图")
+            await self.page.screenshot(path=path)
+            return path
+        except Exception as e:
+            logger.error(f"保存验证码截图失败: {e}")
+            return None
+    
+    async def try_reuse_session(self, uid: str) -> bool:
+        """
+        尝试复用工号对应的登录会话
+        
+        当前上下文已登录该工号，或保存的会话仍然有效时返回True；
+        会话已被门户判定过期时删除保存的会话并返回False，由调用方重新登录
+        
+        Args:
+            uid: 登录界面工号
+            
+        Returns:
+            是否已处于该工号的登录状态
+        """
+        if not SESSION_REUSE_ENABLED:
+            return False
+        
+        context = self.page.context
+        state = None
+        if self.logged_in_uid != uid:
+            state = self.session_store.load(uid)
+            if state is None:
+                if self.logged_in_uid:
+                    # 切换账号：清除上一个工号的会话，回到登录页面
+                    logger.info(f"切换登录账号: {self.logged_in_uid} -> {uid}")
+                    await context.clear_cookies()
+                    self.logged_in_uid = None
+                    await self.page.goto(TARGET_URL, timeout=10000)
+                return False
+            logger.info(f"找到工号 {uid} 已保存的登录会话，尝试复用")
+            await self.session_store.restore(context, state)
+        
+        try:
+            await self.page.goto(TARGET_URL, timeout=10000)
+            # localStorage只能在对应源的页面中写入，写入后重新加载让页面脚本读到
+            if state is not None and await self.session_store.seed_local_storage(self.page, state):
+                await self.page.reload(timeout=10000)
+        except Exception as e:
+            logger.warning(f"复用会话时打开首页失败: {e}")
+            return False
+        
+        if await is_logged_in(self.page):
+            self.logged_in_uid = uid
+            return True
+        
+        logger.info(f"工号 {uid} 的登录会话已过期，需要重新登录")
+        self.session_store.invalidate(uid)
+        self.logged_in_uid = None
+        return False
+    
+    async def save_login_session(self, uid: str):
+        """
+        确认登录成功后保存当前上下文的会话
+        
+        Args:
+            uid: 登录界面工号
+        """
+        try:
+            if await is_logged_in(self.page):
+                await self.session_store.save(uid, self.page.context)
+                self.logged_in_uid = uid
+            else:
+                logger.warning(f"未检测到工号 {uid} 的登录状态，不保存会话")
+        except Exception as e:
+            logger.warning(f"保存登录会话失败: {e}")
     
     async def process_record_after_login(self, record_data: pd.DataFrame):
         """
@@ -3226,6 +3225,7 @@ class LoginAutomation:
         # 处理当前记录中的所有列（除了登录相关列）
         row = record_data.iloc[0]
         columns = list(record_data.columns)
+        segmentation = segment_record(record_data)
         
         i = 0
         while i < len(columns):
@@ -3281,9 +3281,14 @@ class LoginAutomation:
                 
                 # 特殊处理：子序列开始列
                 if col == SUBSEQUENCE_START_COL:
-                    if value_str == TRAVELER_SUBSEQUENCE_MARKER:
+                    if segmentation.tags[0].kind == TRAVEL_CARD:
+                        logger.info(f"检测到第三种子序列（差旅转卡信息），开始处理差旅转卡信息填写")
+                        await self.process_travel_card_subsequence(record_data, 0, segmentation)
+                        i = len(columns)
+                        break
+                    elif value_str == TRAVELER_SUBSEQUENCE_MARKER:
                         logger.info(f"检测到第二种子序列（出差人信息），开始处理出差人信息填写")
-                        await self.process_traveler_subsequence(record_data, 0)  # 从第1行开始
+                        await self.process_traveler_subsequence(record_data, 0, segmentation)  # 从第1行开始
                         # 跳过当前行的其余列，因为已经处理了
                         i = len(columns)  # 跳到行末
                         break  # 跳出while循环
@@ -3333,9 +3338,11 @@ class LoginAutomation:
                 if pd.notna(value) and value != "":
                     await self.process_cell(col, value)
         
+        await self.flush_fill_batch()
         logger.info(f"序号 {sequence_num} 的报销记录处理完成")
     
-    async def process_traveler_subsequence(self, group_data: pd.DataFrame, start_row_idx: int):
+    async def process_traveler_subsequence(self, group_data: pd.DataFrame, start_row_idx: int,
+                                           segmentation: Optional[Segmentation] = None):
         """
         处理第二种子序列逻辑：填写出差人信息到网页表格
         采用类似第一种子序列的方式，自动为字段名添加后缀并查询标题-ID映射
@@ -3343,9 +3350,16 @@ class LoginAutomation:
         Args:
             group_data: 同一序号下的所有数据行
             start_row_idx: 子序列开始的行索引
+            segmentation: group_data的子序列分段结果（None时现场计算）
         """
         logger.info(f"开始处理出差人信息子序列，从第 {start_row_idx + 1} 行开始")
         
+        if segmentation is None:
+            segmentation = segment_record(group_data)
+        # 子序列的行范围由分段结果给出（包含结束标记所在行）
+        segment = segmentation.tags[start_row_idx].segment
+        end_row_idx = segment.end_row if segment is not None else len(group_data) - 1
+        
         # 从开始行开始，逐行处理子序列
         # 重置traveler_index，确保从0开始
         traveler_index = 0  # 出差人索引，用于生成后缀
@@ -3354,34 +3368,17 @@ class LoginAutomation:
         # 强制重置traveler_index，确保从0开始
         self.traveler_index = 0
         
-        for row_idx in range(start_row_idx, len(group_data)):
+        for row_idx in range(start_row_idx, end_row_idx + 1):
             row = group_data.iloc[row_idx]
+            tag = segmentation.tags[row_idx]
             
-            # 检查是否为子序列结束（但先处理当前行的信息，支持自动重命名）
-            is_end_marker = False
-            for end_col in group_data.columns:
-                if end_col.startswith(SUBSEQUENCE_END_COL):
-                    if pd.notna(row[end_col]) and self.clean_value_string(row[end_col]) == TRAVELER_SUBSEQUENCE_MARKER:
-                        is_end_marker = True
-                        logger.info(f"检测到子序列结束标记，在第 {row_idx + 1} 行的列 {end_col}")
-                        break
-            
-            if is_end_marker:
+            if tag.is_end:
                 logger.info(f"检测到子序列结束标记，在第 {row_idx + 1} 行")
-                # 如果是子序列结束标记所在行，先处理当前行的出差人信息，然后结束
+                # 结束标记所在行的出差人信息同样需要处理
                 logger.info(f"处理子序列结束标记所在行的出差人信息")
-                should_break = True
-            else:
-                should_break = False
             
             # 检查当前行是否有有效的出差人信息
-            has_traveler_info = False
-            for field in TRAVELER_FIELDS.keys():
-                if field in group_data.columns and pd.notna(row[field]) and row[field] != "":
-                    has_traveler_info = True
-                    break
-            
-            if not has_traveler_info:
+            if not tag.has_traveler:
                 logger.info(f"第 {row_idx + 1} 行没有有效的出差人信息，跳过")
                 continue
             
@@ -3413,14 +3410,15 @@ class LoginAutomation:
                     # 根据字段类型选择填写方式
                     if field == "人员类型":
                         # 人员类型使用下拉选择
-                        await self.select_dropdown(input_id, value)
+                        await self.select_dropdown(input_id, value,
+                                                   field_config=action_plan.dropdown_config(field, input_id))
                         logger.info(f"选择{field_with_suffix}: {value}")
                     elif field == "工号":
                         # 工号字段特殊处理：填写后等待一下，让JavaScript事件完成
                         await self.fill_input(input_id, value, title=field_with_suffix)
                         logger.info(f"填写{field_with_suffix}: {value}")
                         # 等待JavaScript事件完成
-                        await asyncio.sleep(2)
+                        await self.wait_point("work_id_events", self.page_scripts_settled())
                         logger.info(f"工号填写完成，等待JavaScript事件处理")
                         
                         # 重新填写姓名，确保不被JavaScript事件清空
@@ -3471,28 +3469,18 @@ class LoginAutomation:
                         logger.warning(f"未找到字段 '{field_with_suffix}' 对应的ID映射")
                         continue
                     
-                    # 根据字段类型选择填写方式
-                    # 检查是否为下拉字段（通过字段名或ID模式）
-                    is_dropdown = False
-                    if col in DROPDOWN_FIELDS:
-                        is_dropdown = True
-                    elif col == "省份":  # 省份字段特殊处理
-                        is_dropdown = True
-                    elif input_id and "sf" in input_id:  # 省份字段的ID模式
-                        is_dropdown = True
-                    elif input_id and "hsf" in input_id:  # hsf字段的ID模式
-                        is_dropdown = True
-                    elif input_id and "jtf" in input_id:  # jtf字段的ID模式
-                        is_dropdown = True
-                    
-                    # 检查是否为日期字段
-                    is_date = False
-                    if (input_id and ("date" in input_id.lower() or "startdate" in input_id.lower() or "enddate" in input_id.lower() or 
-                                     input_id.endswith("_startdate") or input_id.endswith("_enddate") or
-                                     "temp-startdate" in input_id or "temp-enddate" in input_id or
-                                     input_id == "formWF_YB6_3492_yc-chr_start1_0" or input_id == "formWF_YB6_3492_yc-chr_end1_0" or
-                                     "start" in input_id or "end" in input_id)):
-                        is_date = True
+                    # 根据页面上元素的实际类型选择填写方式，元素暂时不在页面上时按字段名和ID判断
+                    field_info = await self.field_classifier.classify(self.element_index(), input_id)
+                    if field_info is not None:
+                        is_dropdown = field_info.kind == field_classifier.SELECT
+                        # 只读输入框可能是未绑定日历控件的日期框，仍按ID判断
+                        is_date = (field_info.kind == field_classifier.DATE or
+                                   (field_info.kind == field_classifier.READONLY and
+                                    action_plan.is_date_element(input_id)))
+                    else:
+                        is_dropdown = (col in DROPDOWN_FIELDS or col == "省份" or
+                                       any(pattern in input_id for pattern in ("sf", "hsf", "jtf")))
+                        is_date = action_plan.is_date_element(input_id)
                     
                     if is_date:
                         # 日期字段使用日历控件
@@ -3506,7 +3494,8 @@ class LoginAutomation:
                             logger.info(f"填写{field_with_suffix}: {value_str}")
                     elif is_dropdown:
                         # 下拉选择
-                        await self.select_dropdown(input_id, value_str)
+                        await self.select_dropdown(input_id, value_str,
+                                                   field_config=action_plan.dropdown_config(col, input_id))
                         logger.info(f"选择{field_with_suffix}: {value_str}")
                     else:
                         # 普通输入框
@@ -3514,17 +3503,14 @@ class LoginAutomation:
                         logger.info(f"填写{field_with_suffix}: {value_str}")
             
             traveler_index += 1
-            
-            # 如果检测到结束标记，处理完当前行后退出
-            if should_break:
-                break
         
         # 所有字段填写完成
         logger.info(f"所有字段填写完成")
         
         logger.info(f"出差人信息填写完成，共处理了 {traveler_index} 个出差人")
     
-    async def process_travel_card_subsequence(self, group_data: pd.DataFrame, start_row_idx: int):
+    async def process_travel_card_subsequence(self, group_data: pd.DataFrame, start_row_idx: int,
+                                              segmentation: Optional[Segmentation] = None):
         """
         处理第三种子序列逻辑：填写差旅转卡信息
         采用类似第二种子序列的方式，自动为字段名添加后缀并查询标题-ID映射
@@ -3532,42 +3518,32 @@ class LoginAutomation:
         Args:
             group_data: 同一序号下的所有数据行
             start_row_idx: 子序列开始的行索引
+            segmentation: group_data的子序列分段结果（None时现场计算）
         """
         logger.info(f"开始处理差旅转卡信息子序列，从第 {start_row_idx + 1} 行开始")
         
+        if segmentation is None:
+            segmentation = segment_record(group_data)
+        # 子序列的行范围由分段结果给出（包含结束标记所在行）
+        segment = segmentation.tags[start_row_idx].segment
+        end_row_idx = segment.end_row if segment is not None else len(group_data) - 1
+        
         # 从开始行开始，逐行处理子序列
         # 重置travel_card_index，确保从0开始
         travel_card_index = 0  # 差旅转卡索引，用于生成后缀
         logger.info(f"重置travel_card_index为0，开始处理第三种子序列")
         
-        for row_idx in range(start_row_idx, len(group_data)):
+        for row_idx in range(start_row_idx, end_row_idx + 1):
             row = group_data.iloc[row_idx]
+            tag = segmentation.tags[row_idx]
             
-            # 检查是否为子序列结束（但先处理当前行的信息，支持自动重命名）
-            is_end_marker = False
-            for end_col in group_data.columns:
-                if end_col.startswith(SUBSEQUENCE_END_COL):
-                    if pd.notna(row[end_col]) and self.clean_value_string(row[end_col]) == TRAVEL_CARD_SUBSEQUENCE_MARKER:
-                        is_end_marker = True
-                        logger.info(f"检测到子序列结束标记，在第 {row_idx + 1} 行的列 {end_col}")
-                        break
-            
-            if is_end_marker:
+            if tag.is_end:
                 logger.info(f"检测到子序列结束标记，在第 {row_idx + 1} 行")
-                # 如果是子序列结束标记所在行，先处理当前行的差旅转卡信息，然后结束
+                # 结束标记所在行的差旅转卡信息同样需要处理
                 logger.info(f"处理子序列结束标记所在行的差旅转卡信息")
-                should_break = True
-            else:
-                should_break = False
             
             # 检查当前行是否有有效的差旅转卡信息
-            has_travel_card_info = False
-            for field in TRAVEL_CARD_FIELDS.keys():
-                if field in group_data.columns and pd.notna(row[field]) and row[field] != "":
-                    has_travel_card_info = True
-                    break
-            
-            if not has_travel_card_info:
+            if not tag.has_travel_card:
                 logger.info(f"第 {row_idx + 1} 行没有有效的差旅转卡信息，跳过")
                 continue
             
@@ -3581,6 +3557,8 @@ class LoginAutomation:
             # 只处理差旅转卡相关的字段，不处理其他字段（如按钮等）
             # 调整字段处理顺序：先填写工号，再选择银行卡，最后填写金额
             field_order = ["差旅转卡工号", "差旅卡号尾号", "个人差旅金额"]
+            travel_work_id = None
+            travel_profile = None  # 银行卡缓存中该工号的信息
             
             for field in field_order:
                 if field in TRAVEL_CARD_FIELDS.keys() and field in group_data.columns and pd.notna(row[field]) and row[field] != "":
@@ -3601,15 +3579,26 @@ class LoginAutomation:
                         # 差旅转卡工号字段特殊处理：填写后等待一下，让JavaScript事件完成
                         await self.fill_input(input_id, value, title=field_with_suffix)
                         logger.info(f"填写{field_with_suffix}: {value}")
-                        # 等待JavaScript事件完成
-                        await asyncio.sleep(2)
+                        travel_work_id = value
+                        travel_profile = self.bank_cards.get(value)
+                        # 等待JavaScript事件完成；缓存表明该工号会出现弹窗时，弹窗出现即继续
+                        ready = self.page_scripts_settled()
+                        if travel_profile is not None and travel_profile.dialog:
+                            watcher = await self.bank_card_dialog()
+                            ready = any_of(bank_card_dialog.dialog_opened(watcher), ready)
+                        await self.wait_point("work_id_events", ready)
                         logger.info(f"差旅转卡工号填写完成，等待JavaScript事件处理")
                     elif field == "差旅卡号尾号":
                         # 差旅卡号尾号字段特殊处理：使用银行卡选择功能
                         if value.startswith("*"):
                             card_tail = value[1:]  # 去掉*前缀
                             logger.info(f"检测到银行卡尾号选择: {card_tail}")
-                            await self.select_card_by_number(card_tail)
+                            # 缓存表明该工号只有一张卡且页面上确实没有弹窗时，不再查找卡号
+                            if (travel_profile is not None and travel_profile.predicts_no_dialog and
+                                    not (await self.bank_card_dialog()).is_open()):
+                                logger.info(f"工号 {travel_work_id} 只有一张卡（银行卡缓存），跳过卡号选择")
+                                continue
+                            await self.select_card_by_number(card_tail, work_id=travel_work_id)
                             logger.info(f"选择银行卡尾号: {card_tail}")
                         else:
                             logger.warning(f"银行卡尾号格式错误，期望格式: *数字，实际: {value}")
@@ -3619,73 +3608,54 @@ class LoginAutomation:
                         logger.info(f"填写{field_with_suffix}: {value}")
             
             travel_card_index += 1
-            
-            # 如果检测到结束标记，处理完当前行后退出
-            if should_break:
-                break
         
         # 所有字段填写完成
         logger.info(f"所有字段填写完成")
         
         logger.info(f"差旅转卡信息填写完成，共处理了 {travel_card_index} 个记录")
     
-    async def process_remaining_operations(self, group_data: pd.DataFrame):
+    async def process_remaining_operations(self, group_data: pd.DataFrame,
+                                           segmentation: Optional[Segmentation] = None):
         """
         处理第二种子序列完成后的剩余操作字段
         
         Args:
             group_data: 同一序号下的所有数据行
+            segmentation: group_data的子序列分段结果（None时现场计算）
         """
         logger.info("开始处理第二种子序列完成后的剩余操作字段")
         
+        if segmentation is None:
+            segmentation = segment_record(group_data)
+        
         # 将DataFrame转换为list以便遍历
         rows = group_data.to_dict('records')
         columns = list(group_data.columns)
         
-        i = 0
-        while i < len(rows):
-            row = rows[i]
+        # 需要跳过的列只计算一次：
+        # 序号列、处理进度列、子序列标记列、出差人信息字段、登录相关字段，
+        # 以及已经在第二种、第三种子序列中处理过的字段
+        skipped_cols = {SEQUENCE_COL, "处理进度"} | segmentation.marker_cols | set(TRAVELER_FIELDS.keys())
+        skipped_cols |= {"登录界面工号", "登录界面密码", "登录按钮", "网上预约报账按钮", "等待", "申请报销单按钮",
+                         "已阅读并同意按钮", "选择业务大类", "报销项目号", "附件张数", "备注", "特殊事项说明",
+                         "下一步按钮1", "等待.1"}
+        skipped_cols |= {"省份", "出差地点", "起", "迄", "飞机票", "住宿费", "是否安排伙食", "是否安排交通"}
+        skipped_cols |= {"差旅转卡工号", "差旅卡号尾号", "个人差旅金额"}
+        operation_cols = [col for col in columns if col not in skipped_cols]
+        
+        for i, row in enumerate(rows):
+            if not segmentation.tags[i].has_data:
+                continue
             current_sequence = row.get(SEQUENCE_COL, None)
             logger.info(f"处理第 {i+1} 行数据的剩余操作，序号: {current_sequence}")
             
             # 处理当前行的所有列
-            col_idx = 0
-            while col_idx < len(columns):
-                col = columns[col_idx]
-                
-                # 跳过序号列、处理进度列、子序列标记列和出差人信息字段
-                if (col == SEQUENCE_COL or col == "处理进度" or 
-                    col.startswith(SUBSEQUENCE_START_COL) or 
-                    col.startswith(SUBSEQUENCE_END_COL) or
-                    col in TRAVELER_FIELDS.keys()):
-                    col_idx += 1
-                    continue
-                
-                # 跳过登录相关字段
-                if col in ["登录界面工号", "登录界面密码", "登录按钮", "网上预约报账按钮", "等待", "申请报销单按钮", "已阅读并同意按钮", "选择业务大类", "报销项目号", "附件张数", "备注", "特殊事项说明", "下一步按钮1", "等待.1"]:
-                    col_idx += 1
-                    continue
-                
-                # 跳过已经在第二种子序列中处理过的字段
-                if col in ["省份", "出差地点", "起", "迄", "飞机票", "住宿费", "是否安排伙食", "是否安排交通"]:
-                    col_idx += 1
-                    continue
-                
-                # 跳过已经在第三种子序列中处理过的字段
-                if col in ["差旅转卡工号", "差旅卡号尾号", "个人差旅金额"]:
-                    col_idx += 1
-                    continue
-                
+            for col in operation_cols:
                 value = row[col]
                 if pd.notna(value) and value != "":
                     value_str = self.clean_value_string(value)
                     logger.info(f"处理剩余操作: {col} = {value_str}")
                     await self.process_cell(col, value_str)
-                
-                col_idx += 1
-            
-            # 移动到下一行
-            i += 1
         
         logger.info("剩余操作字段处理完成")
     
@@ -3698,29 +3668,25 @@ class LoginAutomation:
         """
         logger.info(f"处理子序列逻辑，共{len(record_data)}行")
         
+        # 一次遍历完成子序列分段：每行所属子序列、类型和索引
+        segmentation = segment_record(record_data)
+        columns = list(record_data.columns)
+        
         # 按行处理，从左到右
-        for row_idx, row in record_data.iterrows():
+        for row_idx, (_, row) in enumerate(record_data.iterrows()):
             logger.info(f"处理第{row_idx + 1}行数据")
+            tag = segmentation.tags[row_idx]
             
-            # 首先检查当前行是否包含第二种子序列开始标记
-            traveler_subsequence_detected = False
-            for col in record_data.columns:
-                if col.startswith(SUBSEQUENCE_START_COL):
-                    subsequence_value = row[col]
-                    if pd.notna(subsequence_value) and subsequence_value != "":
-                        subsequence_value_str = self.clean_value_string(subsequence_value)
-                        if subsequence_value_str == TRAVELER_SUBSEQUENCE_MARKER:
-                            logger.info(f"检测到第二种子序列（出差人信息），列: {col}，开始处理出差人信息填写")
-                            await self.process_traveler_subsequence(record_data, row_idx)
-                            traveler_subsequence_detected = True
-                            break
-            
-            # 如果检测到第二种子序列，跳过当前行的逐列处理
-            if traveler_subsequence_detected:
+            # 第二种、第三种子序列从开始行整体处理，跳过当前行的逐列处理
+            if tag.is_start and tag.kind == TRAVELER:
+                logger.info(f"检测到第二种子序列（出差人信息），开始处理出差人信息填写")
+                await self.process_traveler_subsequence(record_data, row_idx, segmentation)
+                continue
+            if tag.is_start and tag.kind == TRAVEL_CARD:
+                logger.info(f"检测到第三种子序列（差旅转卡信息），开始处理差旅转卡信息填写")
+                await self.process_travel_card_subsequence(record_data, row_idx, segmentation)
                 continue
             
-            # 获取列名列表
-            columns = list(record_data.columns)
             i = 0
             
             # 从左到右处理每一列
@@ -3789,69 +3755,9 @@ class LoginAutomation:
                             i += 1
                             continue
                     
-                    # 处理普通列（在子序列中，需要添加序号后缀）
-                    # 检查当前行是否是子序列中的行
-                    is_in_subsequence = False
-                    subsequence_index = 0
-                    current_subsequence_num = 0
-                    
-                    # 检查当前行是否在子序列范围内
-                    # 首先找到所有子序列的开始和结束位置
-                    subsequence_ranges = []
-                    
-                    # 找到所有子序列开始列
-                    start_cols = [c for c in record_data.columns if c.startswith(SUBSEQUENCE_START_COL)]
-                    end_cols = [c for c in record_data.columns if c.startswith(SUBSEQUENCE_END_COL)]
-                    
-                    # 为每个子序列找到开始和结束位置
-                    for seq_idx, start_col in enumerate(start_cols):
-                        start_row_idx = None
-                        end_row_idx = None
-                        
-                        # 找到子序列开始的行
-                        for idx, seq_row in record_data.iterrows():
-                            if pd.notna(seq_row[start_col]) and seq_row[start_col] != "":
-                                start_row_idx = idx
-                                break
-                        
-                        # 找到对应的子序列结束的行
-                        if seq_idx < len(end_cols):
-                            end_col = end_cols[seq_idx]
-                            for idx, seq_row in record_data.iterrows():
-                                if pd.notna(seq_row[end_col]) and seq_row[end_col] != "":
-                                    end_row_idx = idx
-                                    break
-                        
-                        if start_row_idx is not None and end_row_idx is not None:
-                            subsequence_ranges.append((start_row_idx, end_row_idx, seq_idx))
-                    
-                    # 检查当前行属于哪个子序列
-                    for start_row_idx, end_row_idx, subsequence_num in subsequence_ranges:
-                        if start_row_idx <= row_idx <= end_row_idx:
-                            is_in_subsequence = True
-                            current_subsequence_num = subsequence_num
-                            # 计算在当前子序列中的索引（从0开始）
-                            subsequence_index = 0
-                            # 从子序列开始行开始，计算当前行是第几个有数据的行
-                            for check_row_idx in range(start_row_idx, row_idx + 1):
-                                check_row = record_data.iloc[check_row_idx]
-                                # 检查这一行是否有有效数据（除了子序列标记列）
-                                has_data = False
-                                for check_col in record_data.columns:
-                                    if (check_col not in [SEQUENCE_COL, "处理进度"] and 
-                                        not check_col.startswith(SUBSEQUENCE_START_COL) and 
-                                        not check_col.startswith(SUBSEQUENCE_END_COL) and
-                                        pd.notna(check_row[check_col]) and check_row[check_col] != ""):
-                                        has_data = True
-                                        break
-                                if has_data:
-                                    subsequence_index += 1
-                            # 减1是因为我们要从0开始计数
-                            subsequence_index = max(0, subsequence_index - 1)
-                            logger.info(f"当前行 {row_idx} 属于子序列 {subsequence_num}，索引: {subsequence_index}")
-                            break
-                    
-                    if is_in_subsequence:
+                    # 当前行所属的子序列和索引由分段结果给出
+                    if tag.segment is not None:
+                        logger.info(f"当前行 {row_idx} 属于子序列 {tag.segment.segment_id}，索引: {tag.index}")
                         # 在子序列中，直接使用原始字段名（第一种子序列处理方式）
                         logger.info(f"处理子序列操作: {col} = {value_str}")
                         await self.process_cell(col, value_str)
@@ -3862,52 +3768,354 @@ class LoginAutomation:
                 
                 i += 1
     
-    async def run_automation(self, target_url: str = TARGET_URL):
+    def spawn_worker(self, worker_id: int, page) -> "LoginAutomation":
+        """
+        派生一个并行worker：共享已加载的数据和映射，但拥有独立的页面和记录状态
+        
+        Args:
+            worker_id: worker编号（从1开始）
+            page: 该worker专属浏览器上下文中的页面
+            
+        Returns:
+            新的LoginAutomation实例
+        """
+        worker = LoginAutomation(self.excel_file, self.mapping_file, self.sheet_name)
+        worker.title_id_mapping = self.title_id_mapping
+        worker.reimbursement_data = self.reimbursement_data
+        worker.browser = self.browser
+        worker.page = page
+        worker.worker_id = worker_id
+        worker.console_lock = self.console_lock
+        worker.shard_index = self.shard_index
+        worker.console_lock_file = self.console_lock_file
+        worker.print_lock = self.print_lock
+        worker.session_store = self.session_store
+        worker.action_plan = self.action_plan
+        worker.cell_actions = self.cell_actions
+        worker.wait_policy = self.wait_policy
+        worker.print_mode = self.print_mode
+        worker.input_worker = self.input_worker
+        worker.journal = self.journal
+        worker.result_writeback = self.result_writeback
+        worker.field_classifier = self.field_classifier
+        worker.bank_cards = self.bank_cards
+        worker.strategy_stats = self.strategy_stats
+        return worker
+    
+    def prepare_action_plan(self) -> Optional[ActionPlan]:
+        """
+        加载或编译操作计划（需要先调用load_data）
+        
+        Returns:
+            操作计划，编译失败时返回None（运行时逐个单元格分类）
+        """
+        try:
+            self.action_plan = load_or_compile_plan(self.excel_file, self.mapping_file, self.sheet_name,
+                                                    self.reimbursement_data, self.title_id_mapping)
+            if self.action_plan is None:
+                logger.info("流式读取模式下没有缓存的操作计划，运行时逐个单元格分类")
+                self.cell_actions = {}
+                return None
+            self.cell_actions = self.action_plan.cell_actions()
+        except Exception as e:
+            logger.warning(f"编译操作计划失败，将在运行时逐个单元格分类: {e}")
+            self.action_plan = None
+            self.cell_actions = {}
+        return self.action_plan
+    
+    def run_preflight(self, sequences: Optional[List[str]] = None) -> bool:
+        """
+        启动前检查工作簿（需要先调用load_data），所有问题一次性写入日志
+        
+        Args:
+            sequences: 只检查这些序号（None表示全部）
+            
+        Returns:
+            是否没有发现问题
+        """
+        if self.streaming:
+            logger.info("流式读取模式下跳过启动前检查（可先用 --validate 单独检查）")
+            return True
+        data = self.reimbursement_data
+        if sequences is not None:
+            data = data[data[SEQUENCE_COL].map(self.clean_value_string).isin(set(sequences))]
+        import preflight
+        problems = preflight.validate_frame(data, self.title_id_mapping)
+        preflight.log_problems(problems)
+        return not problems
+    
+    async def launch_browser(self, playwright):
+        """
+        根据配置启动浏览器
+        
+        Args:
+            playwright: async_playwright()返回的Playwright对象
+        """
+        if BROWSER_TYPE == "chromium":
+            self.browser = await playwright.chromium.launch(headless=self.headless)
+        elif BROWSER_TYPE == "firefox":
+            self.browser = await playwright.firefox.launch(headless=self.headless)
+        elif BROWSER_TYPE == "webkit":
+            self.browser = await playwright.webkit.launch(headless=self.headless)
+        else:
+            raise ValueError(f"不支持的浏览器类型: {BROWSER_TYPE}")
+        if self.headless and self.print_mode != "pdf":
+            logger.warning("无头模式下无法处理Chrome打印对话框，打印确认单请使用 --print-mode pdf")
+        return self.browser
+    
+    async def open_start_page(self, target_url: str = TARGET_URL):
+        """
+        在当前页面打开目标网址并等待页面加载
+        
+        Args:
+            target_url: 目标网页URL
+        """
+        # 设置页面默认超时时间为3秒
+        self.page.set_default_timeout(3000)
+        
+        # 在第一次导航前开始跟踪请求和frame变化，点击时发出的请求也能被统计到
+        self.network()
+        self.element_index()
+        
+        # 导航到目标页面
+        await self.page.goto(target_url, timeout=10000)
+        logger.info(f"成功导航到页面: {target_url}")
+        
+        # 等待页面加载（登录表单或已登录页面的系统链接出现）
+        await self.wait_point("page_load", selectors_visible(self.page, ["#uid", "div.syslink"]))
+    
+    async def process_sequence(self, sequence_num, group_data: pd.DataFrame) -> Dict[str, Any]:
+        """
+        处理一个序号组，并返回处理结果
+        
+        Args:
+            sequence_num: 序号
+            group_data: 该序号下的所有数据行
+            
+        Returns:
+            包含序号、worker、状态、耗时和错误信息的结果字典
+        """
+        sequence_str = self.clean_value_string(sequence_num)
+        prefix = f"[worker {self.worker_id}] " if self.worker_id else ""
+        logger.info(f"{prefix}开始处理序号 {sequence_str} 的报销记录")
+        
+        # 重置每条记录的状态，确保每个序号使用自己的值
+        self.current_sequence = sequence_num
+        self.current_group = group_data
+        self.current_project_number = None
+        self.current_amount = None
+        self.traveler_index = 0
+        self.fill_batch = []
+        self.pending_card_check = None
+        self.current_step = ""
+        self.submitted_step = ""
+        self.current_pdf_path = None
+        self.retry_count = 0
+        digest = group_digest(group_data)
+        self.journal.append("sequence_started", sequence=sequence_str, worker=self.worker_id, digest=digest)
+        
+        started = time.perf_counter()
+        status = "success"
+        error = ""
+        failed_step = ""
+        try:
+            # 处理子序列逻辑；必需的步骤失败时抛出StepFailed，不再继续后面的操作
+            await self.process_sequence_with_subsequences(sequence_num, group_data)
+            await self.flush_fill_batch()
+            # 最后一个操作是按缓存跳过弹窗等待的工号时，在记录结束前核对完
+            await self.resolve_pending_card_check()
+        except Exception as e:
+            status = "failed"
+            error = str(e)
+            failed_step = self.current_step
+            logger.error(f"{prefix}序号 {sequence_str} 处理失败（步骤 {failed_step or '无'}）: {e}")
+        finally:
+            # 失败时页面状态未知，不能把未核对的工号带到下一条记录
+            self.pending_card_check = None
+        
+        result = {
+            "sequence": sequence_str,
+            "worker": self.worker_id,
+            "status": status,
+            "duration": round(time.perf_counter() - started, 2),
+            "error": error,
+            "retries": self.retry_count,
+            "pdf_path": self.current_pdf_path,
+            "last_step": self.current_step,
+            "failed_step": failed_step,
+            "submitted": bool(self.submitted_step),
+            "digest": digest,
+        }
+        self.run_results.append(result)
+        self.journal.append("sequence_finished", **result)
+        if self.result_writeback is not None:
+            self.result_writeback.record(result)
+        
+        # 处理完一条记录后等待一下
+        await asyncio.sleep(RECORD_PROCESS_WAIT)
+        return result
+    
+    def write_run_report(self, report_file: str, sequences: Optional[List[str]] = None):
+        """
+        将本次运行的处理结果写入JSON报告文件
+        
+        Args:
+            report_file: 报告文件路径
+            sequences: 本次运行负责的序号列表（None表示全部序号）
+        """
+        report = {
+            "pid": os.getpid(),
+            "sequences": sequences,
+            "results": self.run_results,
+            "wait_points": self.wait_policy.summary(),
+            "resource_filter": self.resource_filter.summary() if self.resource_filter else None,
+            "finished_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"运行报告已写入: {report_file}")
+    
+    def select_groups(self, sequences: Optional[List[str]] = None, resume: bool = False):
+        """
+        确定本次运行要处理的序号组
+        
+        Args:
+            sequences: 只处理这些序号（None表示全部序号）
+            resume: 跳过运行日志中已经处理成功的序号，以及处理中断或提交后失败、需要人工核对的序号
+            
+        Returns:
+            (序号, 数据)列表；流式读取模式下为按工作表顺序逐组读取的迭代器
+        """
+        wanted = set(sequences) if sequences is not None else None
+        state = self.journal.resume_state() if resume else {}
+        skipped = {}
+        
+        def keep(num, group) -> bool:
+            sequence = self.clean_value_string(num)
+            reason = skip_reason(state, sequence, group_digest(group)) if state else None
+            if reason is None:
+                return True
+            skipped[sequence] = reason
+            if self.streaming:
+                # 流式读取时逐组输出，不在开始时汇总
+                log_review_needed({sequence: reason})
+            return False
+        
+        if self.streaming:
+            groups = iter_sequence_groups(self.excel_file, self.sheet_name, wanted)
+            return ((num, group) for num, group in groups if keep(num, group))
+        
+        grouped_data = list(self.reimbursement_data.groupby(SEQUENCE_COL))
+        if wanted is not None:
+            grouped_data = [(num, group) for num, group in grouped_data
+                            if self.clean_value_string(num) in wanted]
+            logger.info(f"分片模式：本进程负责 {len(grouped_data)} 个序号: {', '.join(sequences)}")
+        if resume:
+            grouped_data = [(num, group) for num, group in grouped_data if keep(num, group)]
+            completed = sum(1 for reason in skipped.values() if reason == COMPLETED)
+            logger.info(f"续跑模式：跳过已成功的 {completed} 个序号，剩余 {len(grouped_data)} 个序号待处理")
+            log_review_needed(skipped)
+        return grouped_data
+    
+    async def prepare_run_data(self, sequences: Optional[List[str]], startup: StartupTimer) -> bool:
+        """
+        加载数据、准备操作计划并做启动前检查（与浏览器启动并发进行）
+        
+        Args:
+            sequences: 只处理这些序号（None表示全部）
+            startup: 启动耗时记录
+            
+        Returns:
+            启动前检查是否通过
+        """
+        await self.load_data()
+        startup.mark("加载标题-ID映射和报销信息")
+        await asyncio.to_thread(self.prepare_action_plan)
+        startup.mark("准备操作计划")
+        if not self.preflight:
+            return True
+        passed = await asyncio.to_thread(self.run_preflight, sequences)
+        startup.mark("启动前检查")
+        return passed
+    
+    async def start_browser(self, playwright, target_url: str, workers: int, startup: StartupTimer):
+        """
+        启动浏览器；单worker时同时打开起始页面（多worker由worker池为每个上下文打开）
+        
+        Args:
+            playwright: async_playwright()返回的Playwright对象
+            target_url: 目标网页URL
+            workers: 并行worker数量
+            startup: 启动耗时记录
+        """
+        await self.launch_browser(playwright)
+        startup.mark("启动浏览器")
+        if workers > 1:
+            return
+        self.page = await self.browser.new_page()
+        if self.resource_filter:
+            await self.resource_filter.install(self.page)
+        await self.open_start_page(target_url)
+        startup.mark("打开起始页面")
+    
+    async def run_automation(self, target_url: str = TARGET_URL, workers: int = WORKER_COUNT,
+                             sequences: Optional[List[str]] = None, wait_for_close: bool = True,
+                             resume: bool = False):
         """
         运行自动化程序
         
         Args:
             target_url: 目标网页URL
+            workers: 并行worker数量，大于1时每个序号组分发到独立的浏览器上下文中处理
+            sequences: 只处理这些序号（None表示处理全部序号），用于多进程分片
+            wait_for_close: 处理完成后是否等待用户按回车再关闭浏览器
+            resume: 跳过运行日志中已经处理成功的序号（中途崩溃后重新运行）
         """
+        startup = StartupTimer()
+        data_ready = None
         try:
-            # 加载数据
-            await self.load_data()
-            
-            # 启动浏览器
-            async with async_playwright() as p:
-                if BROWSER_TYPE == "chromium":
-                    self.browser = await p.chromium.launch(headless=HEADLESS)
-                elif BROWSER_TYPE == "firefox":
-                    self.browser = await p.firefox.launch(headless=HEADLESS)
-                elif BROWSER_TYPE == "webkit":
-                    self.browser = await p.webkit.launch(headless=HEADLESS)
-                else:
-                    raise ValueError(f"不支持的浏览器类型: {BROWSER_TYPE}")
-                
-                self.page = await self.browser.new_page()
-                # 设置页面默认超时时间为3秒
-                self.page.set_default_timeout(3000)
-                
-                # 导航到目标页面
-                await self.page.goto(target_url, timeout=10000)
-                logger.info(f"成功导航到页面: {target_url}")
-                
-                # 等待页面加载
-                await asyncio.sleep(PAGE_LOAD_WAIT)
+            if RESOURCE_FILTER_ENABLED:
+                self.resource_filter = ResourceFilter()
+            
+            # 数据加载（及启动前检查）与浏览器启动、打开起始页面同时进行
+            data_ready = asyncio.create_task(self.prepare_run_data(sequences, startup))
+            async with playwright_api.async_playwright() as p:
+                startup.mark("启动Playwright")
+                browser_ready = asyncio.create_task(self.start_browser(p, target_url, workers, startup))
+                results = await asyncio.gather(data_ready, browser_ready, return_exceptions=True)
+                for result in results:
+                    if isinstance(result, BaseException):
+                        raise result
+                
+                # 工作簿有问题时不处理任何序号，避免处理到一半才发现
+                if not results[0]:
+                    logger.error("启动前检查未通过，请修正工作簿或标题-ID映射后重新运行（可用 --validate 单独检查）")
+                    return
                 
                 # 按序号分组处理报销记录
-                grouped_data = self.reimbursement_data.groupby(SEQUENCE_COL)
+                grouped_data = self.select_groups(sequences, resume)
+                self.journal.append("run_started", workers=workers, resume=resume,
+                                    sequences=[self.clean_value_string(num) for num, _ in grouped_data]
+                                    if isinstance(grouped_data, list) else sequences)
                 
-                for sequence_num, group_data in grouped_data:
-                    logger.info(f"开始处理序号 {sequence_num} 的报销记录")
-                    
-                    # 处理子序列逻辑
-                    await self.process_sequence_with_subsequences(sequence_num, group_data)
-                    
-                    # 处理完一条记录后等待一下
-                    await asyncio.sleep(RECORD_PROCESS_WAIT)
+                startup.log("开始处理第一个序号")
+                
+                if workers > 1:
+                    self.run_results = await run_worker_pool(self, self.browser, grouped_data, workers, target_url)
+                else:
+                    for sequence_num, group_data in grouped_data:
+                        await self.process_sequence(sequence_num, group_data)
                 
                 logger.info("所有报销记录处理完成")
+                self.wait_policy.log_summary()
+                if self.network_tracker is not None:
+                    self.network_tracker.log_stats()
+                if self.resource_filter:
+                    self.resource_filter.log_summary()
+                self.strategy_stats.log_summary()
+                
+                if not wait_for_close:
+                    return
                 
                 # 等待用户手动关闭浏览器
                 logger.info("=" * 50)
@@ -3930,11 +4138,96 @@ class LoginAutomation:
             logger.error(f"自动化程序运行失败: {e}")
             raise
         finally:
+            if data_ready is not None and not data_ready.done():
+                data_ready.cancel()
+            if self.result_writeback is not None:
+                self.result_writeback.flush()
+            self.bank_cards.log_stats()
+            self.bank_cards.save()
+            self.strategy_stats.save()
+            if self.input_worker is not None:
+                await self.input_worker.stop()
             if self.browser:
                 await self.browser.close()
 
+    async def run_mapping_verification(self, target_url: str = TARGET_URL, sequences: Optional[List[str]] = None):
+        """
+        登录并把表单逐阶段走一遍，校验标题-ID映射在真实页面上是否仍然有效（不提交表单）
+        
+        Args:
+            target_url: 目标网页URL
+            sequences: 只使用这些序号的操作（None表示使用全部序号，相同的阶段只校验一次）
+        """
+        async with playwright_api.async_playwright() as p:
+            await asyncio.gather(self.load_data(), self.launch_browser(p))
+            try:
+                self.page = await self.browser.new_page()
+                return await verify_mapping(self, self.select_groups(sequences), target_url)
+            finally:
+                await self.browser.close()
+                self.browser = None
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='财务报销自动化')
+    parser.add_argument('--workers', type=int, default=WORKER_COUNT,
+                        help='并行worker数量，每个worker使用独立的浏览器上下文处理序号组')
+    parser.add_argument('--sequences', type=str, default=None,
+                        help='只处理指定的序号（逗号分隔），由shard_launcher.py分片时传入')
+    parser.add_argument('--report-file', type=str, default=None,
+                        help='运行结束后写入JSON结果报告的路径')
+    parser.add_argument('--log-file', type=str, default=None,
+                        help='日志文件路径（覆盖config.py中的LOG_FILE）')
+    parser.add_argument('--no-wait', action='store_true',
+                        help='处理完成后直接关闭浏览器，不等待回车')
+    parser.add_argument('--plan-only', action='store_true',
+                        help='只编译并打印操作计划和预计耗时，不启动浏览器')
+    parser.add_argument('--validate', action='store_true',
+                        help='只做启动前检查并打印所有问题，不启动浏览器')
+    parser.add_argument('--verify-mapping', action='store_true',
+                        help='登录后把表单逐阶段走一遍，校验每个标题-ID在真实页面上是否存在及所在frame（不提交表单）')
+    parser.add_argument('--skip-preflight', action='store_true',
+                        help='跳过启动前检查（分片进程使用，由shard_launcher.py统一检查）')
+    parser.add_argument('--resume', action='store_true',
+                        help='跳过运行日志中已经处理成功的序号，只处理剩余的序号（处理中断或提交后失败的序号需要人工核对，不会重新运行）')
+    parser.add_argument('--stream', action='store_true', default=STREAM_INPUT,
+                        help='流式读取报销信息表：逐个序号组读取，第一条记录无需等待整表加载')
+    parser.add_argument('--no-writeback', action='store_true',
+                        help='不把处理结果回写到工作簿（分片进程使用，由shard_launcher.py统一回写）')
+    parser.add_argument('--print-mode', choices=['dialog', 'pdf'], default=PRINT_MODE,
+                        help='打印确认单方式：dialog使用Chrome打印对话框，pdf直接保存为PDF（可无头运行）')
+    parser.add_argument('--shard-index', type=int, default=None,
+                        help='分片编号，显示在验证码输入提示中（由shard_launcher.py传入）')
+    parser.add_argument('--console-lock', type=str, default=None,
+                        help='分片进程共用的控制台输入锁文件，保证同一时间只有一个分片等待输入验证码')
+    parser.add_argument('--headless', action=argparse.BooleanOptionalAction, default=HEADLESS,
+                        help='无头模式运行浏览器，验证码截图保存在captcha_images目录（打印确认单需配合 --print-mode pdf；'
+                             '--no-headless 在配置为无头时显示浏览器窗口）')
+    return parser.parse_args(argv)
+
+def redirect_log_file(log_file: str):
+    """
+    将日志文件输出切换到指定路径（分片进程各自写独立的日志文件）
+    
+    Args:
+        log_file: 新的日志文件路径
+    """
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, logging.FileHandler):
+            root_logger.removeHandler(handler)
+            handler.close()
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root_logger.addHandler(file_handler)
+
 async def main():
     """主函数"""
+    args = parse_args()
+    if args.log_file:
+        redirect_log_file(args.log_file)
+    sequences = [seq for seq in args.sequences.split(",") if seq] if args.sequences else None
+    
     # 检查文件是否存在
     if not os.path.exists(EXCEL_FILE):
         logger.error(f"报销信息文件不存在: {EXCEL_FILE}")
@@ -3946,7 +4239,49 @@ async def main():
     
     # 创建自动化实例并运行
     automation = LoginAutomation()
-    await automation.run_automation()
+    automation.print_mode = args.print_mode
+    automation.headless = args.headless
+    # 预览操作计划和启动前检查需要完整的数据
+    automation.streaming = args.stream and not (args.plan_only or args.validate or args.verify_mapping)
+    if args.no_writeback:
+        automation.result_writeback = None
+    if args.skip_preflight:
+        automation.preflight = False
+    automation.shard_index = args.shard_index
+    automation.console_lock_file = args.console_lock
+    
+    if args.verify_mapping:
+        await automation.run_mapping_verification(sequences=sequences)
+        return
+    
+    if args.validate:
+        await automation.load_data()
+        data = automation.reimbursement_data
+        if sequences is not None:
+            data = data[data[SEQUENCE_COL].map(automation.clean_value_string).isin(set(sequences))]
+        import preflight
+        problems = preflight.validate_frame(data, automation.title_id_mapping)
+        print(preflight.format_report(problems))
+        if problems:
+            sys.exit(1)
+        return
+    
+    if args.plan_only:
+        await automation.load_data()
+        plan = automation.prepare_action_plan()
+        if plan is None:
+            return
+        if sequences is not None:
+            plan = plan.subset(sequences)
+        print(plan.format())
+        return
+    
+    try:
+        await automation.run_automation(workers=args.workers, sequences=sequences,
+                                        wait_for_close=not args.no_wait, resume=args.resume)
+    finally:
+        if args.report_file:
+            automation.write_run_report(args.report_file, sequences)
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+标题-ID映射在线校验
+登录后按工作簿中的操作顺序把表单走到每个阶段（每次按钮/导航之间为一个阶段），
+每个阶段只在所有frame中做一次DOM快照，检查该阶段用到的所有映射ID是否存在、在哪个frame中；
+与上一次校验报告对比，报告缺失的ID和位置发生变化的ID。
+校验不会点击提交、预约和打印等最终步骤的按钮（见MAPPING_VERIFY_STOP_TITLES），之后的阶段在报告中标记为未到达
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import action_plan
+from action_plan import Action, LOGIN_COLUMNS, compile_sequence
+from config import MAPPING_VERIFY_REPORT, MAPPING_VERIFY_STOP_TITLES, TARGET_URL
+from session_store import is_logged_in
+
+logger = logging.getLogger(__name__)
+
+# 在一个frame中按运行时的查找方式（ID、btnName、radio的value、onclick、name、CSS选择器）查找所有键
+LOCATE_SCRIPT = """(keys) => {
+    const found = {};
+    for (const key of keys) {
+        try {
+            if (document.getElementById(key)) { found[key] = 'id'; continue; }
+            const quoted = '"' + key.replace(/(["\\\\])/g, '\\\\$1') + '"';
+            if (document.querySelector('[btnname=' + quoted + ']')) { found[key] = 'btnName'; continue; }
+            if (document.querySelector('input[type=radio][value=' + quoted + ']')) { found[key] = 'radio'; continue; }
+            if (document.querySelector('[onclick*=' + quoted + ']')) { found[key] = 'onclick'; continue; }
+            if (document.querySelector('[name=' + quoted + ']')) { found[key] = 'name'; continue; }
+            if (/[.\\s\\[>]/.test(key) && document.querySelector(key)) { found[key] = 'selector'; }
+        } catch (e) {}
+    }
+    return found;
+}"""
+
+# 阶段边界：这些操作之后页面进入下一个阶段
+STAGE_BOUNDARY_KINDS = (action_plan.LOGIN, action_plan.BUTTON, action_plan.NAVIGATION, action_plan.RESERVATION)
+# 运行中才出现的元素（银行卡弹窗等），不在阶段快照中检查
+DYNAMIC_KINDS = (action_plan.CARD_SELECT,)
+
+FOUND = "found"          # 在预期阶段找到
+MISSING = "missing"      # 所有到达的阶段中都没有找到
+MOVED = "moved"          # 找到了，但所在frame与上次校验不同，或在后面的阶段才出现
+UNREACHED = "unreached"  # 所在阶段在提交之后，校验时没有到达
+
+
+@dataclass
+class Stage:
+    """两次按钮/导航之间的一段操作"""
+    key: Tuple[Tuple[str, str], ...]   # 到达该阶段之前点击过的按钮和radio，相同路径的阶段只校验一次
+    actions: List[Action]
+    label: str
+
+    @property
+    def boundary(self) -> Optional[Action]:
+        """结束该阶段的操作"""
+        if self.actions and self.actions[-1].kind in STAGE_BOUNDARY_KINDS:
+            return self.actions[-1]
+        return None
+
+
+@dataclass
+class ElementCheck:
+    """一个映射ID的校验结果"""
+    title: str
+    element_id: str
+    stage: str
+    status: str = MISSING
+    match: str = ""
+    frame: str = ""
+    frame_url: str = ""
+    previous_frame: str = ""
+    note: str = ""
+
+
+# 会产生真实业务数据的操作类型：打印确认单、预约（第一行预约按钮）
+SUBMIT_KINDS = (action_plan.PRINT, action_plan.RESERVATION)
+
+
+def base_title(title: str) -> str:
+    """去掉重复列名的.N后缀和子序列字段的-N后缀"""
+    return re.sub(r"(\.\d+|-\d+)+$", "", title)
+
+
+def is_submit(action: Action) -> bool:
+    """会产生真实业务数据的操作（提交、预约、打印等最终步骤），校验时不执行"""
+    if action.kind in SUBMIT_KINDS or "提交" in action.title:
+        return True
+    return base_title(action.title) in MAPPING_VERIFY_STOP_TITLES
+
+
+def split_stages(actions: Sequence[Action]) -> List[Stage]:
+    """
+    按阶段边界拆分一个序号组的操作
+
+    Args:
+        actions: compile_sequence得到的操作列表
+
+    Returns:
+        阶段列表
+    """
+    stages: List[Stage] = []
+    path: List[Tuple[str, str]] = []
+    current: List[Action] = []
+    for action in actions:
+        current.append(action)
+        if action.kind == action_plan.RADIO:
+            path.append((action.title, action.value))
+        if action.kind in STAGE_BOUNDARY_KINDS:
+            stages.append(Stage(tuple(path), current, _stage_label(path)))
+            path.append((action.title, action.value))
+            current = []
+    if current:
+        stages.append(Stage(tuple(path), current, _stage_label(path)))
+    return stages
+
+
+def _stage_label(path: List[Tuple[str, str]]) -> str:
+    buttons = [title for title, _ in path]
+    return f"{buttons[-1]} 之后" if buttons else "登录页"
+
+
+def frame_key(frame) -> str:
+    """用于跨运行比较的frame标识（frame名称，没有名称时用不带参数的URL）"""
+    try:
+        return frame.name or frame.url.split("?")[0]
+    except Exception:
+        return ""
+
+
+class MappingVerifier:
+    """在真实页面上逐阶段校验标题-ID映射"""
+
+    def __init__(self, automation, report_file: str = MAPPING_VERIFY_REPORT):
+        """
+        Args:
+            automation: 已加载数据并打开了页面的LoginAutomation
+            report_file: 校验报告路径（同时作为下次校验的frame基准）
+        """
+        self.automation = automation
+        self.report_file = report_file
+        self.previous_frames = self._load_previous_frames()
+        self.checks: Dict[Tuple[Any, str], ElementCheck] = {}   # (阶段键, 标题) -> 结果
+        self.verified_stages = set()
+        self.snapshots: List[Dict[str, Any]] = []
+
+    def _load_previous_frames(self) -> Dict[str, str]:
+        if not os.path.exists(self.report_file):
+            return {}
+        try:
+            with open(self.report_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get("frames", {})
+        except Exception as e:
+            logger.warning(f"读取上次映射校验报告失败: {e}")
+            return {}
+
+    def _expected(self, stage: Stage) -> Dict[str, str]:
+        """该阶段需要检查的 标题 -> 元素ID"""
+        expected = {}
+        for action in stage.actions:
+            if action.kind == action_plan.LOGIN:
+                for title in LOGIN_COLUMNS:
+                    element_id = self.automation.get_object_id(title)
+                    if element_id:
+                        expected[title] = element_id
+            elif action.element_id and action.kind not in DYNAMIC_KINDS:
+                expected[action.title] = action.element_id
+        return expected
+
+    async def snapshot(self, keys: Sequence[str]) -> Dict[str, Tuple[Any, str]]:
+        """
+        在所有frame中同时查找一组键（一次快照）
+
+        Returns:
+            键 -> (所在frame, 匹配方式)，按frame顺序取第一个
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        frames = self.automation.page.frames
+
+        async def locate(frame):
+            try:
+                return await frame.evaluate(LOCATE_SCRIPT, keys)
+            except Exception as e:
+                logger.debug(f"在frame中查找映射ID失败: {e}")
+                return {}
+
+        results = await asyncio.gather(*[locate(frame) for frame in frames])
+        located = {}
+        for frame, found in zip(frames, results):
+            for key, match in found.items():
+                located.setdefault(key, (frame, match))
+        return located
+
+    def _mark_found(self, check: ElementCheck, frame, match: str, status: str = FOUND, note: str = ""):
+        check.status = status
+        check.match = match
+        check.frame = frame_key(frame)
+        check.frame_url = frame.url
+        check.note = note
+        check.previous_frame = self.previous_frames.get(check.element_id, "")
+        if status == FOUND and check.previous_frame and check.previous_frame != check.frame:
+            check.status = MOVED
+            check.note = f"上次校验位于 {check.previous_frame}"
+
+    async def check_stage(self, stage: Stage, sequence: str):
+        """对一个阶段做一次快照，同时检查之前阶段缺失的ID是否出现在这里"""
+        expected = self._expected(stage)
+        checks = {}
+        for title, element_id in expected.items():
+            check = ElementCheck(title, element_id, stage.label)
+            self.checks[(stage.key, title)] = check
+            checks[title] = check
+        current = {id(check) for check in checks.values()}
+        pending = [check for check in self.checks.values() if check.status == MISSING and id(check) not in current]
+
+        started = time.perf_counter()
+        located = await self.snapshot([c.element_id for c in checks.values()] + [c.element_id for c in pending])
+        for check in checks.values():
+            if check.element_id in located:
+                self._mark_found(check, *located[check.element_id])
+        for check in pending:
+            if check.element_id in located:
+                self._mark_found(check, *located[check.element_id], status=MOVED, note=f"在阶段 '{stage.label}' 中出现")
+
+        missing = [check.title for check in checks.values() if check.status == MISSING]
+        self.snapshots.append({"sequence": sequence, "stage": stage.label, "elements": len(checks),
+                               "missing": missing, "frames": len(self.automation.page.frames),
+                               "snapshot_ms": round((time.perf_counter() - started) * 1000, 1)})
+        self.verified_stages.add(stage.key)
+        logger.info(f"映射校验 序号 {sequence} 阶段 '{stage.label}': 检查 {len(checks)} 个ID，缺失 {len(missing)} 个")
+
+    async def recheck_missing(self, stage: Stage):
+        """阶段内的操作（添加内容等）之后再查一次该阶段缺失的ID"""
+        missing = [check for (key, _), check in self.checks.items() if key == stage.key and check.status == MISSING]
+        if not missing:
+            return
+        located = await self.snapshot([check.element_id for check in missing])
+        for check in missing:
+            if check.element_id in located:
+                self._mark_found(check, *located[check.element_id], note="阶段内的操作之后出现")
+
+    def _action_available(self, stage: Stage, action: Action) -> bool:
+        check = self.checks.get((stage.key, action.title))
+        return check is None or check.status != MISSING
+
+    async def verify_sequence(self, sequence: str, group_data, target_url: str = TARGET_URL) -> bool:
+        """
+        按一个序号组的操作把表单走到各个阶段并校验
+
+        Returns:
+            是否校验了新的阶段
+        """
+        automation = self.automation
+        stages = split_stages(compile_sequence(group_data, automation.get_object_id))
+        if all(stage.key in self.verified_stages for stage in stages):
+            return False
+
+        logger.info(f"映射校验：使用序号 {sequence} 的操作走到各个阶段")
+        await automation.open_start_page(target_url)
+        automation.current_group = group_data
+        for position, stage in enumerate(stages):
+            new_stage = stage.key not in self.verified_stages
+            if new_stage and stage.boundary is not None and stage.boundary.kind == action_plan.LOGIN:
+                # 会话仍然有效时页面上没有登录表单，登录阶段留给需要登录的序号校验
+                new_stage = not await is_logged_in(automation.page)
+            if new_stage:
+                await self.check_stage(stage, sequence)
+
+            for action in stage.actions:
+                if is_submit(action):
+                    self._mark_unreached(stages[position + 1:], sequence)
+                    logger.info(f"映射校验在 '{action.title}' 前停止（不提交表单）")
+                    return True
+                if action.kind == action_plan.LOGIN:
+                    await automation.perform_login(group_data)
+                    continue
+                if action is stage.boundary:
+                    await automation.flush_fill_batch()
+                    if new_stage:
+                        await self.recheck_missing(stage)
+                if not self._action_available(stage, action):
+                    if action is stage.boundary:
+                        self._mark_unreached(stages[position + 1:], sequence)
+                        logger.warning(f"映射校验：'{action.title}' 不存在，无法进入后面的阶段")
+                        return True
+                    continue
+                await automation.execute_action(action)
+            await automation.flush_fill_batch()
+        return True
+
+    def _mark_unreached(self, stages: Sequence[Stage], sequence: str):
+        for stage in stages:
+            if stage.key in self.verified_stages:
+                continue
+            for title, element_id in self._expected(stage).items():
+                self.checks.setdefault((stage.key, title),
+                                       ElementCheck(title, element_id, stage.label, status=UNREACHED,
+                                                    note=f"序号 {sequence} 在提交前停止"))
+
+    def summary(self) -> Dict[str, int]:
+        counts = {FOUND: 0, MISSING: 0, MOVED: 0, UNREACHED: 0}
+        for check in self.checks.values():
+            counts[check.status] += 1
+        return counts
+
+    def write_report(self, started: float):
+        """写入校验报告，找到的ID的frame作为下次校验的基准"""
+        frames = dict(self.previous_frames)
+        for check in self.checks.values():
+            if check.frame:
+                frames[check.element_id] = check.frame
+        report = {
+            "verified_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "duration": round(time.perf_counter() - started, 2),
+            "summary": self.summary(),
+            "problems": [vars(check) for check in self.checks.values() if check.status in (MISSING, MOVED)],
+            "stages": self.snapshots,
+            "elements": [vars(check) for check in self.checks.values()],
+            "frames": frames,
+        }
+        with open(self.report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
+    def log_report(self, report: Dict[str, Any]):
+        summary = report["summary"]
+        logger.info("=" * 50)
+        logger.info(f"映射校验完成（{report['duration']} 秒）: 找到 {summary[FOUND]} 个, 缺失 {summary[MISSING]} 个, "
+                    f"位置变化 {summary[MOVED]} 个, 未到达 {summary[UNREACHED]} 个")
+        for problem in report["problems"]:
+            location = f"，实际位于 {problem['frame']}" if problem["frame"] else ""
+            note = f"（{problem['note']}）" if problem["note"] else ""
+            logger.warning(f"  [{problem['status']}] 阶段 '{problem['stage']}' {problem['title']} -> "
+                           f"{problem['element_id']}{location}{note}")
+        logger.info(f"映射校验报告: {self.report_file}")
+        logger.info("=" * 50)
+
+
+async def verify_mapping(automation, groups, target_url: str = TARGET_URL,
+                         report_file: str = MAPPING_VERIFY_REPORT) -> Dict[str, Any]:
+    """
+    使用工作簿中的序号组逐阶段校验映射（已经校验过的阶段路径不再重复走）
+
+    Args:
+        automation: 已加载数据并打开了页面的LoginAutomation
+        groups: (序号, 数据)列表
+        target_url: 起始页面
+        report_file: 报告路径
+
+    Returns:
+        校验报告
+    """
+    verifier = MappingVerifier(automation, report_file)
+    started = time.perf_counter()
+    for sequence_num, group_data in groups:
+        sequence = automation.clean_value_string(sequence_num)
+        try:
+            await verifier.verify_sequence(sequence, group_data, target_url)
+        except Exception as e:
+            logger.error(f"映射校验 序号 {sequence} 失败: {e}")
+    report = verifier.write_report(started)
+    verifier.log_report(report)
+    return report
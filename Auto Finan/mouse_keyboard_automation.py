@@ -11,10 +11,12 @@ import os
 import time
 import argparse
 import json
+import socketserver
 import sys
+import threading
 from typing import Optional, Dict, Any, Tuple
 import pyautogui
-from config import PRINT_DIALOG_COORDINATES, PRINT_FILE_PATH, PRINT_OUTPUT_DIR
+from config import PRINT_DIALOG_COORDINATES, PRINT_FILE_PATH, PRINT_OUTPUT_DIR, INPUT_WORKER_PORT
 
 # 配置日志
 logging.basicConfig(
@@ -202,7 +204,8 @@ class MouseKeyboardAutomation:
             return False
     
     def execute_print_dialog_process(self, file_path: str, file_name: str, 
-                                   coordinates: Optional[Dict[str, Dict[str, int]]] = None) -> bool:
+                                   coordinates: Optional[Dict[str, Dict[str, int]]] = None,
+                                   dialog_wait: float = 3) -> bool:
         """
         执行打印对话框处理流程
         
@@ -210,6 +213,7 @@ class MouseKeyboardAutomation:
             file_path: 文件保存路径
             file_name: 文件名
             coordinates: 坐标配置字典，如果为None则使用config.py中的配置
+            dialog_wait: 开始操作前等待打印对话框加载的时间（秒）
             
         Returns:
             bool: 是否成功执行
@@ -223,7 +227,7 @@ class MouseKeyboardAutomation:
             
             # 等待打印对话框出现
             logger.info("等待打印对话框加载...")
-            time.sleep(3)
+            time.sleep(dialog_wait)
             
             # 步骤1: 点击打印按钮
             logger.info("步骤1: 点击打印按钮")
@@ -539,6 +543,122 @@ def execute_print_dialog_automation():
         print(f"执行打印对话框自动化处理时出错: {e}")
         return False
 
+class InputJobHandler(socketserver.StreamRequestHandler):
+    """
+    处理一个连接中的输入任务（每行一个JSON请求，返回一行JSON结果）
+    
+    请求格式: {"operation": "print_dialog", "filepath": ..., "filename": ..., "dialog_wait": ...}
+    也支持 {"operation": "ping"}、{"operation": "attach", "client": ...} 和 {"operation": "shutdown", "client": ...}
+    """
+    
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line.decode('utf-8'))
+            except ValueError as e:
+                job = {}
+                result = {"ok": False, "error": f"无法解析请求: {e}"}
+            else:
+                result = self.server.run_job(job)
+            self.wfile.write((json.dumps(result, ensure_ascii=False) + "\n").encode('utf-8'))
+            self.wfile.flush()
+            if job.get("operation") == "shutdown":
+                return
+
+
+class InputWorkerServer(socketserver.ThreadingTCPServer):
+    """
+    常驻的鼠标键盘输入worker：只初始化一次pyautogui，
+    通过本地端口接收打印对话框任务；同一时间只有一个对话框能使用鼠标，任务按到达顺序串行执行。
+    多个分片进程共用同一个worker，只有最后一个客户端请求关闭时才退出，并且等正在执行的任务完成
+    """
+    
+    daemon_threads = True
+    
+    def __init__(self, port: int = INPUT_WORKER_PORT):
+        super().__init__(("127.0.0.1", port), InputJobHandler)
+        self.automation = create_mouse_keyboard_automation()
+        self.input_lock = threading.Lock()
+        self.job_count = 0
+        self.clients = set()  # 已登记、尚未请求关闭的客户端
+        self.clients_lock = threading.Lock()
+    
+    def _shutdown_when_idle(self):
+        """等正在执行的输入任务完成后再关闭服务"""
+        with self.input_lock:
+            self.shutdown()
+    
+    def run_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        执行一个任务并返回结构化结果
+        
+        Args:
+            job: 任务请求
+            
+        Returns:
+            {"ok", "operation", "job_id", "queued_seconds", "duration", "error"}
+        """
+        operation = job.get("operation")
+        if operation == "ping":
+            return {"ok": True, "operation": operation, "pid": os.getpid()}
+        if operation == "attach":
+            with self.clients_lock:
+                self.clients.add(job.get("client"))
+            return {"ok": True, "operation": operation, "pid": os.getpid()}
+        if operation == "shutdown":
+            with self.clients_lock:
+                self.clients.discard(job.get("client"))
+                remaining = len(self.clients)
+            if remaining:
+                logger.info(f"还有 {remaining} 个客户端在使用输入worker，暂不关闭")
+                return {"ok": True, "operation": operation, "stopped": False, "clients": remaining}
+            threading.Thread(target=self._shutdown_when_idle, daemon=True).start()
+            return {"ok": True, "operation": operation, "stopped": True}
+        
+        queued = time.perf_counter()
+        with self.input_lock:
+            started = time.perf_counter()
+            self.job_count += 1
+            result = {"ok": False, "operation": operation, "job_id": self.job_count,
+                      "queued_seconds": round(started - queued, 2), "error": None}
+            try:
+                if operation == "print_dialog":
+                    result["ok"] = self.automation.execute_print_dialog_process(
+                        job["filepath"], job["filename"], job.get("coordinates"),
+                        dialog_wait=job.get("dialog_wait", 3))
+                    if not result["ok"]:
+                        result["error"] = "打印对话框处理流程执行失败"
+                elif operation == "click":
+                    result["ok"] = self.automation.click_mouse(job["x"], job["y"], job.get("delay", 0.5))
+                else:
+                    result["error"] = f"未知操作类型: {operation}"
+            except Exception as e:
+                result["error"] = str(e)
+            result["duration"] = round(time.perf_counter() - started, 2)
+        logger.info(f"任务 {result['job_id']} ({operation}) 完成: ok={result['ok']}, "
+                    f"排队 {result['queued_seconds']} 秒, 执行 {result['duration']} 秒")
+        return result
+
+
+def serve(port: int = INPUT_WORKER_PORT):
+    """
+    启动常驻输入worker（端口已被占用时说明已有worker在运行，直接退出）
+    
+    Args:
+        port: 监听的本地端口
+    """
+    try:
+        server = InputWorkerServer(port)
+    except OSError as e:
+        logger.info(f"端口 {port} 已被占用，使用已运行的输入worker: {e}")
+        return
+    logger.info(f"输入worker已启动，监听 127.0.0.1:{port}")
+    with server:
+        server.serve_forever()
+    logger.info("输入worker已退出")
+
 def main():
     """主函数 - 处理命令行参数"""
     parser = argparse.ArgumentParser(description='鼠标键盘自动化工具')
@@ -551,9 +671,16 @@ def main():
     parser.add_argument('--check', action='store_true', help='检查Python环境')
     parser.add_argument('--demo', action='store_true', help='运行演示')
     parser.add_argument('--config', action='store_true', help='使用配置文件执行')
+    parser.add_argument('--serve', action='store_true', help='作为常驻输入worker运行，通过本地端口接收任务')
+    parser.add_argument('--port', type=int, default=INPUT_WORKER_PORT, help='常驻输入worker监听的端口')
     
     args = parser.parse_args()
     
+    # 常驻输入worker
+    if args.serve:
+        serve(args.port)
+        return
+    
     # 检查Python环境
     if args.check:
         check_environment()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网络请求跟踪
+按frame统计页面中进行中的请求（request/requestfinished/requestfailed事件），
+提供"网络已安静X毫秒"的就绪条件：点击下一步、申请报销单或工号回车后，
+门户通过XHR加载下一个frame的内容，请求全部结束后即可继续，不必固定等待
+"""
+
+import logging
+import time
+from typing import Awaitable, Callable, Dict
+
+from config import NETWORK_QUIET_MS, NETWORK_STALE_REQUEST, NETWORK_IGNORED_RESOURCE_TYPES
+
+logger = logging.getLogger(__name__)
+
+Condition = Callable[[], Awaitable[bool]]
+
+
+class NetworkTracker:
+    """单个页面的进行中请求统计"""
+
+    def __init__(self, page, stale_after: float = NETWORK_STALE_REQUEST):
+        """
+        初始化并订阅页面的请求事件
+
+        Args:
+            page: Playwright页面
+            stale_after: 超过该时间（秒）仍未结束的请求视为长连接，不再影响就绪判断
+        """
+        self.page = page
+        self.stale_after = stale_after
+        self._in_flight: Dict[object, Dict[object, float]] = {}  # frame -> {request: 开始时间}
+        self.last_activity = time.monotonic()
+        self.stats = {"requests": 0, "finished": 0, "failed": 0, "evicted": 0}
+
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_failed)
+        page.on("framedetached", self._on_frame_detached)
+        page.on("framenavigated", self._on_frame_navigated)
+
+    @staticmethod
+    def _frame_of(request):
+        try:
+            return request.frame
+        except Exception:
+            # Service Worker等发起的请求没有所属frame
+            return None
+
+    def _on_request(self, request):
+        if request.resource_type in NETWORK_IGNORED_RESOURCE_TYPES:
+            return
+        self.stats["requests"] += 1
+        self.last_activity = time.monotonic()
+        self._in_flight.setdefault(self._frame_of(request), {})[request] = self.last_activity
+
+    def _finish(self, request) -> bool:
+        requests = self._in_flight.get(self._frame_of(request))
+        if not requests or requests.pop(request, None) is None:
+            return False
+        self.last_activity = time.monotonic()
+        return True
+
+    def _on_request_done(self, request):
+        if self._finish(request):
+            self.stats["finished"] += 1
+
+    def _on_request_failed(self, request):
+        if self._finish(request):
+            self.stats["failed"] += 1
+
+    def _on_frame_detached(self, frame):
+        # 已卸载frame中的请求不会再有结束事件
+        if self._in_flight.pop(frame, None):
+            self.last_activity = time.monotonic()
+
+    def _on_frame_navigated(self, frame):
+        # frame导航到新文档后，旧文档的请求可能不再有结束事件；新文档本身的请求仍会正常结束
+        requests = self._in_flight.get(frame)
+        if not requests:
+            return
+        for request in [request for request in requests if request.resource_type != "document"]:
+            del requests[request]
+            self.stats["evicted"] += 1
+
+    def _evict_stale(self, now: float):
+        """移除超过stale_after仍未结束的请求（长连接、丢失结束事件的请求），避免长时间运行时不断累积"""
+        for frame, requests in list(self._in_flight.items()):
+            for request in [request for request, started in requests.items() if now - started >= self.stale_after]:
+                del requests[request]
+                self.stats["evicted"] += 1
+            if not requests:
+                del self._in_flight[frame]
+
+    def in_flight(self, frame=None) -> int:
+        """
+        进行中的请求数（不含长时间未结束的请求）
+
+        Args:
+            frame: 只统计该frame发起的请求；None表示所有frame
+        """
+        self._evict_stale(time.monotonic())
+        groups = [self._in_flight.get(frame, {})] if frame is not None else self._in_flight.values()
+        return sum(len(requests) for requests in groups)
+
+    def is_settled(self, quiet_ms: int = NETWORK_QUIET_MS, frame=None) -> bool:
+        """没有进行中的请求，且最近quiet_ms毫秒内没有请求开始或结束"""
+        if self.in_flight(frame):
+            return False
+        return (time.monotonic() - self.last_activity) * 1000 >= quiet_ms
+
+    def settled(self, quiet_ms: int = NETWORK_QUIET_MS, frame=None) -> Condition:
+        """
+        网络安静的就绪条件，供WaitPolicy.wait使用
+
+        Args:
+            quiet_ms: 需要保持安静的毫秒数
+            frame: 只关注该frame；None表示所有frame
+        """
+        async def condition() -> bool:
+            return self.is_settled(quiet_ms, frame)
+        return condition
+
+    def log_stats(self):
+        """输出请求统计"""
+        logger.debug(f"网络请求统计: 共 {self.stats['requests']} 个, 完成 {self.stats['finished']} 个, "
+                     f"失败 {self.stats['failed']} 个, 超时移除 {self.stats['evicted']} 个, 进行中 {self.in_flight()} 个")
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动前检查
+在启动浏览器之前一次性检查整个工作簿的所有单元格：标题-ID映射是否完整、
+日期是否为yyyy-mm-dd、下拉框的值是否在DROPDOWN_FIELDS中、#科目后面是否有金额、
+等待秒数和$$radio目标是否有效。检查按列向量化进行，所有问题一次性报告
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from config import *
+from action_plan import LOGIN_COLUMNS, dropdown_config, is_date_element
+from segmentation import TRAVELER, TRAVEL_CARD, clean_cell, segment_record
+from input_cache import cached_read_excel, cached_title_id_mapping
+from dropdown_options import normalize_option
+
+logger = logging.getLogger(__name__)
+
+DATE_PATTERN = r"\d{4}-\d{1,2}-\d{1,2}"
+
+
+@dataclass
+class Problem:
+    """一个检查出的问题"""
+    sequence: str
+    row: int        # Excel中的行号（表头为第1行）
+    column: str
+    value: str
+    message: str
+
+    def format(self) -> str:
+        return f"序号 {self.sequence} 第{self.row}行 [{self.column}] = {self.value!r}: {self.message}"
+
+
+def clean_frame(data: pd.DataFrame) -> pd.DataFrame:
+    """按clean_cell的规则整表清理为字符串（空值为""，整数的浮点表示去掉.0）"""
+    cleaned = data.astype(object).where(data.notna(), "").astype(str)
+    return cleaned.apply(lambda column: column.str.strip().str.replace(r"^(-?\d+)\.0$", r"\1", regex=True))
+
+
+def _row_titles(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    计算每个单元格运行时使用的标题：出差人/差旅转卡子序列中的字段带"-索引"后缀
+
+    Returns:
+        与data形状相同的标题表
+    """
+    titles = pd.DataFrame({col: [col] * len(data) for col in data.columns}, index=data.index)
+    suffix_cols = [col for col in data.columns if col in TRAVELER_FIELDS or col in TRAVEL_CARD_FIELDS]
+    if not suffix_cols:
+        return titles
+    for _, group in data.groupby(SEQUENCE_COL):
+        segmentation = segment_record(group)
+        for label, tag in zip(group.index, segmentation.tags):
+            for col in suffix_cols:
+                if tag.kind == TRAVELER and col in TRAVELER_FIELDS:
+                    titles.at[label, col] = f"{col}-{tag.traveler_index}"
+                elif tag.kind == TRAVEL_CARD and col in TRAVEL_CARD_FIELDS:
+                    titles.at[label, col] = f"{col}-{tag.travel_card_index}"
+    return titles
+
+
+def _option_configured(value: str, config: Dict[str, str]) -> bool:
+    """值是否（规范化后）是下拉框配置中的显示名或选项值，与运行时的本地匹配规则一致"""
+    if value in config or value in config.values():
+        return True
+    normalized = normalize_option(value)
+    return any(normalize_option(option) == normalized for option in (*config.keys(), *config.values()))
+
+
+def build_cell_table(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    把工作簿展开为每个非空单元格一行的长表
+
+    Returns:
+        列为 sequence、row、column、title、value、next_value、after_subject 的DataFrame
+    """
+    cleaned = clean_frame(data)
+    titles = _row_titles(data)
+    next_values = cleaned.shift(-1, axis=1).fillna("")
+    # #科目右边的一列作为金额与科目配对处理，不单独作为单元格
+    after_subject = cleaned.shift(1, axis=1).fillna("").apply(lambda column: column.str.startswith("#"))
+
+    skip_cols = [col for col in data.columns
+                 if col in (SEQUENCE_COL, PROGRESS_COL) or col in LOGIN_COLUMNS or
+                 str(col).startswith(SUBSEQUENCE_START_COL) or str(col).startswith(SUBSEQUENCE_END_COL)]
+    cell_cols = [col for col in data.columns if col not in skip_cols]
+
+    long = pd.DataFrame({
+        "value": cleaned[cell_cols].stack(),
+        "title": titles[cell_cols].stack(),
+        "next_value": next_values[cell_cols].stack(),
+        "after_subject": after_subject[cell_cols].stack(),
+    })
+    long = long[long["value"] != ""].copy()
+    labels = long.index.get_level_values(0)
+    long["column"] = long.index.get_level_values(1)
+    long["sequence"] = cleaned.loc[labels, SEQUENCE_COL].to_numpy()
+    # DataFrame的默认索引从0开始，对应Excel第2行
+    long["row"] = labels.astype(int) + 2
+    return long.reset_index(drop=True)
+
+
+def validate_frame(data: pd.DataFrame, title_id_mapping: Dict[str, str]) -> List[Problem]:
+    """
+    检查整个工作簿
+
+    Args:
+        data: 报销信息DataFrame
+        title_id_mapping: 标题-ID映射
+
+    Returns:
+        问题列表（为空表示可以开始运行）
+    """
+    if SEQUENCE_COL not in data.columns:
+        return [Problem("", 1, SEQUENCE_COL, "", f"缺少必要的列: {SEQUENCE_COL}")]
+
+    mapping = {title: clean_cell(element_id) for title, element_id in title_id_mapping.items()}
+    cells = build_cell_table(data[data[SEQUENCE_COL].notna()])
+    problems: List[Problem] = []
+    if cells.empty:
+        return problems
+
+    def report(mask: pd.Series, message):
+        for cell in cells[mask].itertuples():
+            text = message(cell) if callable(message) else message
+            problems.append(Problem(cell.sequence, cell.row, cell.column, cell.value, text))
+
+    value = cells["value"]
+    title = cells["title"]
+    element_id = title.map(lambda t: mapping.get(t, ""))
+
+    # #科目和右边的金额（与compile_sequence一致，先于其他规则处理）
+    is_subject = value.str.startswith("#") & ~cells["after_subject"]
+    subject_id = value.str[1:].map(lambda t: mapping.get(t, ""))
+    report(is_subject & (subject_id == ""), lambda cell: f"未找到科目 '{cell.value[1:]}' 的标题-ID映射")
+    report(is_subject & (cells["next_value"] == ""), "科目右边没有金额")
+
+    # 等待秒数
+    is_wait = ~is_subject & title.str.startswith("等待")
+    seconds = pd.to_numeric(value.str.replace(r"^\$", "", regex=True), errors="coerce")
+    report(is_wait & seconds.isna(), "等待操作格式错误，无法解析秒数")
+
+    # $$radio按钮的目标
+    is_radio = ~is_subject & ~is_wait & value.str.startswith(RADIO_BUTTON_PREFIX)
+    radio_id = value.str[len(RADIO_BUTTON_PREFIX):].map(lambda t: mapping.get(t, ""))
+    report(is_radio & (radio_id == ""), lambda cell: f"未找到radio按钮 '{cell.value[2:]}' 的标题-ID映射")
+
+    # 其余单元格都需要标题-ID映射
+    special_button = (((title == "预约按钮") & (value == f"{BUTTON_PREFIX}预约")) |
+                      ((title == "添加内容按钮") & (value == f"{BUTTON_PREFIX}点击")))
+    needs_id = ~is_subject & ~is_wait & ~is_radio & ~cells["after_subject"] & ~special_button
+    # 没有映射的卡号尾号由银行卡选择弹窗读取（与classify_cell一致，运行时跳过）
+    card_tail = title.str.startswith(CARD_TAIL_COLUMNS) | value.str.startswith(CARD_NUMBER_PREFIX)
+    report(needs_id & (element_id == "") & ~card_tail, "未找到标题-ID映射")
+
+    # 普通值（非按钮、导航、卡号选择）的下拉框和日期检查
+    plain = needs_id & (element_id != "") & ~value.str.startswith(
+        (BUTTON_PREFIX, NAVIGATION_PREFIX, CARD_NUMBER_PREFIX)) & \
+        ~title.isin(["科目", "金额", "网上预约报账按钮"]) & ~title.str.startswith("转卡信息工号")
+    dropdowns = pd.Series([dropdown_config(t, e) if p else None
+                           for t, e, p in zip(title, element_id, plain)], index=cells.index)
+    is_dropdown = dropdowns.notna()
+    valid_option = pd.Series([_option_configured(v, config) if config else True
+                              for v, config in zip(value, dropdowns)], index=cells.index)
+    report(is_dropdown & ~valid_option, "下拉框的值不在DROPDOWN_FIELDS中")
+
+    is_date = plain & ~is_dropdown & element_id.map(is_date_element)
+    parsed = pd.to_datetime(value.where(value.str.fullmatch(DATE_PATTERN), None), format="%Y-%m-%d", errors="coerce")
+    report(is_date & parsed.isna(), "日期格式错误（应为yyyy-mm-dd）")
+
+    problems.sort(key=lambda problem: (problem.row, problem.column))
+    return problems
+
+
+def format_report(problems: List[Problem]) -> str:
+    """生成可打印的检查报告"""
+    if not problems:
+        return "启动前检查通过：没有发现问题"
+    lines = [f"启动前检查发现 {len(problems)} 个问题:"]
+    lines.extend(f"  {problem.format()}" for problem in problems)
+    return "\n".join(lines)
+
+
+def validate_workbook(excel_file: str = EXCEL_FILE, mapping_file: str = MAPPING_FILE, sheet_name: str = SHEET_NAME,
+                      sequences: Optional[List[str]] = None) -> List[Problem]:
+    """
+    读取工作簿和映射表（使用输入缓存）并检查
+
+    Args:
+        excel_file: 报销信息Excel文件
+        mapping_file: 标题-ID映射文件
+        sheet_name: sheet名称
+        sequences: 只检查这些序号，None表示全部
+
+    Returns:
+        问题列表
+    """
+    started = time.perf_counter()
+    data = cached_read_excel(excel_file, sheet_name=sheet_name)
+    if sequences is not None and SEQUENCE_COL in data.columns:
+        wanted = set(sequences)
+        data = data[data[SEQUENCE_COL].map(clean_cell).isin(wanted)]
+    problems = validate_frame(data, cached_title_id_mapping(mapping_file))
+    logger.info(f"启动前检查完成：{len(data)} 行，{len(problems)} 个问题，"
+                f"用时 {(time.perf_counter() - started) * 1000:.0f} 毫秒")
+    return problems
+
+
+def log_problems(problems: List[Problem]):
+    """把检查结果写入日志"""
+    if not problems:
+        logger.info(format_report(problems))
+        return
+    logger.error(format_report(problems))
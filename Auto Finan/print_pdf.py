@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+打印确认单PDF生成
+不再通过Chrome打印对话框和pyautogui坐标点击保存：点击打印确认单按钮前屏蔽window.print，
+点击后找到请求打印的文档（弹出窗口或页面中的frame），用Playwright/CDP直接渲染为PDF，
+可以在无头模式下运行
+"""
+
+import asyncio
+import base64
+import logging
+import os
+import re
+import time
+import weakref
+from typing import Optional
+
+from config import PRINT_PDF_FORMAT, PRINT_PDF_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# 屏蔽打印对话框，并标记请求打印的窗口
+SUPPRESS_PRINT_SCRIPT = """() => {
+    window.print = () => { window.__autoFinanPrintRequested = true; };
+}"""
+
+PRINT_REQUESTED_SCRIPT = "() => !!window.__autoFinanPrintRequested"
+
+RESET_PRINT_REQUESTED_SCRIPT = "() => { window.__autoFinanPrintRequested = false; }"
+
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\s]+')
+
+# 已安装屏蔽脚本的浏览器上下文
+_suppressed_contexts = weakref.WeakSet()
+
+
+def safe_name_part(value) -> str:
+    """把项目号、金额等转换为可用于文件名的字符串"""
+    return _UNSAFE_CHARS.sub("_", str(value)).strip("_") or "未知"
+
+
+def reserve_pdf_path(directory: str, stem: str) -> str:
+    """
+    在目录中预留一个不存在的文件名（以独占方式创建空文件），
+    并行的worker和分片进程同时生成时也不会互相覆盖
+
+    Args:
+        directory: 保存目录
+        stem: 文件名（不含扩展名）
+
+    Returns:
+        预留的文件路径
+    """
+    os.makedirs(directory, exist_ok=True)
+    suffix = 0
+    while True:
+        name = f"{stem}.pdf" if suffix == 0 else f"{stem}_{suffix}.pdf"
+        path = os.path.join(directory, name)
+        try:
+            with open(path, "xb"):
+                return path
+        except FileExistsError:
+            suffix += 1
+
+
+def build_pdf_stem(project_number: str, amount: str, sequence=None, worker_id: Optional[int] = None) -> str:
+    """
+    生成PDF文件名（不含扩展名）：报销单_项目号_金额_序号N_时间戳[_wN]_p进程号
+
+    Args:
+        project_number: 报销项目号
+        amount: 金额
+        sequence: 序号
+        worker_id: 并行worker编号
+    """
+    parts = ["报销单", safe_name_part(project_number), safe_name_part(amount)]
+    if sequence is not None:
+        parts.append(f"序号{safe_name_part(sequence)}")
+    parts.append(time.strftime('%Y%m%d_%H%M%S'))
+    if worker_id:
+        parts.append(f"w{worker_id}")
+    parts.append(f"p{os.getpid()}")
+    return "_".join(parts)
+
+
+async def suppress_print_dialog(page):
+    """
+    屏蔽当前页面所有frame以及此后新打开文档（包括弹出窗口）中的window.print
+
+    Args:
+        page: Playwright页面
+    """
+    if page.context not in _suppressed_contexts:
+        await page.context.add_init_script(script=f"({SUPPRESS_PRINT_SCRIPT})()")
+        _suppressed_contexts.add(page.context)
+    for frame in page.frames:
+        try:
+            await frame.evaluate(SUPPRESS_PRINT_SCRIPT)
+        except Exception as e:
+            logger.debug(f"在frame中屏蔽打印对话框失败: {e}")
+
+
+async def find_print_target(context, timeout: float = PRINT_PDF_TIMEOUT):
+    """
+    查找请求打印的文档（最近打开的页面优先，弹出窗口通常是最后一个）
+
+    Args:
+        context: 浏览器上下文
+        timeout: 最长等待时间（秒）
+
+    Returns:
+        (page, frame)，没有文档请求打印时返回None
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        for page in reversed(context.pages):
+            for frame in page.frames:
+                try:
+                    if await frame.evaluate(PRINT_REQUESTED_SCRIPT):
+                        await frame.evaluate(RESET_PRINT_REQUESTED_SCRIPT)
+                        return page, frame
+                except Exception:
+                    continue
+        if time.monotonic() >= deadline:
+            return None
+        await asyncio.sleep(0.2)
+
+
+async def render_pdf(page, path: str):
+    """
+    把页面渲染为PDF：优先使用page.pdf，浏览器不支持时（有界面模式）使用CDP的Page.printToPDF
+
+    Args:
+        page: 要渲染的Playwright页面
+        path: 输出路径
+    """
+    await page.emulate_media(media="print")
+    try:
+        try:
+            await page.pdf(path=path, format=PRINT_PDF_FORMAT, print_background=True)
+            return
+        except Exception as e:
+            logger.debug(f"page.pdf不可用，改用CDP渲染: {e}")
+
+        session = await page.context.new_cdp_session(page)
+        try:
+            result = await session.send("Page.printToPDF", {"printBackground": True, "preferCSSPageSize": True})
+        finally:
+            await session.detach()
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(result["data"]))
+    finally:
+        # 恢复屏幕样式，避免影响后续在该页面上的操作
+        await page.emulate_media(media="null")
+
+
+async def save_print_target_pdf(page, frame, path: str):
+    """
+    把请求打印的文档保存为PDF
+
+    主文档直接渲染；frame中的文档在同一浏览器上下文（共享登录会话）的新页面中打开后渲染
+
+    Args:
+        page: frame所在的页面
+        frame: 请求打印的frame
+        path: 输出路径
+    """
+    if frame is page.main_frame:
+        await render_pdf(page, path)
+        return
+
+    print_page = await page.context.new_page()
+    try:
+        await print_page.goto(frame.url, wait_until="load")
+        await render_pdf(print_page, path)
+    finally:
+        await print_page.close()
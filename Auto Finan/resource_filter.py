@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+资源拦截
+通过page.route/context.route拦截自动化不需要的资源（图片、字体、媒体、统计脚本等），
+按资源类型或URL模式中止请求，白名单中的URL（表单实际需要的资源）始终放行；
+记录本次运行拦截的请求数和估算节省的字节数
+"""
+
+import fnmatch
+import logging
+from typing import Dict, Optional, Sequence
+
+from config import (BLOCKED_RESOURCE_TYPES, BLOCKED_URL_PATTERNS, ALLOWED_URL_PATTERNS,
+                    RESOURCE_ESTIMATED_BYTES)
+
+logger = logging.getLogger(__name__)
+
+
+def _matches(url: str, patterns: Sequence[str]) -> bool:
+    """URL是否匹配任一通配符模式（不区分大小写）"""
+    return any(fnmatch.fnmatch(url, pattern) for pattern in patterns)
+
+
+class ResourceFilter:
+    """按资源类型和URL模式拦截请求，并统计节省的请求和字节"""
+
+    def __init__(self, blocked_types: Sequence[str] = BLOCKED_RESOURCE_TYPES,
+                 blocked_patterns: Sequence[str] = BLOCKED_URL_PATTERNS,
+                 allowed_patterns: Sequence[str] = ALLOWED_URL_PATTERNS,
+                 estimated_bytes: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            blocked_types: 拦截的资源类型（Playwright的request.resource_type）
+            blocked_patterns: 拦截的URL通配符模式
+            allowed_patterns: 始终放行的URL通配符模式，优先于拦截规则
+            estimated_bytes: 各资源类型单个请求的估算大小（字节），用于统计节省量
+        """
+        self.blocked_types = set(blocked_types)
+        self.blocked_patterns = [pattern.lower() for pattern in blocked_patterns]
+        self.allowed_patterns = [pattern.lower() for pattern in allowed_patterns]
+        self.estimated_bytes = dict(RESOURCE_ESTIMATED_BYTES)
+        if estimated_bytes:
+            self.estimated_bytes.update(estimated_bytes)
+        self.blocked: Dict[str, Dict[str, int]] = {}  # 资源类型 -> {"requests", "bytes"}
+        self.allowed_requests = 0
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        """
+        判断请求是否应被拦截
+
+        Args:
+            url: 请求URL
+            resource_type: 资源类型
+
+        Returns:
+            是否拦截
+        """
+        # 页面文档本身始终放行，否则frame无法加载
+        if resource_type == "document":
+            return False
+        url = url.lower()
+        if _matches(url, self.allowed_patterns):
+            return False
+        return resource_type in self.blocked_types or _matches(url, self.blocked_patterns)
+
+    async def install(self, target):
+        """
+        在页面或浏览器上下文上安装拦截规则（需在导航前调用）
+
+        Args:
+            target: Playwright的Page或BrowserContext
+        """
+        await target.route("**/*", self._handle)
+        logger.info(f"已安装资源拦截：资源类型 {sorted(self.blocked_types)}，"
+                    f"URL模式 {len(self.blocked_patterns)} 个，白名单 {len(self.allowed_patterns)} 个")
+
+    async def _handle(self, route):
+        request = route.request
+        try:
+            if self.should_block(request.url, request.resource_type):
+                self._record(request.resource_type)
+                await route.abort()
+                return
+            self.allowed_requests += 1
+            await route.continue_()
+        except Exception as e:
+            # 页面关闭等情况下路由已失效
+            logger.debug(f"处理请求拦截失败: {request.url} - {e}")
+
+    def _record(self, resource_type: str):
+        item = self.blocked.setdefault(resource_type, {"requests": 0, "bytes": 0})
+        item["requests"] += 1
+        item["bytes"] += self.estimated_bytes.get(resource_type, self.estimated_bytes.get("other", 0))
+
+    def summary(self) -> Dict[str, object]:
+        """拦截统计（字节数为按资源类型估算的值）"""
+        return {
+            "blocked_requests": sum(item["requests"] for item in self.blocked.values()),
+            "estimated_bytes_saved": sum(item["bytes"] for item in self.blocked.values()),
+            "allowed_requests": self.allowed_requests,
+            "by_type": self.blocked,
+        }
+
+    def log_summary(self):
+        """输出拦截统计"""
+        summary = self.summary()
+        if not summary["blocked_requests"]:
+            return
+        logger.info(f"资源拦截统计: 拦截 {summary['blocked_requests']} 个请求，"
+                    f"估算节省 {summary['estimated_bytes_saved'] / 1024:.0f} KB，放行 {summary['allowed_requests']} 个请求")
+        for resource_type, item in summary["by_type"].items():
+            logger.info(f"  {resource_type}: {item['requests']} 个, 约 {item['bytes'] / 1024:.0f} KB")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+处理结果回写
+把每个序号的处理状态、耗时、重试次数和确认单文件名写入单独的结果工作簿
+（报销信息表同目录下的 报销信息_处理结果.xlsx），不修改报销信息表本身：
+流式读取时报销信息表仍处于打开状态，而且修改它会使操作计划缓存和输入缓存失效，
+openpyxl保存时还会丢失它不支持的内容（图片、图表、数据验证扩展等）。
+结果先在内存中累积，每处理RESULT_CHECKPOINT_EVERY个序号和运行结束时才保存一次；
+结果工作簿中已有的其他序号的结果（之前的运行）会保留
+"""
+
+import logging
+import os
+import time
+from typing import Any, Dict, List
+
+from config import PROGRESS_COL, RESULTS_SHEET_NAME, RESULT_CHECKPOINT_EVERY, RESULT_WORKBOOK_SUFFIX
+from segmentation import clean_cell
+
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = ["序号", PROGRESS_COL, "状态", "耗时(秒)", "重试次数", "确认单文件", "最后步骤", "错误信息", "worker", "完成时间"]
+
+STATUS_LABELS = {"success": "成功", "failed": "失败", "not_run": "未运行"}
+
+
+def format_progress(result: Dict[str, Any]) -> str:
+    """
+    生成写入"处理进度"列的文字
+
+    Args:
+        result: process_sequence返回的结果
+
+    Returns:
+        如"成功 | 35.2秒 | 重试1次 | 报销单_xxx.pdf"
+    """
+    parts = [STATUS_LABELS.get(result.get("status"), result.get("status", "")),
+             f"{result.get('duration', 0)}秒",
+             f"重试{result.get('retries', 0)}次"]
+    if result.get("pdf_path"):
+        parts.append(os.path.basename(result["pdf_path"]))
+    if result.get("status") != "success" and result.get("error"):
+        parts.append(f"错误: {result['error']}")
+    return " | ".join(parts)
+
+
+def result_workbook_path(excel_file: str) -> str:
+    """报销信息表对应的结果工作簿路径"""
+    root, ext = os.path.splitext(excel_file)
+    return f"{root}{RESULT_WORKBOOK_SUFFIX}{ext or '.xlsx'}"
+
+
+class ResultWriteBack:
+    """按检查点批量保存处理结果到结果工作簿"""
+
+    def __init__(self, excel_file: str, sheet_name: str, checkpoint_every: int = RESULT_CHECKPOINT_EVERY):
+        """
+        Args:
+            excel_file: 报销信息Excel文件路径（结果工作簿保存在它旁边）
+            sheet_name: 报销信息所在的sheet
+            checkpoint_every: 每累积多少个结果保存一次
+        """
+        self.excel_file = excel_file
+        self.sheet_name = sheet_name
+        self.output_file = result_workbook_path(excel_file)
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.results: Dict[str, Dict[str, Any]] = {}  # 本次运行的所有结果（按序号）
+        self.pending = 0                              # 上次保存后新增的结果数
+
+    def record(self, result: Dict[str, Any]):
+        """
+        记录一个序号的结果，累积到检查点时保存
+
+        Args:
+            result: process_sequence返回的结果
+        """
+        self.results[result["sequence"]] = dict(result, finished_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+        self.pending += 1
+        if self.pending >= self.checkpoint_every:
+            self.flush()
+
+    def flush(self) -> bool:
+        """
+        把累积的结果一次性写入结果工作簿并保存
+
+        Returns:
+            是否保存成功（失败时结果保留到下一个检查点）
+        """
+        if not self.pending:
+            return True
+        try:
+            import openpyxl
+        except ImportError:
+            logger.warning("未安装openpyxl，无法保存处理结果")
+            return False
+
+        temp_file = f"{self.output_file}.{os.getpid()}.tmp"
+        try:
+            rows = self._previous_rows(openpyxl)
+            for sequence, result in self.results.items():
+                rows[sequence] = self._result_row(result)
+
+            workbook = openpyxl.Workbook()
+            sheet = workbook.active
+            sheet.title = RESULTS_SHEET_NAME
+            sheet.append(RESULT_COLUMNS)
+            for row in rows.values():
+                sheet.append(row)
+            workbook.save(temp_file)
+            os.replace(temp_file, self.output_file)
+        except PermissionError:
+            logger.warning(f"结果工作簿 {self.output_file} 被占用（可能已在Excel中打开），处理结果将在下一个检查点重试保存")
+            self._remove(temp_file)
+            return False
+        except Exception as e:
+            logger.warning(f"保存处理结果失败: {e}")
+            self._remove(temp_file)
+            return False
+
+        logger.info(f"已保存 {self.pending} 个新结果到 {self.output_file}（共 {len(rows)} 个序号）")
+        self.pending = 0
+        return True
+
+    def _previous_rows(self, openpyxl) -> Dict[str, List[Any]]:
+        """读取结果工作簿中已有的结果（按序号），列与当前版本不一致时不保留"""
+        if not os.path.exists(self.output_file):
+            return {}
+        workbook = openpyxl.load_workbook(self.output_file, read_only=True)
+        try:
+            if RESULTS_SHEET_NAME not in workbook.sheetnames:
+                return {}
+            values = list(workbook[RESULTS_SHEET_NAME].iter_rows(values_only=True))
+        finally:
+            workbook.close()
+        if not values or list(values[0][:len(RESULT_COLUMNS)]) != RESULT_COLUMNS:
+            return {}
+        return {clean_cell(row[0]): list(row[:len(RESULT_COLUMNS)]) for row in values[1:] if row and row[0] is not None}
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _result_row(result: Dict[str, Any]) -> List[Any]:
+        return [
+            result.get("sequence"),
+            format_progress(result),
+            STATUS_LABELS.get(result.get("status"), result.get("status")),
+            result.get("duration"),
+            result.get("retries", 0),
+            os.path.basename(result["pdf_path"]) if result.get("pdf_path") else "",
+            result.get("last_step", ""),
+            result.get("error", ""),
+            result.get("worker"),
+            result.get("finished_at", ""),
+        ]
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行日志（只追加的JSONL文件）
+记录每个序号的开始、结束状态、耗时、生成的PDF路径、失败的步骤和是否已开始提交；
+每条记录写入后立即落盘，程序中途崩溃后可以通过 --resume 跳过已经成功的序号，
+避免重新提交重复的报销单。
+每条记录带有该序号数据行的内容摘要，同名的新工作簿中序号重新编号时不会被误认为已处理；
+开始后没有结束记录（处理中崩溃）或提交后失败的序号不会被自动重新运行，需要人工核对
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from config import RUN_JOURNAL_FILE, SEQUENCE_COL
+from segmentation import clean_cell
+
+logger = logging.getLogger(__name__)
+
+# 续跑时跳过序号的原因
+COMPLETED = "completed"        # 已处理成功
+INTERRUPTED = "interrupted"    # 开始后没有结束记录（处理中崩溃），可能已经提交
+SUBMITTED_FAILED = "submitted_failed"  # 提交、预约或打印步骤开始后失败
+
+REVIEW_REASONS = {
+    INTERRUPTED: "上次处理中断（只有开始记录），表单可能已经提交",
+    SUBMITTED_FAILED: "提交后的步骤失败，表单可能已经提交",
+}
+
+
+def group_digest(group_data) -> str:
+    """
+    序号组数据行的内容摘要（不含序号列和处理进度列），用于区分同名工作簿中重新编号的序号
+
+    Args:
+        group_data: 该序号下的所有数据行（DataFrame）
+
+    Returns:
+        十六进制摘要
+    """
+    columns = [col for col in group_data.columns if col not in (SEQUENCE_COL, "处理进度")]
+    rows = [[clean_cell(row[col]) for col in columns] for row in group_data.to_dict('records')]
+    payload = json.dumps([columns, rows], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class RunJournal:
+    """只追加的运行日志（多个worker和分片进程可以写同一个文件）"""
+
+    def __init__(self, path: str = RUN_JOURNAL_FILE, excel_file: str = "", sheet_name: str = ""):
+        """
+        Args:
+            path: 日志文件路径
+            excel_file: 报销信息文件，用于区分不同输入的记录
+            sheet_name: sheet名称
+        """
+        self.path = path
+        self.source = {"excel": os.path.basename(excel_file), "sheet": sheet_name}
+        self.run_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+
+    def append(self, event: str, **fields: Any):
+        """
+        追加一条记录并立即落盘
+
+        Args:
+            event: 事件类型（run_started、sequence_started、sequence_finished）
+            **fields: 记录内容
+        """
+        entry = {"event": event, "run_id": self.run_id, "ts": time.strftime('%Y-%m-%d %H:%M:%S'),
+                 **self.source, **fields}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        try:
+            # 一次write调用写入整行，多个进程同时追加时行不会交错
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            logger.warning(f"写入运行日志失败: {e}")
+
+    def read(self):
+        """
+        读取当前输入文件的所有记录（跳过崩溃时写了一半的行）
+
+        Returns:
+            记录列表
+        """
+        entries = []
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("excel") == self.source["excel"] and entry.get("sheet") == self.source["sheet"]:
+                    entries.append(entry)
+        return entries
+
+    def latest_entries(self) -> Dict[str, Dict[str, Any]]:
+        """每个序号最近一次的开始或结束记录"""
+        latest = {}
+        for entry in self.read():
+            if entry.get("event") in ("sequence_started", "sequence_finished"):
+                latest[entry["sequence"]] = entry
+        return latest
+
+    def resume_state(self) -> Dict[str, Dict[str, Any]]:
+        """
+        续跑时需要跳过的序号
+
+        Returns:
+            序号 -> {"reason": COMPLETED/INTERRUPTED/SUBMITTED_FAILED, "digest": 内容摘要, "entry": 最近一次记录}
+        """
+        state = {}
+        for sequence, entry in self.latest_entries().items():
+            if entry["event"] == "sequence_started":
+                reason = INTERRUPTED
+            elif entry.get("status") == "success":
+                reason = COMPLETED
+            elif entry.get("submitted"):
+                reason = SUBMITTED_FAILED
+            else:
+                continue
+            state[sequence] = {"reason": reason, "digest": entry.get("digest", ""), "entry": entry}
+        return state
+
+
+def skip_reason(state: Dict[str, Dict[str, Any]], sequence: str, digest: str) -> Optional[str]:
+    """
+    续跑时该序号是否跳过
+
+    Args:
+        state: RunJournal.resume_state的结果
+        sequence: 序号
+        digest: 当前工作簿中该序号组的内容摘要
+
+    Returns:
+        跳过的原因，不跳过时返回None（内容摘要不同说明是另一批数据；旧记录没有摘要时按序号判断）
+    """
+    item = state.get(sequence)
+    if item is None or (item["digest"] and item["digest"] != digest):
+        return None
+    return item["reason"]
+
+
+def log_review_needed(skipped: Dict[str, str]):
+    """输出需要人工核对、续跑时没有重新运行的序号"""
+    review = {sequence: reason for sequence, reason in skipped.items() if reason in REVIEW_REASONS}
+    if not review:
+        return
+    logger.warning(f"以下 {len(review)} 个序号可能已经提交，续跑时没有重新运行，请在系统中核对后"
+                   f"用 --sequences 单独重新运行（不带 --resume）:")
+    for sequence, reason in review.items():
+        logger.warning(f"  序号 {sequence}: {REVIEW_REASONS[reason]}")
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+子序列分段
+对一个序号组的数据行做一次遍历，为每一行标记所属子序列、子序列类型
+（第一种、出差人、差旅转卡）和在子序列中的索引，各子序列处理逻辑共用该结果，
+不再在每个单元格处重新扫描子序列开始/结束列
+"""
+
+import copy
+from typing import Dict, List, Optional
+
+from config import (SEQUENCE_COL, SUBSEQUENCE_START_COL, SUBSEQUENCE_END_COL,
+                    TRAVELER_FIELDS, TRAVEL_CARD_FIELDS,
+                    TRAVELER_SUBSEQUENCE_MARKER, TRAVEL_CARD_SUBSEQUENCE_MARKER)
+
+# 子序列类型
+FIRST = "first"              # 第一种子序列（非"1"标记）
+TRAVELER = "traveler"        # 第二种子序列：出差人信息
+TRAVEL_CARD = "travel_card"  # 第三种子序列：差旅转卡信息
+
+
+def clean_cell(value) -> str:
+    """与LoginAutomation.clean_value_string一致的值清理（不依赖pandas）"""
+    if value is None or value != value or value == "":
+        return ""
+    value_str = str(value).strip()
+    if value_str.endswith('.0') and value_str.replace('.', '').replace('-', '').isdigit():
+        value_str = value_str[:-2]
+    return value_str
+
+
+class Segment:
+    """一个子序列（连续的行范围）"""
+
+    def __init__(self, segment_id: int, marker: str, start_row: int):
+        self.segment_id = segment_id
+        self.marker = marker
+        self.kind = FIRST
+        self.start_row = start_row
+        self.end_row = start_row
+        self.closed = False
+
+
+class RowTag:
+    """一行的分段标记"""
+
+    def __init__(self, row_idx: int):
+        self.row_idx = row_idx
+        self.segment: Optional[Segment] = None
+        self.is_start = False
+        self.is_end = False
+        self.has_data = False           # 除序号、处理进度和子序列标记列外是否有数据
+        self.has_traveler = False       # 是否有出差人信息字段
+        self.has_travel_card = False    # 是否有差旅转卡信息字段
+        # 在子序列中的索引（此前的有效数据行数），三种类型分别计数
+        self.data_index = -1
+        self.traveler_index = -1
+        self.travel_card_index = -1
+
+    @property
+    def kind(self) -> Optional[str]:
+        return self.segment.kind if self.segment else None
+
+    @property
+    def index(self) -> int:
+        """在子序列中的索引（从0开始）：出差人/差旅转卡按各自字段有数据的行计数，第一种按有数据的行计数"""
+        if self.kind == TRAVELER:
+            return self.traveler_index
+        if self.kind == TRAVEL_CARD:
+            return self.travel_card_index
+        return self.data_index
+
+
+class Segmentation:
+    """一个序号组的分段结果"""
+
+    def __init__(self, columns: List[str], tags: List[RowTag], segments: List[Segment]):
+        self.columns = columns
+        self.tags = tags
+        self.segments = segments
+        start_cols = [i for i, col in enumerate(columns) if col.startswith(SUBSEQUENCE_START_COL)]
+        end_cols = [i for i, col in enumerate(columns) if col.startswith(SUBSEQUENCE_END_COL)]
+        # 与原处理逻辑一致：使用第一个子序列开始/结束列确定子序列的列范围
+        self.start_col_idx: Optional[int] = start_cols[0] if start_cols else None
+        self.end_col_idx: Optional[int] = end_cols[0] if end_cols else None
+        self.marker_cols = {columns[i] for i in start_cols + end_cols}
+
+    def starts_kind(self, *kinds: str, from_row: int = 0) -> bool:
+        """从from_row开始的行中是否有指定类型的子序列开始"""
+        return any(tag.is_start and tag.kind in kinds for tag in self.tags[from_row:])
+
+    def segment_rows(self, segment: Segment) -> List[RowTag]:
+        """子序列覆盖的所有行"""
+        return self.tags[segment.start_row:segment.end_row + 1]
+
+    def segment_starting_at(self, row_idx: int) -> Optional[Segment]:
+        """在row_idx行开始的子序列"""
+        tag = self.tags[row_idx]
+        return tag.segment if tag.is_start else None
+
+    def tail(self, offset: int) -> "Segmentation":
+        """
+        去掉前offset行后的分段结果（行号重新从0开始），供处理group_data.iloc[offset:]时使用
+
+        Args:
+            offset: 去掉的行数
+        """
+        tags = []
+        for tag in self.tags[offset:]:
+            rebased = copy.copy(tag)
+            rebased.row_idx = tag.row_idx - offset
+            tags.append(rebased)
+        segments = []
+        remap = {}
+        for segment in self.segments:
+            if segment.end_row < offset:
+                continue
+            rebased = copy.copy(segment)
+            rebased.start_row = max(0, segment.start_row - offset)
+            rebased.end_row = segment.end_row - offset
+            remap[id(segment)] = rebased
+            segments.append(rebased)
+        for tag in tags:
+            if tag.segment is not None:
+                tag.segment = remap[id(tag.segment)]
+        return Segmentation(self.columns, tags, segments)
+
+
+def segment_rows(rows: List[Dict], columns: List[str]) -> Segmentation:
+    """
+    一次遍历完成分段
+
+    Args:
+        rows: 行数据字典列表（DataFrame.to_dict('records')）
+        columns: 列名列表
+
+    Returns:
+        分段结果
+    """
+    start_cols = [col for col in columns if col.startswith(SUBSEQUENCE_START_COL)]
+    end_cols = [col for col in columns if col.startswith(SUBSEQUENCE_END_COL)]
+    skip_cols = set(start_cols) | set(end_cols) | {SEQUENCE_COL, "处理进度"}
+    data_cols = [col for col in columns if col not in skip_cols]
+    traveler_cols = [col for col in columns if col in TRAVELER_FIELDS]
+    travel_card_cols = [col for col in columns if col in TRAVEL_CARD_FIELDS]
+
+    tags: List[RowTag] = []
+    segments: List[Segment] = []
+    current: Optional[Segment] = None
+
+    for row_idx, row in enumerate(rows):
+        tag = RowTag(row_idx)
+        tag.has_data = any(clean_cell(row[col]) for col in data_cols)
+        tag.has_traveler = any(clean_cell(row[col]) for col in traveler_cols)
+        tag.has_travel_card = any(clean_cell(row[col]) for col in travel_card_cols)
+
+        marker = next((clean_cell(row[col]) for col in start_cols if clean_cell(row[col])), "")
+        if marker and current is None:
+            current = Segment(len(segments), marker, row_idx)
+            segments.append(current)
+            data_count = traveler_count = travel_card_count = 0
+            tag.is_start = True
+
+        if current is not None:
+            tag.segment = current
+            current.end_row = row_idx
+            tag.data_index = data_count
+            tag.traveler_index = traveler_count
+            tag.travel_card_index = travel_card_count
+            data_count += tag.has_data
+            traveler_count += tag.has_traveler
+            travel_card_count += tag.has_travel_card
+            if any(clean_cell(row[col]) for col in end_cols):
+                tag.is_end = True
+                current.closed = True
+                current = None
+        tags.append(tag)
+
+    for segment in segments:
+        segment.kind = _resolve_kind(segment, tags[segment.start_row:segment.end_row + 1])
+
+    return Segmentation(columns, tags, segments)
+
+
+def _resolve_kind(segment: Segment, tags: List[RowTag]) -> str:
+    """根据开始标记确定子序列类型；两种标记相同时按行中实际包含的字段区分"""
+    is_traveler = segment.marker == TRAVELER_SUBSEQUENCE_MARKER
+    is_travel_card = segment.marker == TRAVEL_CARD_SUBSEQUENCE_MARKER
+    if is_traveler and is_travel_card:
+        has_traveler = any(tag.has_traveler for tag in tags)
+        has_travel_card = any(tag.has_travel_card for tag in tags)
+        return TRAVEL_CARD if has_travel_card and not has_traveler else TRAVELER
+    if is_traveler:
+        return TRAVELER
+    if is_travel_card:
+        return TRAVEL_CARD
+    return FIRST
+
+
+def segment_record(record_data) -> Segmentation:
+    """对DataFrame形式的序号组做分段"""
+    return segment_rows(record_data.to_dict('records'), list(record_data.columns))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+登录会话存储
+按登录界面工号保存Playwright的storage_state，后续序号和后续运行可以直接复用会话，
+只有在门户真正让会话过期时才需要重新输入验证码登录
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, Optional
+
+from config import SESSION_STORE_DIR, SESSION_MAX_AGE_HOURS
+
+logger = logging.getLogger(__name__)
+
+# 判断页面是否已登录的脚本：存在门户导航且不存在登录表单即视为已登录
+LOGIN_PROBE_SCRIPT = """() => {
+    const hasLoginForm = !!document.querySelector('#uid, #pwd, #zhLogin');
+    const hasPortal = typeof window.navToPrj === 'function' || !!document.querySelector('div.syslink');
+    return {hasLoginForm: hasLoginForm, hasPortal: hasPortal};
+}"""
+
+# 替换当前源的localStorage
+LOCAL_STORAGE_SCRIPT = """(items) => {
+    window.localStorage.clear();
+    for (const item of items) {
+        try { window.localStorage.setItem(item.name, item.value); } catch (e) {}
+    }
+}"""
+
+
+class SessionStore:
+    """按工号保存和加载登录会话"""
+
+    def __init__(self, store_dir: str = SESSION_STORE_DIR, max_age_hours: float = SESSION_MAX_AGE_HOURS):
+        """
+        初始化会话存储
+
+        Args:
+            store_dir: 会话文件保存目录
+            max_age_hours: 会话文件的最长有效时间（小时），超过后不再尝试复用
+        """
+        self.store_dir = store_dir
+        self.max_age_seconds = max_age_hours * 3600
+
+    def path_for(self, uid: str) -> str:
+        """获取工号对应的会话文件路径"""
+        safe_uid = re.sub(r'[^0-9A-Za-z_-]', '_', uid)
+        return os.path.join(self.store_dir, f"{safe_uid}.json")
+
+    def load(self, uid: str) -> Optional[Dict[str, Any]]:
+        """
+        加载工号对应的会话
+
+        Args:
+            uid: 登录界面工号
+
+        Returns:
+            storage_state字典，不存在或已过期时返回None
+        """
+        path = self.path_for(uid)
+        if not os.path.exists(path):
+            return None
+        if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+            logger.info(f"工号 {uid} 的会话文件已超过 {self.max_age_seconds / 3600:.0f} 小时，不再复用")
+            self.invalidate(uid)
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"读取工号 {uid} 的会话文件失败: {e}")
+            return None
+
+    async def save(self, uid: str, context):
+        """
+        保存浏览器上下文的会话状态
+
+        Args:
+            uid: 登录界面工号
+            context: Playwright浏览器上下文
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self.path_for(uid)
+        await context.storage_state(path=path)
+        logger.info(f"已保存工号 {uid} 的登录会话: {path}")
+
+    def invalidate(self, uid: str):
+        """删除工号对应的会话文件"""
+        path = self.path_for(uid)
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+                logger.info(f"已删除工号 {uid} 的过期会话")
+        except OSError as e:
+            logger.debug(f"删除会话文件失败: {e}")
+
+    async def restore(self, context, state: Dict[str, Any]):
+        """
+        将保存的会话cookie恢复到现有浏览器上下文（替换现有cookie）
+        localStorage需要在打开对应源的页面后用seed_local_storage写入
+
+        Args:
+            context: Playwright浏览器上下文
+            state: storage_state字典
+        """
+        await context.clear_cookies()
+        cookies = state.get("cookies", [])
+        if cookies:
+            await context.add_cookies(cookies)
+
+    async def seed_local_storage(self, page, state: Dict[str, Any]) -> bool:
+        """
+        在页面已打开的各个源中写入保存的localStorage（每个源只写一次，先清除上一个工号留下的数据）
+        不使用init script，避免切换账号后之前工号的localStorage在每次导航时被重新写入
+
+        Args:
+            page: 已导航到门户的Playwright页面
+            state: storage_state字典
+
+        Returns:
+            是否写入了数据（写入后需要重新加载页面，页面脚本才能读到）
+        """
+        entries = {item["origin"]: item.get("localStorage", []) for item in state.get("origins", [])}
+        if not entries:
+            return False
+        seeded = set()
+        for frame in page.frames:
+            try:
+                origin = await frame.evaluate("() => window.location.origin")
+                if origin in seeded or not entries.get(origin):
+                    continue
+                await frame.evaluate(LOCAL_STORAGE_SCRIPT, entries[origin])
+                seeded.add(origin)
+            except Exception as e:
+                logger.debug(f"写入localStorage失败: {e}")
+        return bool(seeded)
+
+
+async def is_logged_in(page) -> bool:
+    """
+    快速检测当前页面是否已处于登录状态
+
+    Args:
+        page: Playwright页面
+
+    Returns:
+        是否已登录
+    """
+    has_portal = False
+    for frame in page.frames:
+        try:
+            result = await frame.evaluate(LOGIN_PROBE_SCRIPT)
+        except Exception as e:
+            logger.debug(f"登录状态检测失败: {e}")
+            continue
+        if result["hasLoginForm"]:
+            return False
+        has_portal = has_portal or result["hasPortal"]
+    return has_portal
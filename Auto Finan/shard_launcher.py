@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程分片启动器
+将报销信息.xlsx中的序号组拆分为K个分片，每个分片在独立的操作系统进程中
+运行login_automation.py（各自启动自己的浏览器），最后合并结果和日志为一份运行报告
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from config import (EXCEL_FILE, MAPPING_FILE, SHEET_NAME, SEQUENCE_COL, SHARD_COUNT, SHARD_OUTPUT_DIR, WORKER_COUNT,
+                    RUN_JOURNAL_FILE, RESULT_WRITEBACK_ENABLED, PREFLIGHT_ENABLED)
+from run_journal import RunJournal, group_digest, skip_reason, log_review_needed, COMPLETED
+from result_writeback import ResultWriteBack
+from input_cache import cached_read_excel
+from preflight import validate_workbook, log_problems
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def normalize_sequence(value) -> str:
+    """将序号值转换为与login_automation.clean_value_string一致的字符串"""
+    value_str = str(value).strip()
+    if value_str.endswith('.0') and value_str.replace('.', '').replace('-', '').isdigit():
+        value_str = value_str[:-2]
+    return value_str
+
+
+def load_sequence_sizes(excel_file: str = EXCEL_FILE, sheet_name: str = SHEET_NAME) -> List[Tuple[str, int]]:
+    """
+    读取每个序号组的行数（只读取序号列）
+
+    Returns:
+        按序号排序的(序号, 行数)列表
+    """
+    df = cached_read_excel(excel_file, sheet_name=sheet_name, usecols=[SEQUENCE_COL])
+    sizes = df.dropna(subset=[SEQUENCE_COL]).groupby(SEQUENCE_COL).size()
+    return [(normalize_sequence(seq), int(count)) for seq, count in sizes.items()]
+
+
+def load_sequence_digests(excel_file: str = EXCEL_FILE, sheet_name: str = SHEET_NAME) -> Dict[str, str]:
+    """
+    读取每个序号组的内容摘要（续跑时与运行日志中的记录比较）
+
+    Returns:
+        序号 -> 内容摘要
+    """
+    df = cached_read_excel(excel_file, sheet_name=sheet_name)
+    return {normalize_sequence(seq): group_digest(group) for seq, group in df.groupby(SEQUENCE_COL)}
+
+
+def split_into_shards(sequence_sizes: List[Tuple[str, int]], shard_count: int) -> List[List[str]]:
+    """
+    按行数把序号组均衡地分配到K个分片（最长处理时间优先的贪心分配）
+
+    Args:
+        sequence_sizes: (序号, 行数)列表
+        shard_count: 分片数量
+
+    Returns:
+        每个分片负责的序号列表（分片内保持原始序号顺序），空分片会被去掉
+    """
+    shard_count = max(1, min(shard_count, len(sequence_sizes)))
+    order = {seq: idx for idx, (seq, _) in enumerate(sequence_sizes)}
+    loads = [0] * shard_count
+    shards: List[List[str]] = [[] for _ in range(shard_count)]
+
+    for seq, size in sorted(sequence_sizes, key=lambda item: item[1], reverse=True):
+        target = loads.index(min(loads))
+        shards[target].append(seq)
+        loads[target] += size
+
+    return [sorted(shard, key=order.get) for shard in shards if shard]
+
+
+async def run_shard(shard_index: int, sequences: List[str], run_dir: str, workers: int) -> Dict[str, Any]:
+    """
+    在独立进程中运行一个分片（所有分片共用控制台，验证码输入通过run_dir中的锁文件轮流进行）
+
+    Returns:
+        分片的运行信息（报告文件、日志文件、返回码、耗时）
+    """
+    report_file = os.path.join(run_dir, f"shard_{shard_index}.json")
+    log_file = os.path.join(run_dir, f"shard_{shard_index}.log")
+    command = [
+        sys.executable,
+        os.path.join(SCRIPT_DIR, "login_automation.py"),
+        "--sequences", ",".join(sequences),
+        "--workers", str(workers),
+        "--report-file", report_file,
+        "--log-file", log_file,
+        "--no-wait",
+        # 多个进程不能同时保存同一个工作簿，由启动器合并后统一回写
+        "--no-writeback",
+        # 启动器在拆分前已经检查过整个工作簿
+        "--skip-preflight",
+        # 验证码提示带上分片编号，同一时间只有一个分片等待输入
+        "--shard-index", str(shard_index),
+        "--console-lock", os.path.join(run_dir, "console.lock"),
+    ]
+
+    logger.info(f"启动分片 {shard_index}：{len(sequences)} 个序号 ({', '.join(sequences)})")
+    started = time.perf_counter()
+    # 继承标准输入输出，验证码仍可以在控制台中输入（由控制台输入锁保证各分片轮流输入）
+    process = await asyncio.create_subprocess_exec(*command, cwd=SCRIPT_DIR)
+    returncode = await process.wait()
+    duration = round(time.perf_counter() - started, 2)
+    logger.info(f"分片 {shard_index} 结束，返回码 {returncode}，耗时 {duration} 秒")
+
+    return {
+        "shard": shard_index,
+        "pid": process.pid,
+        "sequences": sequences,
+        "returncode": returncode,
+        "duration": duration,
+        "report_file": report_file,
+        "log_file": log_file,
+    }
+
+
+def merge_logs(log_files: List[str], merged_file: str):
+    """
+    按时间戳合并各分片的日志（多行日志保持在其所属记录之后）
+
+    Args:
+        log_files: 各分片日志文件
+        merged_file: 合并后的日志文件
+    """
+    entries = []
+    for shard_index, log_file in enumerate(log_files):
+        if not os.path.exists(log_file):
+            continue
+        with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.rstrip("\n")
+                # 以时间戳开头的行是新的日志记录，否则属于上一条记录的续行
+                if line[:4].isdigit() or not entries:
+                    entries.append([line[:23], shard_index, [line]])
+                else:
+                    entries[-1][2].append(line)
+
+    entries.sort(key=lambda entry: (entry[0], entry[1]))
+    with open(merged_file, 'w', encoding='utf-8') as f:
+        for _, shard_index, lines in entries:
+            for line in lines:
+                f.write(f"[shard {shard_index}] {line}\n")
+
+
+def merge_reports(shard_infos: List[Dict[str, Any]], report_file: str, wall_seconds: float) -> Dict[str, Any]:
+    """
+    合并各分片的结果报告
+
+    Args:
+        shard_infos: run_shard返回的分片运行信息
+        report_file: 合并后的报告文件
+        wall_seconds: 整体墙钟耗时
+
+    Returns:
+        合并后的报告
+    """
+    results = []
+    for info in shard_infos:
+        finished = set()
+        if os.path.exists(info["report_file"]):
+            with open(info["report_file"], 'r', encoding='utf-8') as f:
+                shard_report = json.load(f)
+            for result in shard_report.get("results", []):
+                result["shard"] = info["shard"]
+                results.append(result)
+                finished.add(result["sequence"])
+        # 分片进程异常退出时，未产生结果的序号记为未运行
+        for seq in info["sequences"]:
+            if seq not in finished:
+                results.append({"sequence": seq, "shard": info["shard"], "status": "not_run",
+                                "duration": 0, "error": f"分片进程返回码 {info['returncode']}"})
+
+    summary = {
+        "total": len(results),
+        "success": sum(1 for r in results if r["status"] == "success"),
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "not_run": sum(1 for r in results if r["status"] == "not_run"),
+        "wall_seconds": round(wall_seconds, 2),
+        "busy_seconds": round(sum(r["duration"] for r in results), 2),
+    }
+    report = {"summary": summary, "shards": shard_infos, "results": results}
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+async def launch(shard_count: int, workers: int, resume: bool = False) -> Dict[str, Any]:
+    """
+    拆分工作簿并并行运行所有分片
+
+    Args:
+        shard_count: 分片（进程）数量
+        workers: 每个分片进程内的并行worker数量
+        resume: 跳过运行日志中已经处理成功的序号
+
+    Returns:
+        合并后的运行报告，启动前检查未通过时返回None
+    """
+    sequence_sizes = load_sequence_sizes(os.path.join(SCRIPT_DIR, EXCEL_FILE))
+    if PREFLIGHT_ENABLED:
+        problems = validate_workbook(os.path.join(SCRIPT_DIR, EXCEL_FILE), os.path.join(SCRIPT_DIR, MAPPING_FILE),
+                                     SHEET_NAME)
+        log_problems(problems)
+        if problems:
+            logger.error("启动前检查未通过，未启动任何分片")
+            return None
+    if resume:
+        journal = RunJournal(os.path.join(SCRIPT_DIR, RUN_JOURNAL_FILE), EXCEL_FILE, SHEET_NAME)
+        state = journal.resume_state()
+        digests = load_sequence_digests(os.path.join(SCRIPT_DIR, EXCEL_FILE))
+        skipped = {seq: skip_reason(state, seq, digests.get(seq, "")) for seq, _ in sequence_sizes}
+        skipped = {seq: reason for seq, reason in skipped.items() if reason is not None}
+        sequence_sizes = [(seq, size) for seq, size in sequence_sizes if seq not in skipped]
+        completed = sum(1 for reason in skipped.values() if reason == COMPLETED)
+        logger.info(f"续跑模式：跳过已成功的 {completed} 个序号")
+        log_review_needed(skipped)
+    shards = split_into_shards(sequence_sizes, shard_count)
+    run_dir = os.path.join(SCRIPT_DIR, SHARD_OUTPUT_DIR, time.strftime('%Y%m%d_%H%M%S'))
+    os.makedirs(run_dir, exist_ok=True)
+    logger.info(f"共 {len(sequence_sizes)} 个序号，拆分为 {len(shards)} 个分片，输出目录: {run_dir}")
+
+    started = time.perf_counter()
+    shard_infos = await asyncio.gather(*[
+        run_shard(index, sequences, run_dir, workers) for index, sequences in enumerate(shards)
+    ])
+    wall_seconds = time.perf_counter() - started
+
+    merge_logs([info["log_file"] for info in shard_infos], os.path.join(run_dir, "merged.log"))
+    report = merge_reports(list(shard_infos), os.path.join(run_dir, "run_report.json"), wall_seconds)
+    if RESULT_WRITEBACK_ENABLED:
+        writeback = ResultWriteBack(os.path.join(SCRIPT_DIR, EXCEL_FILE), SHEET_NAME,
+                                    checkpoint_every=len(report["results"]) + 1)
+        for result in report["results"]:
+            writeback.record(result)
+        writeback.flush()
+
+    summary = report["summary"]
+    logger.info("=" * 50)
+    logger.info(f"分片运行完成: 成功 {summary['success']} 条, 失败 {summary['failed']} 条, "
+                f"未运行 {summary['not_run']} 条, 墙钟耗时 {summary['wall_seconds']} 秒")
+    logger.info(f"合并报告: {os.path.join(run_dir, 'run_report.json')}")
+    logger.info(f"合并日志: {os.path.join(run_dir, 'merged.log')}")
+    logger.info("=" * 50)
+    return report
+
+
+def main():
+    """主函数 - 处理命令行参数"""
+    parser = argparse.ArgumentParser(description='报销自动化多进程分片启动器')
+    parser.add_argument('--shards', type=int, default=SHARD_COUNT, help='分片（进程）数量')
+    parser.add_argument('--workers', type=int, default=WORKER_COUNT, help='每个分片进程内的并行worker数量')
+    parser.add_argument('--resume', action='store_true', help='跳过运行日志中已经处理成功的序号（处理中断或提交后失败的序号需要人工核对，不会重新运行）')
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(SCRIPT_DIR, EXCEL_FILE)):
+        logger.error(f"报销信息文件不存在: {EXCEL_FILE}")
+        return 1
+
+    report = asyncio.run(launch(args.shards, args.workers, args.resume))
+    if report is None:
+        return 1
+    return 0 if report["summary"]["failed"] == 0 and report["summary"]["not_run"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
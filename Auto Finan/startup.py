@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动加速
+pandas和Playwright等较重的模块改为第一次使用时才导入（--plan-only、--validate等子命令不需要启动浏览器，
+也就不会导入Playwright）；StartupTimer记录启动各阶段的耗时，在debug级别输出启动耗时分解
+"""
+
+import importlib
+import logging
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """第一次访问属性时才导入的模块"""
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: 模块名（如"pandas"、"playwright.async_api"）
+        """
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            started = time.perf_counter()
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+            logger.debug(f"导入 {self.__dict__['_name']} 用时 {(time.perf_counter() - started) * 1000:.0f} 毫秒")
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "已导入" if self.__dict__["_module"] is not None else "未导入"
+        return f"<LazyModule {self.__dict__['_name']} ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    """返回一个第一次使用时才导入的模块代理"""
+    return LazyModule(name)
+
+
+class StartupTimer:
+    """记录启动阶段的耗时（并发进行的阶段各自从起点计时）"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks: List[Tuple[str, float]] = []
+
+    def mark(self, stage: str) -> float:
+        """
+        记录某个阶段完成
+
+        Args:
+            stage: 阶段名称
+
+        Returns:
+            从启动开始到现在的秒数
+        """
+        elapsed = time.perf_counter() - self.started
+        self.marks.append((stage, elapsed))
+        return elapsed
+
+    def log(self, final_stage: Optional[str] = None):
+        """在debug级别输出启动耗时分解"""
+        if final_stage:
+            self.mark(final_stage)
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        logger.debug("启动耗时分解（从启动开始计时，数据加载与浏览器启动并发进行）:")
+        for stage, elapsed in sorted(self.marks, key=lambda item: item[1]):
+            logger.debug(f"  {elapsed:7.2f} 秒  {stage}")
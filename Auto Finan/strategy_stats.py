@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+备选策略的自适应排序
+fill_input、fill_date_input、click_button_by_btnname、click_navigation_panel和打印按钮点击
+都有多种依次尝试的方法（策略）。这里按 (操作, element_id或按钮名等键) 记录每个策略的成功/失败次数和耗时，
+下次按历史表现排序：对该键成功过的策略优先（成功率高、耗时短的在前），没试过的保持原顺序，
+只失败过的放到最后。统计保存到文件，后续运行一开始就按学到的顺序尝试，稳定后每个操作只需尝试一次；
+多个分片进程同时保存时，在文件锁内把本进程新增的次数合并到文件中的统计，不会互相覆盖
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from console_lock import ConsoleFileLock
+
+logger = logging.getLogger(__name__)
+
+Strategy = Tuple[str, Callable[[], Awaitable[bool]]]  # (策略名, 成功时返回True的异步函数)
+
+ANY_KEY = "*"  # 操作级汇总（该键没有记录时使用）
+
+Stats = Dict[str, Dict[str, Dict[str, Dict[str, float]]]]  # 操作 -> 键 -> 策略 -> {"ok", "fail", "ok_ms", "fail_ms"}
+
+
+def _add(stats: Stats, action: str, scope: str, strategy: str, entry: Dict[str, float]):
+    """把一条统计累加到stats中"""
+    target = (stats.setdefault(action, {}).setdefault(scope, {})
+              .setdefault(strategy, {"ok": 0, "fail": 0, "ok_ms": 0.0, "fail_ms": 0.0}))
+    for field, value in entry.items():
+        target[field] = target.get(field, 0) + value
+
+
+class StrategyStats:
+    """按 (操作, 键, 策略) 统计成功/失败次数和耗时"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: 持久化文件路径，None表示只在本次运行内统计
+        """
+        self.path = path
+        self._stats: Stats = {}
+        self._delta: Stats = {}  # 加载或上次保存后本进程新增的统计，保存时合并到文件
+        if path:
+            self._stats = self._read()
+            if self._stats:
+                logger.info(f"加载策略统计: {sum(len(keys) for keys in self._stats.values())} 个元素/操作")
+
+    def _read(self) -> Stats:
+        """读取文件中的统计，不存在或无法解析时返回空统计"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"读取策略统计失败，将重新学习: {e}")
+            return {}
+
+    def record(self, action: str, key: str, strategy: str, success: bool, seconds: float):
+        """
+        记录一次尝试
+
+        Args:
+            action: 操作名（如fill_input）
+            key: element_id、按钮名等
+            strategy: 策略名
+            success: 是否成功
+            seconds: 耗时（秒）
+        """
+        if success:
+            entry = {"ok": 1, "ok_ms": seconds * 1000}
+        else:
+            entry = {"fail": 1, "fail_ms": seconds * 1000}
+        for scope in (key, ANY_KEY):
+            _add(self._stats, action, scope, strategy, entry)
+            _add(self._delta, action, scope, strategy, entry)
+
+    def order(self, action: str, key: str, names: Sequence[str], pinned: Iterable[str] = (),
+              loose: Iterable[str] = ()) -> List[str]:
+        """
+        按历史表现排列策略
+
+        Args:
+            action: 操作名
+            key: element_id、按钮名等（没有记录时使用操作级汇总）
+            names: 默认顺序的策略名
+            pinned: 固定放在最后、保持默认顺序的策略（如不够精确的兜底方法）
+            loose: 可能匹配到其他元素的策略（如按文本、部分id查找），只按该键自己的记录排序；
+                该键没有记录时排在其他策略之后（pinned之前），不因其他元素上的成功而提前
+
+        Returns:
+            排序后的策略名
+        """
+        scopes = self._stats.get(action, {})
+        own = scopes.get(key)
+        stats = own or scopes.get(ANY_KEY) or {}
+        pinned = set(pinned)
+        loose = set(loose) if not own and stats else set()
+
+        def rank(item):
+            position, name = item
+            entry = stats.get(name)
+            if name in pinned:
+                return (3, 0.0, 0.0, position)
+            if name in loose:
+                return (2, 1.0, 0.0, position)   # 只有操作级汇总时不参与排序
+            if not entry:
+                return (1, 0.0, 0.0, position)   # 没有尝试过
+            if not entry["ok"]:
+                return (2, 0.0, 0.0, position)   # 只失败过
+            rate = entry["ok"] / (entry["ok"] + entry["fail"])
+            return (0, -round(rate, 1), entry["ok_ms"] / entry["ok"], position)
+
+        return [name for _, name in sorted(enumerate(names), key=rank)]
+
+    async def attempt(self, action: str, key: str, strategies: Sequence[Strategy],
+                      pinned: Iterable[str] = (), loose: Iterable[str] = ()) -> Optional[str]:
+        """
+        按学到的顺序依次尝试策略，直到有一个成功
+
+        Args:
+            action: 操作名
+            key: element_id、按钮名等
+            strategies: 默认顺序的(策略名, 异步函数)列表；函数返回True表示成功，返回False或抛出异常表示失败
+            pinned: 固定放在最后的策略
+            loose: 只按该键自己的记录排序的策略
+
+        Returns:
+            成功的策略名，全部失败时返回None
+        """
+        functions = dict(strategies)
+        for name in self.order(action, key, [name for name, _ in strategies], pinned, loose):
+            started = time.perf_counter()
+            try:
+                success = bool(await functions[name]())
+            except Exception as e:
+                logger.debug(f"{action} 策略 {name} 失败: {key} - {e}")
+                success = False
+            self.record(action, key, name, success, time.perf_counter() - started)
+            if success:
+                return name
+        return None
+
+    def save(self):
+        """
+        保存到持久化文件（没有变化或未开启持久化时不写）：在文件锁内重新读取文件，
+        累加本进程新增的次数后写回，其他分片进程在此期间保存的统计不会丢失
+        """
+        if not self.path or not self._delta:
+            return
+        try:
+            with ConsoleFileLock(f"{self.path}.lock", wait_message="其他进程正在保存策略统计，等待..."):
+                merged = self._read()
+                for action, scopes in self._delta.items():
+                    for scope, strategies in scopes.items():
+                        for strategy, entry in strategies.items():
+                            _add(merged, action, scope, strategy, entry)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(merged, f, ensure_ascii=False, indent=1)
+                os.replace(tmp_path, self.path)
+            self._stats = merged
+            self._delta = {}
+            logger.debug(f"已保存策略统计: {self.path}")
+        except Exception as e:
+            logger.warning(f"保存策略统计失败: {e}")
+
+    def log_summary(self):
+        """输出各操作每个策略的成功次数、失败次数和失败浪费的时间"""
+        if not self._stats:
+            return
+        logger.info("策略统计:")
+        for action, scopes in self._stats.items():
+            items = []
+            for name, entry in scopes.get(ANY_KEY, {}).items():
+                item = f"{name} 成功{entry['ok']}/失败{entry['fail']}"
+                if entry["fail"]:
+                    item += f"（失败耗时 {entry['fail_ms'] / 1000:.1f} 秒）"
+                items.append(item)
+            logger.info(f"  {action}: {', '.join(items)}")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试映射校验的阶段拆分：使用报销信息.xlsx中真实的列顺序，确认校验在提交、预约、打印等最终步骤前停止
+"""
+
+import os
+import sys
+
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import action_plan
+from action_plan import Action, compile_sequence
+from config import EXCEL_FILE, MAPPING_FILE, SEQUENCE_COL
+from mapping_verifier import is_submit, split_stages
+
+
+def load_mapping():
+    mapping_df = pd.read_excel(os.path.join(SCRIPT_DIR, MAPPING_FILE))
+    return dict(zip(mapping_df.iloc[:, 0], mapping_df.iloc[:, 1]))
+
+
+def compiled_sequences(sheet_name):
+    """按序号编译工作簿中一个sheet的操作"""
+    mapping = load_mapping()
+    df = pd.read_excel(os.path.join(SCRIPT_DIR, EXCEL_FILE), sheet_name=sheet_name)
+    df[SEQUENCE_COL] = df[SEQUENCE_COL].ffill()
+    return [compile_sequence(group, lambda title: mapping.get(title, ""))
+            for _, group in df.groupby(SEQUENCE_COL, sort=False)]
+
+
+def executed_actions(actions):
+    """校验时会执行的操作：按阶段顺序直到第一个最终步骤（与verify_sequence一致）"""
+    executed = []
+    for stage in split_stages(actions):
+        for action in stage.actions:
+            if is_submit(action):
+                return executed, action
+            executed.append(action)
+    return executed, None
+
+
+def test_chailv_stops_before_reservation():
+    """差旅：下一步按钮5 → 日期 → 校区 → 预约按钮 → 打印确认单按钮，校验在预约前停止"""
+    for actions in compiled_sequences("ChaiLv_sheet"):
+        executed, stopped_at = executed_actions(actions)
+        assert stopped_at is not None
+        assert stopped_at.title == "预约按钮"
+        assert stopped_at.kind == action_plan.RESERVATION
+        titles = [action.title for action in executed]
+        assert "校区" in titles
+        assert not any(action.kind in (action_plan.RESERVATION, action_plan.PRINT) for action in executed)
+
+
+def test_every_sheet_stops_before_final_step():
+    """每个sheet的校验都不会执行提交、预约或打印"""
+    for sheet_name in pd.ExcelFile(os.path.join(SCRIPT_DIR, EXCEL_FILE)).sheet_names:
+        for actions in compiled_sequences(sheet_name):
+            executed, _ = executed_actions(actions)
+            for action in executed:
+                assert action.kind not in (action_plan.RESERVATION, action_plan.PRINT), (sheet_name, action)
+                assert "提交" not in action.title, (sheet_name, action)
+                assert not action.title.startswith("预约按钮"), (sheet_name, action)
+
+
+def test_stop_titles_ignore_suffixes():
+    """重复列名（.N）和子序列后缀（-N）的最终步骤按钮同样视为提交"""
+    assert is_submit(Action(action_plan.BUTTON, "预约按钮.1", "$点击", element_id="btn"))
+    assert is_submit(Action(action_plan.BUTTON, "确定返回按钮", "$点击", element_id="btn"))
+    assert not is_submit(Action(action_plan.BUTTON, "下一步按钮5", "$点击", element_id="btn"))
+
+
+if __name__ == "__main__":
+    test_chailv_stops_before_reservation()
+    test_every_sheet_stops_before_final_step()
+    test_stop_titles_ignore_suffixes()
+    print("测试完成！")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试启动前检查：使用仓库自带的报销信息.xlsx和标题-ID.xlsx，确认默认sheet可以通过检查
+"""
+
+import os
+import sys
+
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import action_plan
+from config import EXCEL_FILE, MAPPING_FILE, SHEET_NAME, CHAILV_SHEET_NAME, SEQUENCE_COL
+from preflight import validate_frame
+
+
+def load_mapping():
+    mapping_df = pd.read_excel(os.path.join(SCRIPT_DIR, MAPPING_FILE))
+    return dict(zip(mapping_df.iloc[:, 0], mapping_df.iloc[:, 1]))
+
+
+def load_sheet(sheet_name):
+    df = pd.read_excel(os.path.join(SCRIPT_DIR, EXCEL_FILE), sheet_name=sheet_name)
+    df[SEQUENCE_COL] = df[SEQUENCE_COL].ffill()
+    return df
+
+
+def test_default_sheet_passes():
+    """默认sheet（含卡号尾号列）没有问题，run_automation不会因启动前检查拒绝运行"""
+    problems = validate_frame(load_sheet(SHEET_NAME), load_mapping())
+    assert problems == [], [problem.format() for problem in problems]
+
+
+def test_card_tails_not_reported():
+    """银行卡选择使用的卡号尾号列在所有sheet中都不要求标题-ID映射"""
+    mapping = load_mapping()
+    for sheet_name in (SHEET_NAME, CHAILV_SHEET_NAME):
+        problems = validate_frame(load_sheet(sheet_name), mapping)
+        assert not [problem for problem in problems if "卡号尾号" in problem.column], sheet_name
+
+
+def test_unmapped_card_tail_is_skipped_at_runtime():
+    """运行时与启动前检查一致：没有映射的卡号尾号跳过，其他没有映射的单元格仍是错误"""
+    action = action_plan.classify_cell("卡号尾号", "*1142", lambda title: "")
+    assert action.kind == action_plan.SKIP
+    action = action_plan.classify_cell("报销项目号", "*1142", lambda title: "")
+    assert action.kind == action_plan.SKIP
+    action = action_plan.classify_cell("报销项目号", "M112023", lambda title: "")
+    assert action.kind == action_plan.INVALID
+    action = action_plan.classify_cell("银行卡", "*1142", lambda title: "card")
+    assert action.kind == action_plan.CARD_SELECT
+
+
+if __name__ == "__main__":
+    test_default_sheet_passes()
+    test_card_tails_not_reported()
+    test_unmapped_card_tail_is_skipped_at_runtime()
+    print("测试完成！")
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+等待策略
+把代码中固定的sleep替换为命名的等待点：每个等待点带一个就绪条件
+（frame完成导航、元素可见可用、弹窗出现、DOM不再变化等），
+条件满足即继续，配置的等待时间只作为上限；每个等待点记录实际耗时
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from config import (PAGE_LOAD_WAIT, BUTTON_CLICK_WAIT, SUBJECT_AMOUNT_WAIT, BANK_CARD_DIALOG_WAIT,
+                    BANK_CARD_SELECTION_WAIT, LOGIN_WAIT_TIME, CARD_SELECTED_WAIT, WORK_ID_EVENT_WAIT,
+                    INPUT_SETTLE_WAIT, PRINT_PAGE_READY_WAIT, PRINT_PREVIEW_WAIT, PRE_CLICK_WAIT,
+                    WAIT_POLL_INTERVAL, NAVIGATION_GRACE, DOM_QUIET_MS)
+
+logger = logging.getLogger(__name__)
+
+# 等待点 -> 上限（秒）
+WAIT_POINT_CEILINGS = {
+    "page_load": PAGE_LOAD_WAIT,                  # 打开起始页面
+    "pre_click": PRE_CLICK_WAIT,                  # 点击按钮前等待页面请求结束
+    "button_click": BUTTON_CLICK_WAIT,            # 按钮/导航点击后页面加载
+    "subject_amount": SUBJECT_AMOUNT_WAIT,        # 科目金额输入框出现
+    "bank_card_dialog": BANK_CARD_DIALOG_WAIT,    # 银行卡选择弹窗出现
+    "bank_card_selection": BANK_CARD_SELECTION_WAIT,  # 银行卡列表加载
+    "card_selected": CARD_SELECTED_WAIT,          # 选择银行卡后生效
+    "login": LOGIN_WAIT_TIME,                     # 登录跳转
+    "work_id_events": WORK_ID_EVENT_WAIT,         # 工号填写后的页面脚本
+    "input_settle": INPUT_SETTLE_WAIT,            # 输入完成后回车前
+    "print_page_ready": PRINT_PAGE_READY_WAIT,    # 打印确认单按钮出现
+    "print_preview": PRINT_PREVIEW_WAIT,          # Chrome打印预览（浏览器外部，无法检测）
+}
+
+Condition = Callable[[], Awaitable[bool]]
+
+# 安装MutationObserver并返回DOM是否已经安静了quietMs毫秒（首次调用只安装，返回false）
+DOM_QUIET_SCRIPT = """(quietMs) => {
+    if (!window.__autoFinanObserver) {
+        window.__autoFinanLastMutation = performance.now();
+        window.__autoFinanObserver = new MutationObserver(() => {
+            window.__autoFinanLastMutation = performance.now();
+        });
+        window.__autoFinanObserver.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+        return false;
+    }
+    return performance.now() - window.__autoFinanLastMutation >= quietMs;
+}"""
+
+# 任一选择器对应的元素可见
+VISIBLE_SCRIPT = """(selectors) => selectors.some((selector) => {
+    const el = document.querySelector(selector);
+    return !!el && (el.offsetWidth > 0 || el.offsetHeight > 0 || el.getClientRects().length > 0);
+})"""
+
+
+class WaitPolicy:
+    """命名等待点的执行和耗时统计（多个worker共享一个实例）"""
+
+    def __init__(self, ceilings: Optional[Dict[str, float]] = None, poll_interval: float = WAIT_POLL_INTERVAL):
+        self.ceilings = dict(WAIT_POINT_CEILINGS)
+        if ceilings:
+            self.ceilings.update(ceilings)
+        self.poll_interval = poll_interval
+        self.records: Dict[str, List[tuple]] = {}
+
+    async def wait(self, name: str, condition: Optional[Condition] = None) -> float:
+        """
+        在等待点等待，直到条件满足或达到上限
+
+        Args:
+            name: 等待点名称
+            condition: 就绪条件（返回bool的异步函数），None表示固定等待上限时间
+
+        Returns:
+            实际等待的秒数
+        """
+        ceiling = self.ceilings[name]
+        started = time.monotonic()
+        met = False
+        if condition is None:
+            await asyncio.sleep(ceiling)
+        else:
+            while True:
+                try:
+                    met = await condition()
+                except Exception as e:
+                    logger.debug(f"等待点 {name} 条件检查失败: {e}")
+                if met:
+                    break
+                remaining = ceiling - (time.monotonic() - started)
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(self.poll_interval, remaining))
+
+        elapsed = time.monotonic() - started
+        self.records.setdefault(name, []).append((elapsed, met))
+        if met:
+            logger.debug(f"等待点 {name} 就绪，用时 {elapsed:.2f} 秒（上限 {ceiling} 秒）")
+        else:
+            logger.debug(f"等待点 {name} 等待至上限 {ceiling} 秒")
+        return elapsed
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """各等待点的次数、实际耗时和相对固定等待节省的时间"""
+        result = {}
+        for name, records in self.records.items():
+            total = sum(elapsed for elapsed, _ in records)
+            ceiling = self.ceilings[name]
+            result[name] = {
+                "count": len(records),
+                "condition_met": sum(1 for _, met in records if met),
+                "total_seconds": round(total, 2),
+                "max_seconds": round(max(elapsed for elapsed, _ in records), 2),
+                "ceiling": ceiling,
+                "saved_seconds": round(ceiling * len(records) - total, 2),
+            }
+        return result
+
+    def log_summary(self):
+        """输出等待点统计"""
+        summary = self.summary()
+        if not summary:
+            return
+        logger.info("等待点统计:")
+        for name, item in summary.items():
+            logger.info(f"  {name}: {item['count']} 次, 条件满足 {item['condition_met']} 次, "
+                        f"实际 {item['total_seconds']} 秒, 最长 {item['max_seconds']} 秒, "
+                        f"相比固定等待节省 {item['saved_seconds']} 秒")
+
+
+async def _evaluate_all(page, script: str, arg=None) -> list:
+    """在所有frame中执行脚本（已卸载的frame忽略）"""
+    async def run(frame):
+        try:
+            return await frame.evaluate(script, arg)
+        except Exception:
+            return None
+    return await asyncio.gather(*[run(frame) for frame in page.frames])
+
+
+async def frames_complete(page) -> bool:
+    """所有frame的文档都已加载完成"""
+    states = await _evaluate_all(page, "() => document.readyState")
+    return all(state in (None, "complete") for state in states)
+
+
+async def dom_quiet(page, quiet_ms: int = DOM_QUIET_MS) -> bool:
+    """所有frame的DOM都已经quiet_ms毫秒没有变化"""
+    results = await _evaluate_all(page, DOM_QUIET_SCRIPT, quiet_ms)
+    return all(result is not False for result in results)
+
+
+def page_settled(page, index, since: float, grace: float = NAVIGATION_GRACE, network=None) -> Condition:
+    """
+    点击后的页面就绪条件：发生了导航则等到所有frame加载完成；
+    grace秒内没有导航（局部刷新）则等到DOM安静；提供network时还要求网络请求已结束。
+    导航开始前网络已经有请求时不必再等grace
+
+    Args:
+        page: Playwright页面
+        index: 页面的FrameIndex（记录最近一次导航时间）
+        since: 点击完成的时间（time.monotonic）
+        grace: 等待导航开始的时间
+        network: 页面的NetworkTracker（可选）
+    """
+    async def condition() -> bool:
+        started = index.last_navigation >= since or (network is not None and network.last_activity >= since)
+        if not started and time.monotonic() - since < grace:
+            return False
+        if network is not None and not network.is_settled():
+            return False
+        return await frames_complete(page) and await dom_quiet(page)
+    return condition
+
+
+def selectors_visible(page, selectors: Sequence[str]) -> Condition:
+    """任一frame中任一选择器对应的元素可见（弹窗出现）"""
+    async def condition() -> bool:
+        return any(await _evaluate_all(page, VISIBLE_SCRIPT, list(selectors)))
+    return condition
+
+
+def element_ready(index, element_id: str) -> Condition:
+    """元素已出现、可见且可用"""
+    async def condition() -> bool:
+        located = await index.resolve(element_id, [f"#{element_id}", f"[name='{element_id}']"])
+        if not located:
+            return False
+        frame, selector = located
+        element = frame.locator(selector).first
+        return await element.is_visible() and await element.is_enabled()
+    return condition
+
+
+def all_of(*conditions: Condition) -> Condition:
+    """所有条件都满足"""
+    async def condition() -> bool:
+        for item in conditions:
+            if not await item():
+                return False
+        return True
+    return condition
+
+
+def any_of(*conditions: Condition) -> Condition:
+    """任一条件满足"""
+    async def condition() -> bool:
+        for item in conditions:
+            if await item():
+                return True
+        return False
+    return condition
+
+
+def dom_settled(page, network=None) -> Condition:
+    """页面脚本处理完成（DOM安静；提供network时还要求网络请求已结束）"""
+    async def condition() -> bool:
+        if network is not None and not network.is_settled():
+            return False
+        return await dom_quiet(page)
+    return condition
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式读取报销信息表
+使用openpyxl只读模式逐行读取工作表，每凑齐一个序号组就产出一个小DataFrame，
+不把整个sheet读入内存，也不对整表排序：第一条记录在几秒内即可开始处理，内存占用与sheet大小无关。
+列名按pandas.read_excel的规则处理（重复列名加".1"、".2"后缀，空列名为"Unnamed: N"），
+产出的DataFrame与原来groupby得到的分组一致
+"""
+
+import logging
+from collections import defaultdict
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+from config import SEQUENCE_COL
+from segmentation import clean_cell
+
+logger = logging.getLogger(__name__)
+
+
+def dedupe_columns(header: Sequence[Any]) -> List[Any]:
+    """
+    按pandas.read_excel的规则生成列名
+
+    Args:
+        header: 表头行的原始值
+
+    Returns:
+        列名列表
+    """
+    names = [f"Unnamed: {i}" if value is None else value for i, value in enumerate(header)]
+    counts = defaultdict(int)
+    for i, name in enumerate(names):
+        count = counts[name]
+        while count > 0:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts[name]
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+def iter_sequence_groups(excel_file: str, sheet_name: str,
+                         wanted: Optional[set] = None) -> Iterator[Tuple[Any, "pd.DataFrame"]]:
+    """
+    按工作表中的顺序逐个产出序号组
+
+    序号组需要是连续的行（报销信息表本来就是这样组织的）；同一序号在后面再次出现时，
+    为避免重复提交，后出现的行会被跳过并记录错误。序号为空的行与groupby一致地被忽略
+
+    Args:
+        excel_file: 报销信息Excel文件
+        sheet_name: sheet名称
+        wanted: 只产出这些序号（clean_cell后的字符串），None表示全部
+
+    Yields:
+        (序号, 该序号的DataFrame)
+    """
+    import openpyxl
+    import pandas as pd
+
+    workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = dedupe_columns(header)
+        if SEQUENCE_COL not in columns:
+            raise ValueError(f"缺少必要的列: {[SEQUENCE_COL]}")
+        sequence_idx = columns.index(SEQUENCE_COL)
+
+        finished = set()
+        current_key = None      # 正在收集的序号
+        current_value = None    # 该序号的原始值（与groupby的分组键一致）
+        current_rows: List[tuple] = []
+        skip_key = None         # 正在跳过的序号
+        for row_number, row in enumerate(rows, start=2):
+            if len(row) < len(columns):
+                row = tuple(row) + (None,) * (len(columns) - len(row))
+            value = row[sequence_idx]
+            key = clean_cell(value)
+            if not key or key == skip_key:
+                continue
+            if key != current_key:
+                if current_rows:
+                    yield current_value, pd.DataFrame(current_rows, columns=columns)
+                    finished.add(current_key)
+                current_key, current_value, current_rows = None, None, []
+                if key in finished:
+                    logger.error(f"序号 {key} 的行不连续（第{row_number}行再次出现），后出现的行已跳过，请整理工作簿")
+                    skip_key = key
+                    continue
+                if wanted is not None and key not in wanted:
+                    skip_key = key
+                    continue
+                current_key, current_value, skip_key = key, value, None
+            current_rows.append(row[:len(columns)])
+
+        if current_rows:
+            yield current_value, pd.DataFrame(current_rows, columns=columns)
+    finally:
+        workbook.close()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并行worker池
+将按序号分组的报销记录分发到N个独立的浏览器上下文中并行处理，
+每个worker拥有自己的LoginAutomation实例（独立的页面和记录状态）
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sized
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerProgress:
+    """单个worker的处理进度统计"""
+
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.sequences: List[str] = []
+
+    def record(self, result: Dict[str, Any]):
+        """
+        记录一条序号的处理结果
+
+        Args:
+            result: process_sequence返回的结果字典
+        """
+        self.sequences.append(result["sequence"])
+        self.busy_seconds += result["duration"]
+        if result["status"] == "success":
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    def summary_line(self) -> str:
+        """生成该worker的进度摘要"""
+        total = self.completed + self.failed
+        average = self.busy_seconds / total if total else 0.0
+        return (f"worker {self.worker_id}: 成功 {self.completed} 条, 失败 {self.failed} 条, "
+                f"耗时 {self.busy_seconds:.1f} 秒, 平均每条 {average:.1f} 秒, "
+                f"序号: {', '.join(self.sequences) if self.sequences else '无'}")
+
+
+def log_progress_summary(progress_list: List[WorkerProgress], wall_seconds: float):
+    """
+    输出所有worker的汇总进度
+
+    Args:
+        progress_list: 各worker的进度统计
+        wall_seconds: 整体运行的墙钟时间（秒）
+    """
+    total_completed = sum(p.completed for p in progress_list)
+    total_failed = sum(p.failed for p in progress_list)
+    busy_seconds = sum(p.busy_seconds for p in progress_list)
+
+    logger.info("=" * 50)
+    logger.info("并行处理进度汇总:")
+    for progress in progress_list:
+        logger.info(f"  {progress.summary_line()}")
+    logger.info(f"合计: 成功 {total_completed} 条, 失败 {total_failed} 条, 墙钟耗时 {wall_seconds:.1f} 秒")
+    if wall_seconds > 0:
+        logger.info(f"并行加速比: {busy_seconds / wall_seconds:.2f}x")
+    logger.info("=" * 50)
+
+
+class GroupFeed:
+    """
+    worker共享的序号组来源：可以是列表，也可以是流式读取的迭代器（按需读取下一组）
+    """
+
+    def __init__(self, groups: Iterable[Any]):
+        self.total = len(groups) if isinstance(groups, Sized) else None
+        self.taken = 0
+        self._groups: Iterator[Any] = iter(groups)
+
+    def next(self) -> Optional[Any]:
+        """取出下一个序号组，没有时返回None"""
+        item = next(self._groups, None)
+        if item is not None:
+            self.taken += 1
+        return item
+
+    def remaining_label(self) -> str:
+        """用于日志的剩余数量"""
+        return f"{self.total - self.taken} 条" if self.total is not None else "未知（流式读取）"
+
+
+async def _worker_loop(worker, feed: GroupFeed, progress: WorkerProgress,
+                       results: List[Dict[str, Any]]):
+    """
+    worker主循环：不断从来源中取出序号组并处理，直到没有剩余
+
+    Args:
+        worker: 该worker专属的LoginAutomation实例
+        feed: 共享的(序号, 数据)来源
+        progress: 该worker的进度统计
+        results: 所有worker共享的结果列表
+    """
+    while True:
+        item = feed.next()
+        if item is None:
+            return
+        sequence_num, group_data = item
+
+        logger.info(f"[worker {worker.worker_id}] 领取序号 {sequence_num}，剩余 {feed.remaining_label()}")
+        result = await worker.process_sequence(sequence_num, group_data)
+        progress.record(result)
+        results.append(result)
+
+
+async def run_worker_pool(template, browser, groups: Iterable[Any], worker_count: int,
+                          target_url: str) -> List[Dict[str, Any]]:
+    """
+    使用N个独立浏览器上下文并行处理所有序号组
+
+    Args:
+        template: 已加载数据的LoginAutomation实例，用于派生各worker
+        browser: 已启动的Playwright浏览器
+        groups: (序号, 数据)列表或流式读取的迭代器
+        worker_count: worker数量
+        target_url: 每个worker打开的起始页面
+
+    Returns:
+        所有序号的处理结果列表
+    """
+    feed = GroupFeed(groups)
+    if feed.total is not None:
+        worker_count = max(1, min(worker_count, feed.total))
+        logger.info(f"启动并行处理：{worker_count} 个worker，共 {feed.total} 条报销记录")
+    else:
+        logger.info(f"启动并行处理：{worker_count} 个worker，流式读取报销记录")
+
+    contexts = []
+    workers = []
+    progress_list = []
+    results: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+
+    try:
+        for worker_id in range(1, worker_count + 1):
+            context = await browser.new_context()
+            contexts.append(context)
+            if template.resource_filter:
+                await template.resource_filter.install(context)
+            page = await context.new_page()
+            worker = template.spawn_worker(worker_id, page)
+            await worker.open_start_page(target_url)
+            workers.append(worker)
+            progress_list.append(WorkerProgress(worker_id))
+
+        await asyncio.gather(*[
+            _worker_loop(worker, feed, progress, results)
+            for worker, progress in zip(workers, progress_list)
+        ])
+    finally:
+        log_progress_summary(progress_list, time.perf_counter() - started)
+        for context in contexts:
+            try:
+                await context.close()
+            except Exception as e:
+                logger.debug(f"关闭浏览器上下文失败: {e}")
+
+    return results